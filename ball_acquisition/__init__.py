@@ -1 +1,2 @@
-from .ball_acquisition_detector import BallAquisitionDetector
\ No newline at end of file
+from .ball_acquisition_detector import BallAquisitionDetector
+from .team_ball_control import TeamBallControl, get_team_ball_control
@@ -1,6 +1,17 @@
 import sys
+import numpy as np
 sys.path.append("../")
-from utils import measure_distance, get_center_of_bbox
+from utils import (
+    measure_distance,
+    get_center_of_bbox,
+    profile_stage,
+    as_boxes,
+    get_centers,
+    get_containment_matrix,
+    get_point_box_distance_matrix,
+    get_paired_containment,
+    get_paired_point_box_distance
+)
 
 
 class BallAquisitionDetector:
@@ -258,73 +269,182 @@ class BallAquisitionDetector:
        return containment_ratio
        
     
+    '''
+    find_best_candidate_for_position does the two computations above for all the players of the frame at once
+    (utils.bbox_utils), instead of one player, one key point at a time:
+
+        containment -> get_containment_matrix(ball bbox, player bboxes): (1, num_players)
+        distance -> get_point_box_distance_matrix(ball center, player bboxes, to_boundary=True): (1, num_players)
+
+    The closest of the key points is always on the border of the player box (the side, top/bottom point
+    aligned with the ball, or a corner), so the distance to the border gives the same minimum
+    without building the key points.
+    '''
     def find_best_candidate_for_position(self, ball_center, player_tracks_frame, ball_bbox):
         
-        high_containment_players = []
-        regular_distance_players = []
-        
+        player_ids = []
+        player_bboxes = []
         for player_id, player_info in player_tracks_frame.items():
             player_bbox = player_info.get("bbox", [])
             
             if not player_bbox:
                 continue
             
-            containment = self.calculate_ball_containment_ratio(player_bbox, ball_bbox)
-            min_distance = self.find_minimun_distance_to_ball(ball_center, player_bbox)
-            
-            if containment > self.containment_threshold:
-                high_containment_players.append((player_id, containment))
-            else:
-                regular_distance_players.append((player_id, min_distance))
-                
+            player_ids.append(player_id)
+            player_bboxes.append(player_bbox)
+        
+        if not player_ids:
+            return -1
+        
+        player_bboxes = as_boxes(player_bboxes)
+        containments = get_containment_matrix(ball_bbox, player_bboxes)[0]
+        min_distances = get_point_box_distance_matrix(ball_center, player_bboxes, to_boundary=True)[0]
+        
         # First priority: High containment players
         # If any exist, pick the one with the highest containment
-        if high_containment_players:
-            best_candidate = max(high_containment_players, key=lambda x:x[1])
-            return best_candidate[0] # return player_id and not the containment_id
+        high_containment = containments > self.containment_threshold
+        if high_containment.any():
+            best_index = np.argmax(np.where(high_containment, containments, -1))
+            return player_ids[best_index] # return player_id and not the containment_id
         
         # Second priority: regular distance
         # If nobody passes containment, look at everyone else’s min distance.
         # Pick the smallest distance, and return that player only if distance < possession_threshold.
-        if regular_distance_players:
-            best_candidate = min(regular_distance_players, key= lambda x:x[1])
-            if best_candidate[1] < self.possession_threshold:
-                return best_candidate[0] # Return player_id instead of min_distance
+        best_index = np.argmin(min_distances)
+        if min_distances[best_index] < self.possession_threshold:
+            return player_ids[best_index] # Return player_id instead of min_distance
         
         return -1
     
     def detect_ball_possession(self, player_tracks, ball_tracks):
+        with profile_stage("detect_ball_possession", items=len(ball_tracks)):
+            return self._detect_ball_possession(player_tracks, ball_tracks)
+    
+    def _detect_ball_possession(self, player_tracks, ball_tracks):
         num_frames = len(ball_tracks)
         # No one has the ball
         possesion_list = [-1] * num_frames
         consecutive_possession_count = {}
         
-        for frame_num in range(num_frames):
-            ball_info = ball_tracks[frame_num].get(1,{}) # 1 is track_id of the ball
-            
-            if not ball_info:
+        # The geometry of the whole video at once, only the streaks are followed frame by frame
+        best_player_ids = self.find_best_candidates(player_tracks, ball_tracks)
+        
+        for frame_num, best_player_id in enumerate(best_player_ids):
+            if best_player_id is None:
+                # No ball on this frame: the streak is kept
                 continue
             
-            ball_bbox = ball_info.get("bbox", [])
+            possesion_list[frame_num], consecutive_possession_count = self._update_possession_count(
+                best_player_id,
+                consecutive_possession_count
+            )
+        
+        return possesion_list
+    
+    def find_best_candidates(self, player_tracks, ball_tracks):
+        '''
+        find_best_candidate_for_position of every frame, with one containment and one distance computation
+        for all the (frame, player) pairs of the video (get_paired_containment, get_paired_point_box_distance).
+        
+        Returns one value per frame: None without ball, -1 when nobody is close enough, the player_id otherwise.
+        '''
+        num_frames = len(ball_tracks)
+        best_player_ids = [None] * num_frames
+        
+        ball_frames = []
+        ball_bboxes = []
+        pair_ball_indexes = []
+        pair_player_ids = []
+        pair_player_bboxes = []
+        
+        for frame_num in range(num_frames):
+            ball_bbox = ball_tracks[frame_num].get(1, {}).get("bbox", [])
             if not ball_bbox:
                 continue
             
-            ball_center = get_center_of_bbox(ball_bbox)
+            best_player_ids[frame_num] = -1
             
-            best_player_id = self.find_best_candidate_for_position(
-                ball_center, 
-                player_tracks[frame_num], 
-                ball_bbox
-            )
-            
-            if best_player_id != -1:
-                number_of_consecutive_frames = consecutive_possession_count.get(best_player_id,0)+1
-                consecutive_possession_count = {best_player_id:number_of_consecutive_frames}
+            for player_id, player_info in player_tracks[frame_num].items():
+                player_bbox = player_info.get("bbox", [])
+                if not player_bbox:
+                    continue
                 
-                if consecutive_possession_count[best_player_id] >= self.min_frames:
-                    possesion_list[frame_num] = best_player_id
-            else:
-                consecutive_possession_count = {}
+                pair_ball_indexes.append(len(ball_bboxes))
+                pair_player_ids.append(player_id)
+                pair_player_bboxes.append(player_bbox)
+            
+            ball_frames.append(frame_num)
+            ball_bboxes.append(ball_bbox)
         
-        return possesion_list
-                
\ No newline at end of file
+        if not pair_player_ids:
+            return best_player_ids
+        
+        ball_bboxes = as_boxes(ball_bboxes)
+        # Integer center, as get_center_of_bbox
+        ball_centers = np.trunc(get_centers(ball_bboxes))
+        
+        pair_ball_indexes = np.asarray(pair_ball_indexes)
+        pair_frames = np.asarray(ball_frames)[pair_ball_indexes]
+        pair_player_bboxes = as_boxes(pair_player_bboxes)
+        
+        containments = get_paired_containment(ball_bboxes[pair_ball_indexes], pair_player_bboxes)
+        min_distances = get_paired_point_box_distance(ball_centers[pair_ball_indexes], pair_player_bboxes, to_boundary=True)
+        
+        # Same priorities as find_best_candidate_for_position: on the frames with high containment players
+        # only them (highest containment first), on the others the closest player
+        high_containment = containments > self.containment_threshold
+        frame_has_high_containment = np.zeros(num_frames, dtype=bool)
+        frame_has_high_containment[pair_frames[high_containment]] = True
+        candidate = high_containment | ~frame_has_high_containment[pair_frames]
+        sort_key = np.where(high_containment, -containments, min_distances)
+        
+        # Sorted by frame, candidates first, best first, and the order of the tracks for the ties
+        order = np.lexsort((np.arange(len(pair_frames)), sort_key, ~candidate, pair_frames))
+        first_of_frame = np.ones(len(order), dtype=bool)
+        first_of_frame[1:] = pair_frames[order[1:]] != pair_frames[order[:-1]]
+        best_pairs = order[first_of_frame]
+        
+        accepted = high_containment[best_pairs] | (min_distances[best_pairs] < self.possession_threshold)
+        for pair_index in best_pairs[accepted]:
+            best_player_ids[pair_frames[pair_index]] = pair_player_ids[pair_index]
+        
+        return best_player_ids
+    
+    def detect_frame_possession(self, player_tracks_frame, ball_tracks_frame, consecutive_possession_count):
+        '''
+        One step of detect_ball_possession, so that possession can also be followed frame by frame (live mode).
+        
+        consecutive_possession_count -> {player_id: number of consecutive frames} carried over from the previous frame
+        
+        Returns (player_id with the ball or -1, updated consecutive_possession_count)
+        '''
+        ball_info = ball_tracks_frame.get(1,{}) # 1 is track_id of the ball
+        
+        if not ball_info:
+            return -1, consecutive_possession_count
+        
+        ball_bbox = ball_info.get("bbox", [])
+        if not ball_bbox:
+            return -1, consecutive_possession_count
+        
+        ball_center = get_center_of_bbox(ball_bbox)
+        
+        best_player_id = self.find_best_candidate_for_position(
+            ball_center, 
+            player_tracks_frame, 
+            ball_bbox
+        )
+        
+        return self._update_possession_count(best_player_id, consecutive_possession_count)
+    
+    def _update_possession_count(self, best_player_id, consecutive_possession_count):
+        if best_player_id != -1:
+            number_of_consecutive_frames = consecutive_possession_count.get(best_player_id,0)+1
+            consecutive_possession_count = {best_player_id:number_of_consecutive_frames}
+            
+            if consecutive_possession_count[best_player_id] >= self.min_frames:
+                return best_player_id, consecutive_possession_count
+            
+            return -1, consecutive_possession_count
+        
+        return -1, {}
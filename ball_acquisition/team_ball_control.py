@@ -0,0 +1,98 @@
+import numpy as np
+
+
+def get_team_ball_control(player_assignment, ball_acquisition):
+    '''
+    For every frame returns which team has the ball:
+        1 -> team 1
+        2 -> team 2
+        -1 -> nobody (or the player with the ball has no team assignment)
+    
+    Only the frames where someone has the ball need a lookup in player_assignment,
+    everything else is done with numpy on the whole video at once.
+    '''
+    ball_acquisition = np.asarray(ball_acquisition, dtype=np.int64)
+    team_ball_control = np.full(len(ball_acquisition), -1, dtype=np.int64)
+    
+    frames_with_ball = np.flatnonzero(ball_acquisition != -1)
+    if len(frames_with_ball) == 0:
+        return team_ball_control
+    
+    ball_holder_team = np.array(
+        [player_assignment[frame_num].get(ball_acquisition[frame_num], -1) for frame_num in frames_with_ball],
+        dtype=np.int64
+    )
+    
+    # Same rule as before: team 1 stays 1, any other assigned team counts as team 2
+    team_ball_control[frames_with_ball] = np.where(
+        ball_holder_team == -1, 
+        -1, 
+        np.where(ball_holder_team == 1, 1, 2)
+    )
+    
+    return team_ball_control
+
+
+class TeamBallControl:
+    '''
+    Per team ball control statistics over any range of frames in O(1).
+    
+    The number of frames each team had the ball is accumulated once with cumsum:
+    
+        team_ball_control   = [-1,  1,  1,  2, -1,  2]
+        team1_cumulative    = [0, 0,  1,  2,  2,  2,  2]   (leading 0 -> empty range)
+        team2_cumulative    = [0, 0,  0,  0,  1,  1,  2]
+    
+    so the frames team 1 had the ball in [start, end) are simply
+    team1_cumulative[end] - team1_cumulative[start].
+    '''
+    def __init__(self, team_ball_control):
+        self.team_ball_control = np.asarray(team_ball_control)
+        
+        self.team1_cumulative = np.concatenate(([0], np.cumsum(self.team_ball_control == 1)))
+        self.team2_cumulative = np.concatenate(([0], np.cumsum(self.team_ball_control == 2)))
+    
+    @classmethod
+    def from_ball_acquisition(cls, player_assignment, ball_acquisition):
+        return cls(get_team_ball_control(player_assignment, ball_acquisition))
+    
+    def __len__(self):
+        return len(self.team_ball_control)
+    
+    def get_team_num_frames(self, team_id, start=0, end=None):
+        '''
+        Number of frames in [start, end) where team_id had the ball.
+        '''
+        start, end = self._clip_range(start, end)
+        cumulative = self.team1_cumulative if team_id == 1 else self.team2_cumulative
+        return int(cumulative[end] - cumulative[start])
+    
+    def get_control(self, start=0, end=None):
+        '''
+        Fraction of the frames in [start, end) controlled by team 1 and by team 2.
+        Frames where nobody has the ball count in the total, so the two values don't have to sum to 1.
+        '''
+        start, end = self._clip_range(start, end)
+        num_frames = end - start
+        
+        if num_frames <= 0:
+            return 0.0, 0.0
+        
+        team1 = (self.team1_cumulative[end] - self.team1_cumulative[start]) / num_frames
+        team2 = (self.team2_cumulative[end] - self.team2_cumulative[start]) / num_frames
+        
+        return float(team1), float(team2)
+    
+    def get_control_till_frame(self, frame_num):
+        # frame_num included
+        return self.get_control(0, frame_num+1)
+    
+    def _clip_range(self, start, end):
+        num_frames = len(self.team_ball_control)
+        if end is None:
+            end = num_frames
+        
+        start = min(max(start, 0), num_frames)
+        end = min(max(end, start), num_frames)
+        
+        return start, end
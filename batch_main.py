@@ -0,0 +1,60 @@
+import argparse
+import os
+from utils import profiler, enable_profiling
+from pipeline import BatchRunner, find_videos, get_clip_names
+
+
+
+def main():
+    
+    parser = argparse.ArgumentParser(description="Run the basketball analysis on many clips")
+    parser.add_argument("input", help="directory with the videos, or manifest file with one video path per line")
+    parser.add_argument("--output-dir", default="output_videos/batch")
+    parser.add_argument("--workers", type=int, default=2, help="clips processed at the same time (one set of models each)")
+    parser.add_argument("--retries", type=int, default=1, help="retries of a failing clip before giving up")
+    parser.add_argument("--render-workers", type=int, default=1, help="threads drawing the frames of each clip")
+    parser.add_argument("--player-model", default="models/player_detector.pt")
+    parser.add_argument("--ball-model", default="models/ball_detector_model.pt")
+    parser.add_argument("--profile", action="store_true", help="save a Chrome trace and a per-stage summary in the output dir")
+    args = parser.parse_args()
+    
+    if args.profile:
+        enable_profiling()
+    
+    video_paths = find_videos(args.input)
+    
+    # Same check as BatchRunner.run, reported before loading anything
+    try:
+        get_clip_names(video_paths)
+    except ValueError as error:
+        parser.error(str(error))
+    
+    batch_runner = BatchRunner(
+        args.output_dir,
+        num_workers=args.workers,
+        max_retries=args.retries,
+        player_model_path=args.player_model,
+        ball_model_path=args.ball_model,
+        render_workers=args.render_workers
+    )
+    report = batch_runner.run(video_paths)
+    
+    for clip_report in report["clips"]:
+        if clip_report["status"] == "ok":
+            print(f"{clip_report['video_path']}: {clip_report['num_frames']} frames in {clip_report['seconds']:.1f}s ({clip_report['fps']:.1f} fps)")
+        else:
+            print(f"{clip_report['video_path']}: FAILED after {clip_report['attempts']} attempts")
+            print(clip_report["errors"][-1])
+    
+    summary = report["summary"]
+    print(f"{summary['num_ok']}/{summary['num_clips']} clips, {summary['total_frames']} frames in {summary['seconds']:.1f}s")
+    print(f"{summary['fps']:.1f} frames/sec, {summary['clips_per_hour']:.1f} clips/hour")
+    
+    if profiler.enabled:
+        profiler.export_chrome_trace(os.path.join(args.output_dir, "profile_trace.json"))
+        profiler.export_summary(os.path.join(args.output_dir, "profile_summary.json"))
+    
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,2 @@
+from .synthetic_data import generate_synthetic_game
+from .fake_backends import FakeDetector, FakeCLIPModel, FakeCLIPProcessor
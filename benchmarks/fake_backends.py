@@ -0,0 +1,162 @@
+import numpy as np
+
+
+'''
+Stand-ins for the models, with the same interfaces the trackers and the TeamAssigner use:
+
+    FakeDetector -> YOLO: predict(frames, conf=...) returns one result per frame, with the
+                    boxes/names attributes read by sv.Detections.from_ultralytics
+    FakeCLIPModel / FakeCLIPProcessor -> CLIPModel / CLIPProcessor: the "similarity" is the brightness of the crop
+
+They answer with the synthetic ground truth (plus some noise), in a negligible time,
+so the benchmarks measure the code around the models and need no weights nor network.
+'''
+
+
+class FakeArray:
+    '''
+    Enough of the torch.Tensor API for supervision and the TeamAssigner: .cpu().numpy(), .int(), softmax, argmax.
+    '''
+    def __init__(self, array):
+        self.array = np.asarray(array)
+
+    def cpu(self):
+        return self
+
+    def numpy(self):
+        return self.array
+
+    def int(self):
+        return FakeArray(self.array.astype(np.int32))
+
+    def softmax(self, dim):
+        exp = np.exp(self.array - self.array.max(axis=dim, keepdims=True))
+        return FakeArray(exp / exp.sum(axis=dim, keepdims=True))
+
+    def argmax(self, dim):
+        return self.array.argmax(axis=dim)
+
+    def __len__(self):
+        return len(self.array)
+
+
+class FakeBoxes:
+    def __init__(self, xyxy, conf, cls):
+        self.xyxy = FakeArray(np.asarray(xyxy, dtype=np.float32).reshape(-1, 4))
+        self.conf = FakeArray(np.asarray(conf, dtype=np.float32))
+        self.cls = FakeArray(np.asarray(cls, dtype=np.float32))
+        self.id = None
+
+    def __len__(self):
+        return len(self.conf)
+
+
+class FakeResult:
+    def __init__(self, boxes, names, orig_shape):
+        self.boxes = boxes
+        self.names = names
+        self.orig_shape = orig_shape
+        self.masks = None
+        self.obb = None
+        self.keypoints = None
+
+    def __len__(self):
+        return len(self.boxes)
+
+
+class FakeDetector:
+    '''
+    Detections of the synthetic tracks, the frames are matched to the tracks by call order
+    (the trackers always predict the frames of a video in order).
+
+    names -> {0: "Player", 1: "Ball"}, the class names of both of our detectors
+    '''
+    names = {0: "Player", 1: "Ball"}
+
+    def __init__(self, player_tracks, ball_tracks, jitter=1.0, num_ball_false_positives=1, seed=0, source_width=None):
+        self.player_tracks = player_tracks
+        self.ball_tracks = ball_tracks
+        self.source_width = source_width # width of the frames the tracks were generated for
+        self.jitter = jitter
+        self.num_ball_false_positives = num_ball_false_positives
+        self.rng = np.random.default_rng(seed)
+        self.frame_index = 0
+
+    def reset(self):
+        self.frame_index = 0
+
+    def predict(self, frames, conf=0.5, **kwargs):
+        if isinstance(frames, np.ndarray):
+            frames = [frames]
+
+        results = []
+        for frame in frames:
+            results.append(self._detect(frame))
+            self.frame_index += 1
+
+        return results
+
+    def _detect(self, frame):
+        frame_height, frame_width = frame.shape[:2]
+        frame_index = self.frame_index % len(self.player_tracks)
+        # The tracks are in the coordinates of the source frames, the frame may have been
+        # downscaled for the inference (InferenceResolution): the boxes must be in the frame we got
+        scale = frame_width / self.source_width if self.source_width else 1.0
+
+        xyxy = [track["bbox"] for track in self.player_tracks[frame_index].values()]
+        conf = list(self.rng.uniform(0.6, 0.95, len(xyxy)))
+        cls = [0] * len(xyxy)
+
+        ball_bbox = self.ball_tracks[frame_index].get(1, {}).get("bbox")
+        if ball_bbox:
+            xyxy.append(ball_bbox)
+            conf.append(self.rng.uniform(0.6, 0.9))
+            cls.append(1)
+
+        # Low confidence balls somewhere else, for the "keep the best ball" logic
+        for _ in range(self.num_ball_false_positives):
+            x = self.rng.uniform(0, frame_width - 14)
+            y = self.rng.uniform(0, frame_height - 14)
+            xyxy.append([x, y, x + 14, y + 14])
+            conf.append(self.rng.uniform(0.5, 0.55))
+            cls.append(1)
+
+        xyxy = np.asarray(xyxy, dtype=np.float32).reshape(-1, 4)
+        xyxy[:len(xyxy) - self.num_ball_false_positives] *= scale
+        xyxy += self.rng.normal(0, self.jitter, xyxy.shape).astype(np.float32)
+
+        return FakeResult(FakeBoxes(xyxy, conf, cls), self.names, (frame_height, frame_width))
+
+
+class FakeCLIPOutput:
+    def __init__(self, logits_per_image):
+        self.logits_per_image = logits_per_image
+
+
+class FakeCLIPProcessor:
+    '''
+    Only the text is processed: the images are preprocessed by the CropPreprocessor.
+    No image_processor attribute, so the CropPreprocessor uses the CLIP defaults.
+    '''
+    def __call__(self, text=None, images=None, return_tensors=None, padding=None):
+        return {"num_classes": len(text)}
+
+
+class FakeCLIPModel:
+    '''
+    Class 0 ("white shirt") for bright crops, class 1 ("dark blue shirt") for dark ones.
+    pixel_values -> (N, 3, H, W) normalized with the CLIP mean and std (numpy array or CPU tensor)
+    '''
+    def __call__(self, pixel_values, num_classes, **kwargs):
+        from team_assigner.crop_preprocessor import CLIP_MEAN, CLIP_STD
+
+        pixel_values = np.asarray(pixel_values)
+        # Back to [0, 1]
+        images = pixel_values * np.reshape(CLIP_STD, (1, 3, 1, 1)) + np.reshape(CLIP_MEAN, (1, 3, 1, 1))
+        brightness = images.reshape(len(images), -1).mean(axis=1) if len(images) else np.empty(0)
+
+        logits = np.zeros((len(images), num_classes), dtype=np.float32)
+        if num_classes >= 2:
+            logits[:, 0] = 10 * brightness
+            logits[:, 1] = 10 * (1 - brightness)
+        return FakeCLIPOutput(FakeArray(logits))
@@ -0,0 +1,208 @@
+import argparse
+import json
+import os
+import sys
+import time
+import numpy as np
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from trackers import InferenceResolution
+from utils import get_iou_matrix
+
+
+'''
+Accuracy versus throughput of the inference resolution settings, per detector, on a sample clip.
+
+    python benchmarks/resolution_report.py --video input_videos/video_1.mp4 --frames 120
+    python benchmarks/resolution_report.py --synthetic   # no weights: fake detector, checks the rescaling
+
+The reference are the detections with the frames as they are ("native").
+For every setting and detector:
+    fps -> frames per second of the detection (resize + predict)
+    recall / precision -> boxes matching a reference box with IoU >= 0.5
+    mean_iou -> mean IoU of the matched boxes (how precise the rescaled boxes are)
+
+The players usually keep their recall down to 480 or even 320, the ball doesn't.
+
+The JSON output has the clip and the weights it was measured with ("metadata"), next to the results
+("detectors"): a report is only meaningful with them. A --synthetic report only checks the rescaling
+(the fake detector finds every box at any resolution), its recall says nothing about the models.
+'''
+
+
+# Sizes from the model imgsz (640) up are native, see InferenceResolution
+DEFAULT_SETTINGS = [
+    None,
+    480,
+    320,
+    {"mode": "adaptive", "min_object_size": 16},
+]
+
+
+def get_setting_name(settings):
+    if settings is None:
+        return "native"
+    if isinstance(settings, int):
+        return f"fixed_{settings}"
+    return "adaptive_" + "_".join(f"{key}={value}" for key, value in settings.items() if key != "mode")
+
+
+def get_boxes(detection, scale, class_name):
+    '''
+    Boxes of one class, in the source frame.
+    '''
+    xyxy = detection.boxes.xyxy.cpu().numpy() / scale
+    class_ids = detection.boxes.cls.cpu().numpy().astype(int)
+    class_names = np.array([detection.names[class_id] for class_id in class_ids])
+    return xyxy[class_names == class_name].reshape(-1, 4)
+
+
+def match_boxes(boxes, reference_boxes, iou_threshold=0.5):
+    '''
+    Greedy matching by decreasing IoU. Returns the IoUs of the matched pairs.
+    '''
+    if len(boxes) == 0 or len(reference_boxes) == 0:
+        return []
+
+    iou_matrix = get_iou_matrix(boxes, reference_boxes)
+    matched_ious = []
+
+    while True:
+        i, j = np.unravel_index(iou_matrix.argmax(), iou_matrix.shape)
+        if iou_matrix[i, j] < iou_threshold:
+            break
+        matched_ious.append(float(iou_matrix[i, j]))
+        iou_matrix[i, :] = -1
+        iou_matrix[:, j] = -1
+
+    return matched_ious
+
+
+def detect(model, frames, settings, class_name, batch_size=20):
+    '''
+    Returns (boxes per frame in the source frame, seconds)
+    '''
+    inference_resolution = InferenceResolution.from_settings(settings, class_name=class_name)
+    boxes = []
+
+    if hasattr(model, "reset"):
+        # FakeDetector matches the frames by call order: every run starts from the first frame
+        model.reset()
+
+    start_time = time.perf_counter()
+    for i in range(0, len(frames), batch_size):
+        for detection, scale in inference_resolution.predict(model, frames[i:i+batch_size], conf=0.5, verbose=False):
+            boxes.append(get_boxes(detection, scale, class_name))
+    seconds = time.perf_counter() - start_time
+
+    return boxes, seconds
+
+
+def compare(boxes, reference_boxes):
+    num_matched = 0
+    num_boxes = 0
+    num_reference_boxes = 0
+    matched_ious = []
+
+    for frame_boxes, frame_reference_boxes in zip(boxes, reference_boxes):
+        frame_matched_ious = match_boxes(frame_boxes, frame_reference_boxes)
+        matched_ious += frame_matched_ious
+        num_matched += len(frame_matched_ious)
+        num_boxes += len(frame_boxes)
+        num_reference_boxes += len(frame_reference_boxes)
+
+    return {
+        "recall": num_matched / num_reference_boxes if num_reference_boxes else None,
+        "precision": num_matched / num_boxes if num_boxes else None,
+        "mean_iou": float(np.mean(matched_ious)) if matched_ious else None
+    }
+
+
+def build_report(detectors, frames, settings_list):
+    '''
+    detectors -> {class name: model}, e.g. {"Player": player model, "Ball": ball model}
+    '''
+    report = {}
+
+    for class_name, model in detectors.items():
+        # Warm up (model loading, first CUDA calls) so that it doesn't end in the native timing
+        detect(model, frames[:1], None, class_name)
+
+        reference_boxes, _ = detect(model, frames, None, class_name)
+        report[class_name] = {}
+
+        for settings in settings_list:
+            boxes, seconds = detect(model, frames, settings, class_name)
+            result = {"fps": len(frames) / seconds}
+            result.update(compare(boxes, reference_boxes))
+            report[class_name][get_setting_name(settings)] = result
+
+    return report
+
+
+def print_report(report):
+    for class_name, results in report.items():
+        print(class_name)
+        print(f"    {'setting':40s} {'fps':>8s} {'recall':>8s} {'precision':>10s} {'mean_iou':>9s}")
+        for setting_name, result in results.items():
+            values = [result[key] if result[key] is not None else float("nan") for key in ("fps", "recall", "precision", "mean_iou")]
+            print(f"    {setting_name:40s} {values[0]:8.1f} {values[1]:8.3f} {values[2]:10.3f} {values[3]:9.3f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Accuracy versus throughput of the detectors inference resolution")
+    parser.add_argument("--video", default="input_videos/video_1.mp4")
+    parser.add_argument("--frames", type=int, default=120, help="number of frames of the clip to use")
+    parser.add_argument("--player-model", default="models/player_detector.pt")
+    parser.add_argument("--ball-model", default="models/ball_detector_model.pt")
+    parser.add_argument("--synthetic", action="store_true", help="fake detector on a synthetic clip, no weights needed")
+    parser.add_argument("--output", default=None,
+                        help="benchmarks/resolution_report.json by default (committed with the code it measured), "
+                             "benchmarks/resolution_report_synthetic.json with --synthetic")
+    args = parser.parse_args()
+
+    if args.output is None:
+        report_name = "resolution_report_synthetic.json" if args.synthetic else "resolution_report.json"
+        args.output = os.path.join(os.path.dirname(os.path.abspath(__file__)), report_name)
+
+    metadata = {
+        "synthetic": args.synthetic,
+        "video": None if args.synthetic else args.video,
+        "player_model": None if args.synthetic else args.player_model,
+        "ball_model": None if args.synthetic else args.ball_model
+    }
+
+    if args.synthetic:
+        from benchmarks.synthetic_data import generate_synthetic_game
+        from benchmarks.fake_backends import FakeDetector
+
+        game = generate_synthetic_game(args.frames)
+        frames = game["video_frames"]
+        source_width = frames[0].shape[1]
+
+        detector = FakeDetector(game["player_tracks"], game["ball_tracks"], jitter=0, num_ball_false_positives=0, source_width=source_width)
+        detectors = {"Player": detector, "Ball": detector}
+    else:
+        from ultralytics import YOLO
+        from utils import iter_video
+
+        frames = []
+        for frame in iter_video(args.video):
+            frames.append(frame)
+            if len(frames) == args.frames:
+                break
+
+        detectors = {"Player": YOLO(args.player_model), "Ball": YOLO(args.ball_model)}
+
+    metadata["num_frames"] = len(frames)
+    metadata["frame_size"] = list(frames[0].shape[1::-1]) if frames else None
+
+    report = build_report(detectors, frames, DEFAULT_SETTINGS)
+    print_report(report)
+
+    with open(args.output, "w") as f:
+        json.dump({"metadata": metadata, "detectors": report}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
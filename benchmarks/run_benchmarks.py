@@ -0,0 +1,310 @@
+import argparse
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from benchmarks.synthetic_data import generate_synthetic_game
+from benchmarks.fake_backends import FakeDetector, FakeCLIPModel, FakeCLIPProcessor
+
+
+'''
+Model-free benchmarks of the pipeline stages, on synthetic videos and tracks.
+
+    python benchmarks/run_benchmarks.py --frames 480 --players 10 --output bench_results.json
+    python benchmarks/run_benchmarks.py --baseline benchmarks/baseline.json --update-baseline   # store a baseline
+    python benchmarks/run_benchmarks.py --baseline benchmarks/baseline.json --max-regression 0.2
+
+Every stage is run --repeat times and the best time is kept (the least noisy estimate).
+With --baseline, the exit code is 1 if a stage is slower than baseline * (1 + max regression).
+Baselines are only comparable on the same machine and with the same settings (frames, resolution, players).
+
+benchmarks/baseline.json is the stored baseline, made with the default settings
+(240 frames, 1280x720, 10 players, repeat 3); its "settings" and "machine" say where it comes from.
+Update it with --update-baseline after an intended change, on the machine that checks the regressions.
+
+Stages needing a library that is not installed (e.g. torch / transformers for the team assignment)
+are reported as skipped. The trackers only need supervision: the YOLO weights are replaced by the FakeDetector.
+'''
+
+
+def time_stage(func, repeat, setup=None):
+    '''
+    Best wall time over `repeat` runs. setup() is called before each run (not timed)
+    and its return value is passed to func.
+    '''
+    best_time = float("inf")
+    for _ in range(repeat):
+        argument = setup() if setup is not None else None
+        start_time = time.perf_counter()
+        func(argument)
+        best_time = min(best_time, time.perf_counter() - start_time)
+    return best_time
+
+
+def make_player_tracker(fake_detector):
+    import supervision as sv
+    from trackers import PlayerTracker, InferenceResolution
+
+    # Skip __init__: it would load the YOLO weights
+    player_tracker = PlayerTracker.__new__(PlayerTracker)
+    player_tracker.model = fake_detector
+    player_tracker.inference_resolution = InferenceResolution(class_name="Player")
+    player_tracker.tracker = sv.ByteTrack()
+    return player_tracker
+
+
+def make_ball_tracker(fake_detector, num_candidates=1):
+    from trackers import BallTracker, InferenceResolution
+
+    ball_tracker = BallTracker.__new__(BallTracker)
+    ball_tracker.model = fake_detector
+    ball_tracker.inference_resolution = InferenceResolution(class_name="Ball")
+    ball_tracker.num_candidates = num_candidates
+    ball_tracker.candidate_conf = 0.15
+    return ball_tracker
+
+
+def make_team_assigner():
+    from team_assigner import TeamAssigner
+
+    team_assigner = TeamAssigner()
+    # load_model() doesn't reload when a model is already there
+    team_assigner.model = FakeCLIPModel()
+    team_assigner.processor = FakeCLIPProcessor()
+    return team_assigner
+
+
+def get_benchmarks(game, tmp_dir):
+    '''
+    {stage name: (func, setup)}, see time_stage
+    '''
+    video_frames = game["video_frames"]
+    player_tracks = game["player_tracks"]
+    ball_tracks = game["ball_tracks"]
+    player_assignment = game["player_assignment"]
+
+    benchmarks = {}
+
+    # Stub I/O
+    from utils import save_stub, read_stub
+    stub_path = os.path.join(tmp_dir, "stubs", "player_tracks.pkl")
+    benchmarks["stub_io.save"] = (lambda _: save_stub(stub_path, player_tracks), None)
+    benchmarks["stub_io.read"] = (lambda _: read_stub(True, stub_path), lambda: save_stub(stub_path, player_tracks))
+
+    # Trackers with the fake detector
+    def track_players(_):
+        make_player_tracker(FakeDetector(player_tracks, ball_tracks)).get_object_tracks(video_frames)
+    benchmarks["player_tracker.get_object_tracks"] = (track_players, None)
+
+    def track_balls(_):
+        make_ball_tracker(FakeDetector(player_tracks, ball_tracks)).get_object_tracks(video_frames)
+    benchmarks["ball_tracker.get_object_tracks"] = (track_balls, None)
+
+    def stitch_player_tracks(_):
+        from trackers import TrackStitcher
+        TrackStitcher().stitch(player_tracks, video_frames)
+    benchmarks["track_stitcher.stitch"] = (stitch_player_tracks, None)
+
+    # Ball cleaning, remove_wrong_detections edits the list in place: new copy for every run
+    benchmarks["remove_wrong_detections"] = (
+        lambda ball_tracker_and_tracks: ball_tracker_and_tracks[0].remove_wrong_detections(ball_tracker_and_tracks[1]),
+        lambda: (make_ball_tracker(None), list(ball_tracks))
+    )
+
+    def get_ball_candidates():
+        ball_tracker = make_ball_tracker(FakeDetector(player_tracks, ball_tracks, num_ball_false_positives=3), num_candidates=5)
+        return ball_tracker, ball_tracker.get_object_candidates(video_frames)
+    benchmarks["ball_tracker.solve_trajectory"] = (
+        lambda ball_tracker_and_candidates: ball_tracker_and_candidates[0].solve_trajectory(ball_tracker_and_candidates[1]),
+        get_ball_candidates
+    )
+    benchmarks["interpolate_ball_positions"] = (
+        lambda ball_tracker: ball_tracker.interpolate_ball_positions(ball_tracks),
+        lambda: make_ball_tracker(None)
+    )
+
+    # Team assignment with the fake CLIP
+    benchmarks["team_assigner.get_player_teams_across_frames"] = (
+        lambda team_assigner: team_assigner.get_player_teams_across_frames(video_frames, player_tracks),
+        make_team_assigner
+    )
+
+    # Possession
+    def detect_ball_possession(_):
+        from ball_acquisition import BallAquisitionDetector
+        BallAquisitionDetector().detect_ball_possession(player_tracks, ball_tracks)
+    benchmarks["detect_ball_possession"] = (detect_ball_possession, None)
+
+    def get_ball_acquisition():
+        from ball_acquisition import BallAquisitionDetector
+        ball_acquisition_detector = BallAquisitionDetector()
+        ball_acquisition_detector.min_frames = 3
+        return ball_acquisition_detector.detect_ball_possession(player_tracks, ball_tracks)
+
+    def get_team_ball_control(ball_acquisition):
+        from ball_acquisition import get_team_ball_control as get_control
+        get_control(player_assignment, ball_acquisition)
+    benchmarks["get_team_ball_control"] = (get_team_ball_control, get_ball_acquisition)
+
+    def build_heatmaps(ball_acquisition):
+        from heatmaps import OccupancyHeatmaps, PossessionZoneMaps
+        height, width = video_frames[0].shape[:2]
+        OccupancyHeatmaps.for_frame_size(width, height).update(player_tracks, player_assignment)
+        PossessionZoneMaps.for_frame_size(width, height).update(player_tracks, player_assignment, ball_acquisition)
+    benchmarks["heatmaps.update"] = (build_heatmaps, get_ball_acquisition)
+
+    # Drawers, each one on its own (with the copies they make) and all of them through the FrameRenderer
+    def draw_players(ball_acquisition):
+        from drawers import PlayerTracksDrawer
+        PlayerTracksDrawer().draw(video_frames, player_tracks, player_assignment, ball_acquisition)
+    benchmarks["draw.PlayerTracksDrawer"] = (draw_players, get_ball_acquisition)
+
+    def draw_ball(_):
+        from drawers import BallTracksDrawer
+        BallTracksDrawer().draw(video_frames, ball_tracks)
+    benchmarks["draw.BallTracksDrawer"] = (draw_ball, None)
+
+    def draw_team_ball_control(ball_acquisition):
+        from drawers import TeamBallControlDrawer
+        TeamBallControlDrawer().draw(video_frames, player_assignment, ball_acquisition)
+    benchmarks["draw.TeamBallControlDrawer"] = (draw_team_ball_control, get_ball_acquisition)
+
+    def render_frames(ball_acquisition):
+        from drawers import FrameRenderer, PlayerTracksLayer, PossessionLayer, BallTracksLayer, TeamBallControlLayer
+        frame_renderer = FrameRenderer([
+            PlayerTracksLayer(player_tracks, player_assignment),
+            PossessionLayer(player_tracks, ball_acquisition),
+            BallTracksLayer(ball_tracks),
+            TeamBallControlLayer(player_assignment, ball_acquisition),
+        ])
+        for frame in frame_renderer.iter_rendered_frames(frame.copy() for frame in video_frames):
+            pass
+    benchmarks["draw.FrameRenderer"] = (render_frames, get_ball_acquisition)
+
+    # Encoding
+    def save(_):
+        from utils import save_video
+        save_video(video_frames, os.path.join(tmp_dir, "videos", "output.avi"))
+    benchmarks["save_video"] = (save, None)
+
+    return benchmarks
+
+
+def run_benchmarks(num_frames, width, height, num_players, repeat, only=None):
+    game = generate_synthetic_game(num_frames, num_players, width, height)
+
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for name, (func, setup) in get_benchmarks(game, tmp_dir).items():
+            if only is not None and name not in only:
+                continue
+
+            try:
+                seconds = time_stage(func, repeat, setup)
+            except ImportError as e:
+                results[name] = {"skipped": f"missing dependency: {e.name}"}
+                continue
+
+            results[name] = {
+                "seconds": seconds,
+                "ms_per_frame": seconds / num_frames * 1000,
+                "frames_per_second": num_frames / seconds if seconds > 0 else None
+            }
+
+    return results
+
+
+def compare_with_baseline(results, baseline, max_regression, stage_max_regression=None):
+    '''
+    Returns the list of regressions: (stage, baseline seconds, current seconds, allowed ratio).
+    Stages missing or skipped on either side are not compared.
+    '''
+    stage_max_regression = stage_max_regression or {}
+    regressions = []
+
+    for name, result in results.items():
+        baseline_result = baseline.get(name)
+        if baseline_result is None or "seconds" not in baseline_result or "seconds" not in result:
+            continue
+
+        allowed_ratio = 1 + stage_max_regression.get(name, max_regression)
+        if result["seconds"] > baseline_result["seconds"] * allowed_ratio:
+            regressions.append((name, baseline_result["seconds"], result["seconds"], allowed_ratio))
+
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Model-free benchmarks of the pipeline stages")
+    parser.add_argument("--frames", type=int, default=240)
+    parser.add_argument("--width", type=int, default=1280)
+    parser.add_argument("--height", type=int, default=720)
+    parser.add_argument("--players", type=int, default=10)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--only", nargs="*", default=None, help="names of the stages to run")
+    parser.add_argument("--output", default="bench_output.json", help="where to write the results")
+    parser.add_argument("--baseline", default=None, help="baseline results to compare with")
+    parser.add_argument("--update-baseline", action="store_true", help="write the results as the new baseline")
+    parser.add_argument("--max-regression", type=float, default=0.2, help="allowed slowdown (0.2 = 20%%)")
+    parser.add_argument("--stage-max-regression", nargs="*", default=[], metavar="STAGE=RATIO",
+                        help="per-stage allowed slowdown, e.g. save_video=0.5")
+    args = parser.parse_args()
+
+    settings = {
+        "frames": args.frames,
+        "width": args.width,
+        "height": args.height,
+        "players": args.players,
+        "repeat": args.repeat
+    }
+    results = run_benchmarks(args.frames, args.width, args.height, args.players, args.repeat, args.only)
+
+    report = {
+        "settings": settings,
+        "machine": {"platform": platform.platform(), "python": platform.python_version(), "cpu_count": os.cpu_count()},
+        "results": results
+    }
+
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+
+    for name, result in results.items():
+        if "skipped" in result:
+            print(f"{name:50s} skipped ({result['skipped']})")
+        else:
+            print(f"{name:50s} {result['seconds']*1000:10.2f} ms  {result['ms_per_frame']:8.3f} ms/frame")
+
+    if args.baseline is None:
+        return 0
+
+    if args.update_baseline:
+        with open(args.baseline, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"Baseline written to {args.baseline}")
+        return 0
+
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+
+    if baseline["settings"] != settings:
+        print(f"Warning: baseline settings {baseline['settings']} differ from the current ones {settings}")
+
+    stage_max_regression = {}
+    for stage_setting in args.stage_max_regression:
+        name, ratio = stage_setting.split("=")
+        stage_max_regression[name] = float(ratio)
+
+    regressions = compare_with_baseline(results, baseline["results"], args.max_regression, stage_max_regression)
+
+    for name, baseline_seconds, seconds, allowed_ratio in regressions:
+        print(f"REGRESSION {name}: {baseline_seconds*1000:.2f} ms -> {seconds*1000:.2f} ms (allowed x{allowed_ratio:.2f})")
+
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
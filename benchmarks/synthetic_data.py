@@ -0,0 +1,173 @@
+import cv2
+import numpy as np
+
+
+'''
+Synthetic court videos and tracks, so the stages can be timed without any model or real footage.
+
+Everything has the same structure as the real pipeline outputs:
+    player_tracks -> [{track_id: {"bbox": [x1,y1,x2,y2]}}, ...] one dict per frame
+    ball_tracks -> [{1: {"bbox": [x1,y1,x2,y2]}}, ...] (empty dict when the ball is not detected)
+    player_assignment -> [{track_id: team_id}, ...]
+'''
+
+
+TEAM_COLORS = {
+    1: (245, 245, 245), # white shirts
+    2: (120, 40, 10) # dark blue shirts
+}
+
+
+def generate_player_tracks(num_frames, num_players=10, width=1280, height=720, track_churn=0.002, seed=0):
+    '''
+    Players doing a random walk on the court.
+    track_churn -> probability per frame and player that the track is lost and comes back with a new track_id
+                   (as ByteTrack does after occlusions)
+    '''
+    rng = np.random.default_rng(seed)
+
+    player_width = 0.04 * width
+    player_height = 0.22 * height
+
+    # Feet positions
+    positions = np.column_stack([
+        rng.uniform(player_width, width - player_width, num_players),
+        rng.uniform(0.35 * height + player_height, height - 10, num_players)
+    ])
+    velocities = np.zeros((num_players, 2))
+    track_ids = np.arange(1, num_players + 1)
+    next_track_id = num_players + 1
+
+    player_tracks = []
+    for _ in range(num_frames):
+        velocities = 0.9 * velocities + rng.normal(0, 1.5, (num_players, 2))
+        positions += velocities
+        positions[:, 0] = np.clip(positions[:, 0], player_width, width - player_width)
+        positions[:, 1] = np.clip(positions[:, 1], 0.35 * height + player_height, height - 10)
+
+        lost_tracks = rng.random(num_players) < track_churn
+        for player_index in np.flatnonzero(lost_tracks):
+            track_ids[player_index] = next_track_id
+            next_track_id += 1
+
+        frame_tracks = {}
+        for (x, y), track_id in zip(positions, track_ids):
+            frame_tracks[int(track_id)] = {"bbox": [
+                float(x - player_width / 2),
+                float(y - player_height),
+                float(x + player_width / 2),
+                float(y)
+            ]}
+        player_tracks.append(frame_tracks)
+
+    return player_tracks
+
+
+def generate_ball_tracks(player_tracks, ball_size=14, missing_rate=0.2, outlier_rate=0.03, width=1280, height=720, seed=0):
+    '''
+    Ball held by a player (changing every ~2 seconds) at hand height, with missing detections
+    and a few far away false positives, so the filtering and interpolation have work to do.
+    '''
+    rng = np.random.default_rng(seed + 1)
+
+    ball_tracks = []
+    holder_id = None
+
+    for frame_num, frame_tracks in enumerate(player_tracks):
+        if holder_id not in frame_tracks or frame_num % 48 == 0:
+            holder_id = rng.choice(list(frame_tracks)) if frame_tracks else None
+
+        if holder_id is None or rng.random() < missing_rate:
+            ball_tracks.append({})
+            continue
+
+        x1, y1, x2, y2 = frame_tracks[holder_id]["bbox"]
+        center_x = x2
+        center_y = y1 + 0.55 * (y2 - y1)
+
+        if rng.random() < outlier_rate:
+            center_x = rng.uniform(0, width)
+            center_y = rng.uniform(0, height)
+
+        ball_tracks.append({1: {"bbox": [
+            float(center_x - ball_size / 2),
+            float(center_y - ball_size / 2),
+            float(center_x + ball_size / 2),
+            float(center_y + ball_size / 2)
+        ]}})
+
+    return ball_tracks
+
+
+def generate_player_assignment(player_tracks):
+    # Team given by the parity of the track_id
+    return [
+        {track_id: 1 if track_id % 2 else 2 for track_id in frame_tracks}
+        for frame_tracks in player_tracks
+    ]
+
+
+def draw_court(width, height):
+    court = np.zeros((height, width, 3), dtype=np.uint8)
+    court[:] = (90, 140, 200) # wood
+
+    line_color = (255, 255, 255)
+    cv2.rectangle(court, (int(0.03 * width), int(0.35 * height)), (int(0.97 * width), height - 5), line_color, 3)
+    cv2.line(court, (width // 2, int(0.35 * height)), (width // 2, height - 5), line_color, 3)
+    cv2.ellipse(court, (width // 2, int(0.67 * height)), (int(0.08 * width), int(0.08 * height)), 0, 0, 360, line_color, 3)
+
+    # Crowd
+    court[:int(0.35 * height)] = (40, 40, 50)
+
+    return court
+
+
+def generate_video_frames(player_tracks, ball_tracks, player_assignment=None, width=1280, height=720):
+    '''
+    Frames with the court, a colored box per player (shirt of his team) and the ball,
+    at the positions of the synthetic tracks.
+    '''
+    if player_assignment is None:
+        player_assignment = generate_player_assignment(player_tracks)
+
+    court = draw_court(width, height)
+    frames = []
+
+    for frame_tracks, frame_ball, frame_assignment in zip(player_tracks, ball_tracks, player_assignment):
+        frame = court.copy()
+
+        for track_id, track in frame_tracks.items():
+            x1, y1, x2, y2 = (int(v) for v in track["bbox"])
+            shirt_color = TEAM_COLORS[frame_assignment.get(track_id, 1)]
+            cv2.rectangle(frame, (x1, y1), (x2, y2), (60, 80, 120), cv2.FILLED) # skin / shorts
+            cv2.rectangle(frame, (x1, y1 + (y2 - y1) // 5), (x2, y1 + (y2 - y1) // 2), shirt_color, cv2.FILLED)
+
+        ball_bbox = frame_ball.get(1, {}).get("bbox")
+        if ball_bbox:
+            x1, y1, x2, y2 = ball_bbox
+            cv2.circle(frame, (int((x1 + x2) / 2), int((y1 + y2) / 2)), int((x2 - x1) / 2), (0, 120, 255), cv2.FILLED)
+
+        frames.append(frame)
+
+    return frames
+
+
+def generate_synthetic_game(num_frames=240, num_players=10, width=1280, height=720, seed=0, with_frames=True):
+    '''
+    Everything at once: returns a dict with video_frames (None if with_frames is False),
+    player_tracks, ball_tracks and player_assignment.
+    '''
+    player_tracks = generate_player_tracks(num_frames, num_players, width, height, seed=seed)
+    ball_tracks = generate_ball_tracks(player_tracks, width=width, height=height, seed=seed)
+    player_assignment = generate_player_assignment(player_tracks)
+
+    video_frames = None
+    if with_frames:
+        video_frames = generate_video_frames(player_tracks, ball_tracks, player_assignment, width, height)
+
+    return {
+        "video_frames": video_frames,
+        "player_tracks": player_tracks,
+        "ball_tracks": ball_tracks,
+        "player_assignment": player_assignment
+    }
@@ -0,0 +1,4 @@
+from .court_template import COURT_KEYPOINTS, COURT_WIDTH, COURT_HEIGHT
+from .court_keypoint_detector import CourtKeypointDetector
+from .homography import estimate_homography, transform_points
+from .court_mapper import CourtMapper, map_tracks_to_court
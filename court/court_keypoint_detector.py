@@ -0,0 +1,43 @@
+import numpy as np
+import sys
+sys.path.append("../")
+from utils import profile_stage
+
+
+class CourtKeypointDetector:
+    '''
+    YOLO pose model trained on the court keypoints (see court_template.py for their order).
+    '''
+    def __init__(self, model_path, conf=0.5, keypoint_conf=0.5):
+        # Imported here: the court geometry (used by the heatmaps) doesn't need ultralytics
+        from ultralytics import YOLO
+        self.model = YOLO(model_path)
+        self.conf = conf
+        self.keypoint_conf = keypoint_conf # below it a keypoint is considered not visible
+    
+    def detect_frame(self, frame):
+        '''
+        Returns (keypoints, visible):
+            keypoints -> (num_keypoints, 2) array, pixel coordinates in the frame
+            visible -> (num_keypoints,) bool array, False for the keypoints outside the frame or not found
+        keypoints is None when the court is not found at all.
+        '''
+        with profile_stage("court_keypoint_detector.predict"):
+            detection = self.model.predict(frame, conf=self.conf, verbose=False)[0]
+        
+        if detection.keypoints is None or len(detection.keypoints) == 0:
+            return None, None
+        
+        # One court per frame: the most confident one
+        best_index = int(detection.boxes.conf.cpu().numpy().argmax()) if detection.boxes is not None and len(detection.boxes) else 0
+        keypoints = detection.keypoints.xy.cpu().numpy()[best_index]
+        
+        if detection.keypoints.conf is not None:
+            visible = detection.keypoints.conf.cpu().numpy()[best_index] >= self.keypoint_conf
+        else:
+            visible = np.ones(len(keypoints), dtype=bool)
+        
+        # ultralytics puts the missing keypoints at (0,0)
+        visible &= (keypoints[:, 0] > 0) | (keypoints[:, 1] > 0)
+        
+        return keypoints, visible
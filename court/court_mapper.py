@@ -0,0 +1,196 @@
+import cv2
+import numpy as np
+import sys
+sys.path.append("../")
+from utils import profile_stage, as_boxes, get_centers, get_foot_positions, collect
+from .court_template import COURT_KEYPOINTS, COURT_WIDTH, COURT_HEIGHT
+from .homography import estimate_homography, transform_points
+
+
+class CourtMapper:
+    '''
+    Homography image -> court (meters) for every frame, running the keypoint model only on keyframes.
+
+    Between two keyframes the camera motion is measured with sparse optical flow on a small grayscale
+    copy of the frame (~150 corners tracked from the keyframe, ~1ms):
+
+        camera static (median motion < static_motion) -> the homography of the keyframe is reused
+        camera moving a bit -> propagated: H_frame = H_keyframe @ inverse(motion keyframe -> frame)
+        camera moved too much, flow lost or keyframe_interval frames passed -> new keyframe
+
+                keyframe          reuse     reuse    propagate  propagate   keyframe
+        frame:     0        1  ...  12        13        14   ...   40          41
+        model:    run      -        -         -         -          -          run
+
+    When the keypoint model doesn't find the court on a keyframe (not enough keypoints),
+    the propagated homography is kept and the frame becomes the new reference for the flow.
+    '''
+    def __init__(self,
+                 keypoint_detector,
+                 keyframe_interval=50,
+                 static_motion=0.3,
+                 max_motion=0.15,
+                 motion_size=320,
+                 min_flow_points=20,
+                 retry_interval=5):
+
+        self.keypoint_detector = keypoint_detector
+        self.keyframe_interval = keyframe_interval
+        self.static_motion = static_motion # pixels of the small frame
+        self.max_motion = max_motion # fraction of the small frame width
+        self.motion_size = motion_size # width of the frame used for the optical flow
+        self.min_flow_points = min_flow_points
+        self.retry_interval = retry_interval
+
+        self.reset()
+
+    def reset(self):
+        self.keyframe_num = None
+        self.keyframe_gray = None
+        self.keyframe_features = None
+        self.keyframe_homography = None
+        self.num_keyframes = 0 # times the keypoint model was run
+
+    def get_homographies(self, frames, memory_budget=None):
+        '''
+        memory_budget -> MemoryBudget: the homographies are a ChunkedSequence, filled frame after frame
+        '''
+        with profile_stage("court_mapper.get_homographies", items=len(frames), memory=True):
+            return collect((self.get_homography(frame_num, frame) for frame_num, frame in enumerate(frames)), memory_budget)
+
+    def get_homography(self, frame_num, frame):
+        '''
+        Frames must come in order, one at a time is fine (live mode).
+        Returns the 3x3 homography or None while the court has never been found.
+        '''
+        gray, scale = self._get_small_gray(frame)
+
+        if self.keyframe_num is None:
+            return self._run_keyframe(frame_num, frame, gray, None)
+
+        if self.keyframe_homography is None:
+            # Court not found yet (e.g. close-up): try again every retry_interval frames
+            if frame_num - self.keyframe_num >= self.retry_interval:
+                return self._run_keyframe(frame_num, frame, gray, None)
+            return None
+
+        if frame_num - self.keyframe_num >= self.keyframe_interval:
+            return self._run_keyframe(frame_num, frame, gray, self.keyframe_homography)
+
+        motion = self._estimate_camera_motion(gray)
+
+        if motion is None:
+            # Flow lost (cut, fast pan): nothing to propagate from
+            return self._run_keyframe(frame_num, frame, gray, self.keyframe_homography)
+
+        motion_homography, median_motion = motion
+
+        if median_motion < self.static_motion:
+            return self.keyframe_homography
+
+        if median_motion > self.max_motion * self.motion_size:
+            propagated_homography = self._propagate(motion_homography, scale)
+            return self._run_keyframe(frame_num, frame, gray, propagated_homography)
+
+        return self._propagate(motion_homography, scale)
+
+    def _run_keyframe(self, frame_num, frame, gray, fallback_homography):
+        self.num_keyframes += 1
+        homography = None
+
+        keypoints, visible = self.keypoint_detector.detect_frame(frame)
+        if keypoints is not None:
+            homography = estimate_homography(keypoints[visible], COURT_KEYPOINTS[visible])
+
+        if homography is None:
+            homography = fallback_homography
+
+        self.keyframe_num = frame_num
+        self.keyframe_gray = gray
+        self.keyframe_features = cv2.goodFeaturesToTrack(gray, maxCorners=150, qualityLevel=0.01, minDistance=7)
+        self.keyframe_homography = homography
+
+        return homography
+
+    def _get_small_gray(self, frame):
+        scale = self.motion_size / frame.shape[1]
+        small_frame = cv2.resize(frame, (self.motion_size, round(frame.shape[0] * scale)), interpolation=cv2.INTER_AREA)
+        return cv2.cvtColor(small_frame, cv2.COLOR_BGR2GRAY), scale
+
+    def _estimate_camera_motion(self, gray):
+        '''
+        Returns (homography keyframe -> frame in the small frame, median motion in pixels), or None.
+        The players move too, RANSAC keeps the motion of the background (most of the corners).
+        '''
+        if self.keyframe_features is None or len(self.keyframe_features) < self.min_flow_points:
+            return None
+
+        features, status, _ = cv2.calcOpticalFlowPyrLK(self.keyframe_gray, gray, self.keyframe_features, None)
+        found = status.reshape(-1) == 1
+        if found.sum() < self.min_flow_points:
+            return None
+
+        keyframe_points = self.keyframe_features.reshape(-1, 2)[found]
+        points = features.reshape(-1, 2)[found]
+
+        motion_homography, inliers = cv2.findHomography(keyframe_points, points, cv2.RANSAC, 1.0)
+        if motion_homography is None or inliers.sum() < self.min_flow_points:
+            return None
+
+        inliers = inliers.reshape(-1) == 1
+        median_motion = float(np.median(np.linalg.norm(points[inliers] - keyframe_points[inliers], axis=1)))
+
+        return motion_homography, median_motion
+
+    def _propagate(self, motion_homography, scale):
+        if self.keyframe_homography is None:
+            return None
+
+        # Motion of the small frames -> motion of the full frames
+        scale_matrix = np.diag([scale, scale, 1.0])
+        full_motion_homography = np.linalg.inv(scale_matrix) @ motion_homography @ scale_matrix
+
+        # frame -> keyframe -> court
+        return self.keyframe_homography @ np.linalg.inv(full_motion_homography)
+
+
+def map_tracks_to_court(tracks, homographies, point="foot", margin=2.0, memory_budget=None):
+    '''
+    Court position (meters) of every track on every frame: [{track_id: [x, y]}, ...]
+
+    point -> "foot" (bottom center of the bbox, on the floor: players) or "center" (ball).
+             The ball is in the air most of the time, its position is only the point of the floor behind it.
+    margin -> positions further than this outside the court are dropped (wrong homography or detection)
+    memory_budget -> MemoryBudget: the positions are a ChunkedSequence, filled frame after frame
+
+    Frames without homography get an empty dict.
+    '''
+    return collect(_iter_court_positions(tracks, homographies, point, margin), memory_budget)
+
+
+def _iter_court_positions(tracks, homographies, point, margin):
+    for frame_tracks, homography in zip(tracks, homographies):
+        if homography is None or len(frame_tracks) == 0:
+            yield {}
+            continue
+
+        track_ids = list(frame_tracks.keys())
+        bboxes = as_boxes([frame_tracks[track_id]["bbox"] for track_id in track_ids], dtype=np.float32)
+
+        if point == "foot":
+            image_points = get_foot_positions(bboxes, dtype=np.float32)
+        else:
+            image_points = get_centers(bboxes, dtype=np.float32)
+
+        points = transform_points(homography, image_points)
+
+        inside = (
+            (points[:, 0] >= -margin) & (points[:, 0] <= COURT_WIDTH + margin) &
+            (points[:, 1] >= -margin) & (points[:, 1] <= COURT_HEIGHT + margin)
+        )
+
+        yield {
+            track_id: point_xy.tolist()
+            for track_id, point_xy, is_inside in zip(track_ids, points, inside)
+            if is_inside
+        }
@@ -0,0 +1,59 @@
+import numpy as np
+
+
+'''
+Top-down template of the court, in meters (FIBA court: 28m x 15m), origin in the top-left corner.
+The keypoints are in the order of the court keypoint model (training_notebooks/basketball_court_keypoint_training.ipynb):
+
+     0 ────────────────── 7 ────────────────── 15
+     1                    │                    14
+     2 ──── 8             │            16 ──── 13
+     │      │             │             │      │
+     3 ──── 9             │            17 ──── 12
+     4                    │                    11
+     5 ────────────────── 6 ────────────────── 10
+
+    0-5 -> left sideline (corners, three point line ends, paint corners)
+    6-7 -> ends of the middle line
+    8-9 -> left free throw line
+    10-15 -> right sideline
+    16-17 -> right free throw line
+'''
+
+
+COURT_WIDTH = 28.0 # meters
+COURT_HEIGHT = 15.0
+
+# Distances from the top sideline
+THREE_POINT_LINE_Y = 0.91
+PAINT_TOP_Y = 5.18
+PAINT_BOTTOM_Y = 10.0
+# Distance of the free throw line from the baseline
+FREE_THROW_LINE_X = 5.79
+
+
+COURT_KEYPOINTS = np.array([
+    # Left sideline
+    [0, 0],
+    [0, THREE_POINT_LINE_Y],
+    [0, PAINT_TOP_Y],
+    [0, PAINT_BOTTOM_Y],
+    [0, COURT_HEIGHT - THREE_POINT_LINE_Y],
+    [0, COURT_HEIGHT],
+    # Middle line
+    [COURT_WIDTH / 2, COURT_HEIGHT],
+    [COURT_WIDTH / 2, 0],
+    # Left free throw line
+    [FREE_THROW_LINE_X, PAINT_TOP_Y],
+    [FREE_THROW_LINE_X, PAINT_BOTTOM_Y],
+    # Right sideline
+    [COURT_WIDTH, COURT_HEIGHT],
+    [COURT_WIDTH, COURT_HEIGHT - THREE_POINT_LINE_Y],
+    [COURT_WIDTH, PAINT_BOTTOM_Y],
+    [COURT_WIDTH, PAINT_TOP_Y],
+    [COURT_WIDTH, THREE_POINT_LINE_Y],
+    [COURT_WIDTH, 0],
+    # Right free throw line
+    [COURT_WIDTH - FREE_THROW_LINE_X, PAINT_TOP_Y],
+    [COURT_WIDTH - FREE_THROW_LINE_X, PAINT_BOTTOM_Y],
+], dtype=np.float32)
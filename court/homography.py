@@ -0,0 +1,33 @@
+import cv2
+import numpy as np
+
+
+def estimate_homography(image_points, court_points, min_points=4, ransac_threshold=0.5):
+    '''
+    Homography image -> court from matching points (at least 4, no 3 of them aligned).
+    ransac_threshold is in court units (meters): the keypoints badly placed by the model are left out.
+    Returns the 3x3 matrix, or None when there are not enough good points.
+    '''
+    image_points = np.asarray(image_points, dtype=np.float32).reshape(-1, 2)
+    court_points = np.asarray(court_points, dtype=np.float32).reshape(-1, 2)
+    
+    if len(image_points) < min_points:
+        return None
+    
+    homography, inliers = cv2.findHomography(image_points, court_points, cv2.RANSAC, ransac_threshold)
+    
+    if homography is None or inliers is None or inliers.sum() < min_points:
+        return None
+    
+    return homography
+
+
+def transform_points(homography, points):
+    '''
+    (N, 2) points -> (N, 2) points, all of them in one call
+    '''
+    points = np.asarray(points, dtype=np.float32).reshape(-1, 1, 2)
+    if len(points) == 0:
+        return np.empty((0, 2), dtype=np.float32)
+    
+    return cv2.perspectiveTransform(points, homography).reshape(-1, 2)
@@ -1,3 +1,7 @@
 from .player_tracks_drawer import PlayerTracksDrawer
 from .ball_tracks_drawer import BallTracksDrawer
-from .team_ball_control_drawer import TeamBallControlDrawer
\ No newline at end of file
+from .team_ball_control_drawer import TeamBallControlDrawer
+from .speed_drawer import SpeedDrawer
+from .heatmap_drawer import HeatmapDrawer
+from .layers import PlayerTracksLayer, BallTracksLayer, PossessionLayer, TeamBallControlLayer, SpeedLayer, HeatmapLayer
+from .frame_renderer import FrameRenderer
@@ -3,6 +3,20 @@ from .utils import draw_triangle
 class BallTracksDrawer:
     def __init__(self):
         self.ball_pointer_color = (0,255,0) # Green color
+    
+    def draw_frame(self, frame, ball_dict):
+        '''
+        Draws the ball pointer of a single frame directly on `frame` (no copy).
+        '''
+        for _, track in ball_dict.items():
+            bbox = track.get("bbox")
+            
+            if not bbox:
+                continue
+            
+            frame = draw_triangle(frame, bbox, self.ball_pointer_color)
+        
+        return frame
         
     def draw(self, video_frames, tracks):
         outpout_video_frames = []
@@ -11,14 +25,8 @@ class BallTracksDrawer:
             output_frame = frame.copy()
             ball_dict = tracks[frame_num]
             
-            for _, track in ball_dict.items():
-                bbox = track["bbox"]
-                
-                if bbox is None:
-                    continue
-                
-                output_frame = draw_triangle(frame, bbox, self.ball_pointer_color)
+            output_frame = self.draw_frame(output_frame, ball_dict)
             
             outpout_video_frames.append(output_frame)
         
-        return outpout_video_frames
\ No newline at end of file
+        return outpout_video_frames
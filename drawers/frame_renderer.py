@@ -0,0 +1,203 @@
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+import multiprocessing
+import sys
+sys.path.append("../")
+from utils import create_video_writer, profile_stage, SharedFrameStore
+
+
+# State of a rendering worker process, set once by _init_render_worker
+_worker_frame_store = None
+_worker_frame_renderer = None
+
+
+def _init_render_worker(frame_store_handle, layers):
+    global _worker_frame_store, _worker_frame_renderer
+    _worker_frame_store = SharedFrameStore.attach(frame_store_handle)
+    _worker_frame_renderer = FrameRenderer(layers)
+
+
+def _get_worker_context():
+    '''
+    Start method of the rendering workers: never fork.
+    The pipeline runs other stages on its threads while rendering, a worker forked while one of them
+    holds a lock (e.g. the one of drawers.utils.sprite_cache) would inherit it locked and hang on it.
+    A forkserver (or spawn) worker starts from a fresh interpreter, with its own empty caches.
+    '''
+    start_method = "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+    return multiprocessing.get_context(start_method)
+
+
+def _render_frame_in_store(frame_num):
+    '''
+    Draws the frame in place, in its slot of the shared frame store: only frame_num goes through the pipe.
+    '''
+    frame = _worker_frame_store.get(frame_num)
+    rendered_frame = _worker_frame_renderer.render_frame(frame, frame_num)
+    
+    if rendered_frame is not frame:
+        # A layer returned a new frame instead of drawing in place
+        frame[:] = rendered_frame
+    
+    return frame_num
+
+
+class FrameRenderer:
+    '''
+    Single pass renderer: every frame is visited exactly once and all the layers
+    (players, ball, possession marker, team ball control, ...) are drawn on it in place,
+    then the frame goes straight to the video writer.
+    
+    Chaining the drawers (PlayerTracksDrawer.draw -> BallTracksDrawer.draw -> ...) copies
+    every frame and builds a new full length list at each step, i.e. one extra copy of the
+    whole video in RAM per drawer. Here the only frames alive besides the input are the ones
+    being drawn.
+    
+    With num_workers > 1 the frames are drawn in parallel on a thread pool. Drawing a frame
+    only depends on that frame (and on read-only track data), and the OpenCV drawing calls
+    release the GIL, so threads can really work at the same time. Threads share the frame
+    buffers, nothing gets pickled or copied.
+    
+    With mode="process" the frames are drawn by a pool of processes instead (for layers that hold
+    the GIL, e.g. numpy work in python loops). The frames go through a SharedFrameStore: the
+    renderer copies each frame once in a shared slot, the worker draws on the slot, and the
+    rendered frame is read back from it. Only frame numbers are pickled; the layers
+    are sent once to each worker when it starts. The profile of the drawing stays in the workers.
+    The workers are started with forkserver (spawn where it doesn't exist), not fork, see _get_worker_context.
+    Every worker gets its own copy of the layers and of their data: a ChunkedSequence is pickled as a full list.
+    
+    NOTE: the frames are modified in place, pass copies if the originals are still needed.
+    In process mode the frames yielded by iter_rendered_frames are views on the shared slots,
+    only valid until the next one is requested: copy them to keep them.
+    '''
+    def __init__(self, layers, num_workers=1, mode="thread"):
+        if mode not in ("thread", "process"):
+            raise ValueError(f"Unknown render mode: {mode}")
+        
+        self.layers = list(layers)
+        self.layer_names = [f"draw.{type(layer).__name__}" for layer in self.layers]
+        self.num_workers = num_workers
+        self.mode = mode
+        
+        # Frames submitted but not yet written. 
+        # Bounds the memory used by the workers (and how far ahead of the writer they can go)
+        self.max_frames_in_flight = 4 * num_workers
+    
+    def render_frame(self, frame, frame_num):
+        with profile_stage("render_frame"):
+            for layer, layer_name in zip(self.layers, self.layer_names):
+                with profile_stage(layer_name):
+                    frame = layer.draw_frame(frame, frame_num)
+        return frame
+    
+    def iter_rendered_frames(self, video_frames):
+        '''
+        Yields the rendered frames, always in the same order as video_frames.
+        '''
+        if self.num_workers <= 1:
+            for frame_num, frame in enumerate(video_frames):
+                yield self.render_frame(frame, frame_num)
+            return
+        
+        if self.mode == "process":
+            yield from self._iter_rendered_frames_processes(video_frames)
+            return
+        
+        yield from self._iter_rendered_frames_parallel(video_frames)
+    
+    def _iter_rendered_frames_parallel(self, video_frames):
+        '''
+        Reorder buffer: futures are queued in submission (= frame) order and we always
+        wait on the oldest one. A worker that finishes frame 12 before frame 11 is done
+        just leaves it in the queue until frame 11 has been handed out, so the writer
+        receives the frames in order no matter which thread finishes first.
+        
+            submitted:  [10] [11] [12] [13]      <- deque, oldest on the left
+            finished:         ✓    ✓             
+            yield 10 (wait for it) -> then 11, 12 immediately -> then wait for 13
+        '''
+        pending = deque()
+        
+        with ThreadPoolExecutor(max_workers=self.num_workers) as executor:
+            for frame_num, frame in enumerate(video_frames):
+                pending.append(executor.submit(self.render_frame, frame, frame_num))
+                
+                if len(pending) >= self.max_frames_in_flight:
+                    yield pending.popleft().result()
+            
+            while pending:
+                yield pending.popleft().result()
+    
+    def _iter_rendered_frames_processes(self, video_frames):
+        '''
+        Same reorder buffer as _iter_rendered_frames_parallel, the futures only carry frame numbers.
+        A slot is released once the frame it holds has been handed out (and written),
+        so at most max_frames_in_flight slots are in use.
+        '''
+        video_frames = iter(video_frames)
+        first_frame = next(video_frames, None)
+        if first_frame is None:
+            return
+        
+        mp_context = _get_worker_context()
+        frame_store = SharedFrameStore.create(self.max_frames_in_flight + 1, first_frame.shape, mp_context=mp_context)
+        pending = deque()
+        
+        def iter_frames():
+            yield first_frame
+            yield from video_frames
+        
+        try:
+            with ProcessPoolExecutor(
+                max_workers=self.num_workers,
+                mp_context=mp_context,
+                initializer=_init_render_worker,
+                initargs=(frame_store.handle, self.layers)
+            ) as executor:
+                for frame_num, frame in enumerate(iter_frames()):
+                    frame_store.put(frame_num, frame)
+                    pending.append(executor.submit(_render_frame_in_store, frame_num))
+                    
+                    if len(pending) >= self.max_frames_in_flight:
+                        yield from self._yield_from_store(frame_store, pending.popleft())
+                
+                while pending:
+                    yield from self._yield_from_store(frame_store, pending.popleft())
+        finally:
+            frame_store.close()
+    
+    def _yield_from_store(self, frame_store, future):
+        frame_num = future.result()
+        yield frame_store.get(frame_num)
+        frame_store.release(frame_num)
+    
+    def render(self, video_frames, output_video_path, fps=24):
+        '''
+        video_frames can be any iterable of frames (a list, or a generator like iter_video),
+        so the video never needs to be fully loaded in memory.
+        
+        Returns the number of frames written.
+        '''
+        with profile_stage("render", memory=True) as span:
+            num_frames = self._render(video_frames, output_video_path, fps)
+            span.items = num_frames
+        
+        return num_frames
+    
+    def _render(self, video_frames, output_video_path, fps):
+        writer = None
+        num_frames = 0
+        
+        try:
+            for frame in self.iter_rendered_frames(video_frames):
+                # The writer needs the frame size, so it is created with the first frame
+                if writer is None:
+                    writer = create_video_writer(output_video_path, (frame.shape[1], frame.shape[0]), fps)
+                
+                writer.write(frame)
+                num_frames += 1
+        finally:
+            if writer is not None:
+                writer.release()
+        
+        return num_frames
@@ -0,0 +1,116 @@
+import cv2
+import numpy as np
+
+
+class HeatmapDrawer:
+    '''
+    Draws the counts of a HeatmapGrid (heatmaps/) as a color overlay:
+
+        unit "px" -> on the image, over the area of the grid (fixed camera)
+        unit "m"  -> on a small top-down court in the top-left corner of the frame
+
+    The grid is small (e.g. 30x56): it is blurred and colored at that size, and only then resized,
+    so an overlay costs one resize and one blend per frame. get_overlay() can be cached between frames.
+    '''
+    def __init__(self):
+        self.alpha = 0.5 # opacity of the colors
+        self.colormap = cv2.COLORMAP_JET
+        self.blur_cells = 1.0 # Gaussian blur, in cells
+        self.min_intensity = 0.05 # cells below this fraction of the maximum stay transparent
+        self.inset_width = 0.3 # court heatmaps: fraction of the frame width
+        self.inset_margin = 20
+        self.court_color = (60, 90, 140)
+        self.line_color = (255, 255, 255)
+
+    def get_intensity(self, counts):
+        '''
+        Counts -> float32 between 0 and 1, square root so that the less visited cells still show.
+        '''
+        intensity = np.sqrt(np.asarray(counts, dtype=np.float32))
+        if self.blur_cells > 0:
+            intensity = cv2.GaussianBlur(intensity, (0, 0), self.blur_cells)
+
+        max_intensity = intensity.max() if intensity.size else 0
+        if max_intensity > 0:
+            intensity /= max_intensity
+        return intensity
+
+    def get_overlay(self, counts, width, height):
+        '''
+        Returns (colors, mask): (height, width, 3) uint8 colored counts and the (height, width) bool mask
+        of the pixels to color.
+        '''
+        intensity = self.get_intensity(counts)
+        intensity = cv2.resize(intensity, (width, height), interpolation=cv2.INTER_LINEAR)
+
+        colors = cv2.applyColorMap((intensity * 255).astype(np.uint8), self.colormap)
+        return colors, intensity >= self.min_intensity
+
+    def render_image(self, counts, width, height, unit="m"):
+        '''
+        Stand-alone picture of the heatmap (exports): on a court drawing for "m", on black for "px".
+        '''
+        if unit == "m":
+            image = self.draw_court(np.empty((height, width, 3), dtype=np.uint8))
+        else:
+            image = np.zeros((height, width, 3), dtype=np.uint8)
+
+        colors, mask = self.get_overlay(counts, width, height)
+        return self.blend(image, colors, mask)
+
+    def draw_court(self, image):
+        '''
+        Top-down court lines on the whole image, in place.
+        '''
+        height, width = image.shape[:2]
+        image[:] = self.court_color
+
+        cv2.rectangle(image, (0, 0), (width - 1, height - 1), self.line_color, 2)
+        cv2.line(image, (width // 2, 0), (width // 2, height - 1), self.line_color, 1)
+        cv2.circle(image, (width // 2, height // 2), max(int(height * 0.12), 1), self.line_color, 1)
+        return image
+
+    def blend(self, image, colors, mask):
+        blended = cv2.addWeighted(image, 1 - self.alpha, colors, self.alpha, 0)
+        np.copyto(image, blended, where=mask[:, :, None])
+        return image
+
+    def get_region(self, frame_shape, extent, unit):
+        '''
+        (x1, y1, x2, y2) of the frame where the heatmap goes.
+        '''
+        frame_height, frame_width = frame_shape[:2]
+
+        if unit == "m":
+            x_min, y_min, x_max, y_max = extent
+            width = int(frame_width * self.inset_width)
+            height = int(width * (y_max - y_min) / (x_max - x_min))
+            return self.inset_margin, self.inset_margin, self.inset_margin + width, self.inset_margin + height
+
+        x1, y1, x2, y2 = (int(round(value)) for value in extent)
+        return max(x1, 0), max(y1, 0), min(x2, frame_width), min(y2, frame_height)
+
+    def draw_overlay(self, frame, overlay, region, unit):
+        '''
+        Draws an overlay of get_overlay() on `frame` in place, in the region of get_region().
+        '''
+        x1, y1, x2, y2 = region
+        colors, mask = overlay
+        frame_region = frame[y1:y2, x1:x2]
+        if frame_region.shape[:2] != mask.shape:
+            # Inset larger than the frame
+            return frame
+
+        if unit == "m":
+            self.draw_court(frame_region)
+
+        self.blend(frame_region, colors, mask)
+        return frame
+
+    def draw_frame(self, frame, counts, extent, unit):
+        region = self.get_region(frame.shape, extent, unit)
+        x1, y1, x2, y2 = region
+        if x2 <= x1 or y2 <= y1:
+            return frame
+
+        return self.draw_overlay(frame, self.get_overlay(counts, x2 - x1, y2 - y1), region, unit)
@@ -0,0 +1,135 @@
+from .player_tracks_drawer import PlayerTracksDrawer
+from .ball_tracks_drawer import BallTracksDrawer
+from .team_ball_control_drawer import TeamBallControlDrawer
+from .speed_drawer import SpeedDrawer
+from .heatmap_drawer import HeatmapDrawer
+from .utils import draw_triangle
+import sys
+sys.path.append("../")
+from ball_acquisition import TeamBallControl
+
+
+'''
+A layer binds a drawer to the per-frame data it needs, so that it can be asked to
+draw "frame number N" without knowing anything about the rest of the pipeline.
+
+Every layer exposes the same method:
+
+    draw_frame(frame, frame_num) -> frame
+
+and draws directly on `frame` (no copy). The FrameRenderer stacks the layers and
+calls them one after the other on each frame.
+'''
+
+
+class PlayerTracksLayer:
+    def __init__(self, player_tracks, player_assignment, drawer=None):
+        self.player_tracks = player_tracks
+        self.player_assignment = player_assignment
+        self.drawer = drawer if drawer is not None else PlayerTracksDrawer()
+    
+    def draw_frame(self, frame, frame_num):
+        return self.drawer.draw_frame(
+            frame,
+            self.player_tracks[frame_num],
+            self.player_assignment[frame_num]
+        )
+
+
+class BallTracksLayer:
+    def __init__(self, ball_tracks, drawer=None):
+        self.ball_tracks = ball_tracks
+        self.drawer = drawer if drawer is not None else BallTracksDrawer()
+    
+    def draw_frame(self, frame, frame_num):
+        return self.drawer.draw_frame(frame, self.ball_tracks[frame_num])
+
+
+class PossessionLayer:
+    '''
+    Marks the player that currently has the ball with a triangle on top of his bbox.
+    '''
+    def __init__(self, player_tracks, ball_acquisition, color=(0,0,255)):
+        self.player_tracks = player_tracks
+        self.ball_acquisition = ball_acquisition
+        self.color = color # Red color
+    
+    def draw_frame(self, frame, frame_num):
+        player_id_has_ball = self.ball_acquisition[frame_num]
+        
+        if player_id_has_ball == -1:
+            return frame
+        
+        player_info = self.player_tracks[frame_num].get(player_id_has_ball)
+        if player_info is None:
+            return frame
+        
+        return draw_triangle(frame, player_info["bbox"], self.color)
+
+
+class TeamBallControlLayer:
+    def __init__(self, player_assignment, ball_acquisition, drawer=None):
+        self.drawer = drawer if drawer is not None else TeamBallControlDrawer()
+        # Computed once for the whole video, each frame just looks its value up
+        self.team_ball_control = TeamBallControl.from_ball_acquisition(player_assignment, ball_acquisition)
+    
+    def draw_frame(self, frame, frame_num):
+        return self.drawer.draw_frame(frame, frame_num, self.team_ball_control)
+
+
+class SpeedLayer:
+    '''
+    player_motion -> PlayerMotion of the whole video (speed_and_distance), the speeds are looked up, not recomputed
+    '''
+    def __init__(self, player_tracks, player_motion, drawer=None):
+        self.player_tracks = player_tracks
+        self.player_motion = player_motion
+        self.drawer = drawer if drawer is not None else SpeedDrawer()
+    
+    def draw_frame(self, frame, frame_num):
+        return self.drawer.draw_frame(
+            frame,
+            self.player_tracks[frame_num],
+            self.player_motion.get_frame_speeds(frame_num),
+            self.player_motion.unit
+        )
+
+
+class HeatmapLayer:
+    '''
+    Heatmap of one key of a HeatmapGrid (heatmaps/), e.g. the occupancy of a team:
+        HeatmapLayer(occupancy_heatmaps.team_grid, 1)
+
+    window_frames -> None: since the start of the video, or the last window_frames frames
+    refresh_frames -> the overlay is recomputed every refresh_frames frames, and reused in between
+    '''
+    def __init__(self, heatmap_grid, key, window_frames=None, refresh_frames=24, drawer=None):
+        self.heatmap_grid = heatmap_grid
+        self.key = key
+        self.window_frames = window_frames
+        self.refresh_frames = refresh_frames
+        self.drawer = drawer if drawer is not None else HeatmapDrawer()
+
+        # Only the last overlay: the frames come (nearly) in order
+        self.cached_overlay = None
+
+    def draw_frame(self, frame, frame_num):
+        # Frames until the last refresh, the heatmap doesn't show the future
+        end = (frame_num + 1) // self.refresh_frames * self.refresh_frames
+        start = 0 if self.window_frames is None else max(end - self.window_frames, 0)
+
+        region = self.drawer.get_region(frame.shape, self.heatmap_grid.extent, self.heatmap_grid.unit)
+        x1, y1, x2, y2 = region
+        if x2 <= x1 or y2 <= y1:
+            return frame
+
+        cache_key = (start, end, region)
+        cached_overlay = self.cached_overlay # one read: other threads may replace it
+        if cached_overlay is not None and cached_overlay[0] == cache_key:
+            overlay = cached_overlay[1]
+        else:
+            counts = self.heatmap_grid.get(self.key, start, end)
+            overlay = self.drawer.get_overlay(counts, x2 - x1, y2 - y1)
+            self.cached_overlay = (cache_key, overlay)
+
+        return self.drawer.draw_overlay(frame, overlay, region, self.heatmap_grid.unit)
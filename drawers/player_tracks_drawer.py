@@ -8,6 +8,31 @@ class PlayerTracksDrawer:
         
         self.team1_color = team1_color
         self.team2_color = team2_color
+        
+        self.ball_holder_color = (0,0,255) # Red color
+    
+    def draw_frame(self, frame, player_dict, player_assignment_for_frame, player_id_has_ball=-1):
+        '''
+        Draws the players of a single frame directly on `frame` (no copy).
+        
+        player_dict -> {track_id: {"bbox": [x1,y1,x2,y2]}} for this frame
+        player_assignment_for_frame -> {track_id: team_id} for this frame
+        player_id_has_ball -> track_id of the player with the ball, -1 if nobody has it
+        '''
+        for track_id, player_bbox in player_dict.items():
+            team_id = player_assignment_for_frame.get(track_id, self.default_player_team_id)
+            
+            if team_id == 1:
+                color = self.team1_color
+            else: 
+                color = self.team2_color
+            
+            if track_id == player_id_has_ball:
+                frame = draw_triangle(frame, player_bbox["bbox"], self.ball_holder_color)
+            
+            frame = draw_ellipse(frame, player_bbox["bbox"], color, track_id)
+        
+        return frame
     
     def draw(self, video_frames, tracks, player_assignment, ball_acquisition):
         
@@ -25,23 +50,10 @@ class PlayerTracksDrawer:
             player_id_has_ball = ball_acquisition[frame_num]
             
             # Draw players tracks
-            for track_id, player_bbox in player_dict.items():
-                team_id = player_assignment_for_frame.get(track_id, self.default_player_team_id)
-                
-                if team_id == 1:
-                    color = self.team1_color
-                else: 
-                    color = self.team2_color
-                
-                if track_id == player_id_has_ball:
-                    frame = draw_triangle(frame, player_bbox["bbox"], (0,0,255))
-                
-                frame = draw_ellipse(frame, player_bbox["bbox"], color, track_id)
+            frame = self.draw_frame(frame, player_dict, player_assignment_for_frame, player_id_has_ball)
               
             # Put the append outside the loop since we want to avoid adding N frames of the same thing
             # e.g. with 8 players detected in a particular moment -> 8 frames appended -> slow output video 
             output_video_frames.append(frame)
             
         return output_video_frames
-                
-            
\ No newline at end of file
@@ -0,0 +1,37 @@
+import cv2
+
+
+class SpeedDrawer:
+    '''
+    Speed of every player under his track_id label.
+    The speeds are the ones already computed by the PlayerMotionAnalyzer, the drawer only formats them.
+    '''
+    def __init__(self):
+        self.text_color = (255,255,255)
+        self.background_color = (0,0,0)
+        self.font_scale = 0.45
+    
+    def draw_frame(self, frame, player_dict, frame_speeds, unit="m"):
+        '''
+        frame_speeds -> {track_id: speed in units per second}, see PlayerMotion.get_frame_speeds
+        Draws directly on `frame` (no copy).
+        '''
+        for track_id, speed in frame_speeds.items():
+            track = player_dict.get(track_id)
+            if track is None:
+                continue
+            
+            x1, _, x2, y2 = track["bbox"]
+            
+            # km/h for the court coordinates, px/s is only a relative value
+            text = f"{speed * 3.6:.1f} km/h" if unit == "m" else f"{speed:.0f} px/s"
+            
+            (text_width, text_height), baseline = cv2.getTextSize(text, cv2.FONT_HERSHEY_SIMPLEX, self.font_scale, 1)
+            # Below the track_id rectangle of draw_ellipse (which ends at y2 + 25)
+            x_text = int((x1 + x2) / 2 - text_width / 2)
+            y_text = int(y2 + 30 + text_height)
+            
+            cv2.rectangle(frame, (x_text - 2, y_text - text_height - 2), (x_text + text_width + 2, y_text + baseline), self.background_color, cv2.FILLED)
+            cv2.putText(frame, text, (x_text, y_text), cv2.FONT_HERSHEY_SIMPLEX, self.font_scale, self.text_color, 1)
+        
+        return frame
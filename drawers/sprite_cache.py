@@ -0,0 +1,202 @@
+from collections import OrderedDict
+import threading
+import cv2
+import numpy as np
+
+
+'''
+Pre-rendered overlay sprites.
+
+The track_id label under every player and the triangle markers look exactly the same
+in every frame, only their position changes. Instead of filling a rectangle, rasterizing
+the text and building a new contour for every player in every frame, each sprite is drawn
+once on a small tile (colors + mask of the pixels actually drawn) and then copied into the
+frame with array slicing:
+
+    tile (colors)          mask                      frame
+    +-----------+          +-----------+             ...........
+    |  ███12███ |    +     |  ███████  |    ->       ...███12███.
+    +-----------+          +-----------+             ...........
+
+Drawing is done by the same OpenCV calls with the same relative coordinates, 
+so the pixels are identical to drawing directly on the frame. The few cases where that
+wouldn't hold are left to the caller, which draws directly as before:
+    - the sprite crosses the frame border (OpenCV clips the shape before rasterizing it)
+    - the label text sticks out of its rectangle (the text is blended with the frame below it)
+'''
+
+
+class Sprite:
+    def __init__(self, image, mask, offset_x, offset_y):
+        self.image = image # (h, w, 3) uint8 colors
+        self.mask = mask # (h, w, 3) bool, True where the sprite has been drawn. None if the tile is fully opaque
+        # Position of the tile's top-left corner relative to the anchor point of the sprite
+        self.offset_x = offset_x
+        self.offset_y = offset_y
+    
+    def blit(self, frame, anchor_x, anchor_y):
+        '''
+        Copies the sprite on the frame (in place).
+        
+        Returns False (and draws nothing) when the tile doesn't fit entirely in the frame:
+        OpenCV rasterizes shapes that cross the frame border slightly differently 
+        (it clips the polygon before filling it), so those have to be drawn directly 
+        to get the same pixels.
+        '''
+        frame_height, frame_width = frame.shape[:2]
+        tile_height, tile_width = self.image.shape[:2]
+        
+        x1 = anchor_x + self.offset_x
+        y1 = anchor_y + self.offset_y
+        x2 = x1 + tile_width
+        y2 = y1 + tile_height
+        
+        if x1 < 0 or y1 < 0 or x2 > frame_width or y2 > frame_height:
+            return False
+        
+        if self.mask is None:
+            frame[y1:y2, x1:x2] = self.image
+        else:
+            np.copyto(frame[y1:y2, x1:x2], self.image, where=self.mask)
+        
+        return True
+
+
+class SpriteCache:
+    '''
+    LRU cache of the rendered sprites. 
+    When more than max_size sprites are stored, the least recently used one is evicted
+    (e.g. labels of track_ids that haven't been on screen for a while).
+    
+    Thread safe, so it can be shared by the FrameRenderer workers.
+    '''
+    
+    # Label drawn under each player (see draw_ellipse)
+    label_width = 40
+    label_height = 20
+    label_font_scale = 0.6
+    label_font_thickness = 2
+    label_text_color = (0,165,255) # Orange color
+    
+    # Triangle drawn on top of a bbox (see draw_triangle)
+    triangle_width = 20
+    triangle_height = 20
+    triangle_border_thickness = 2
+    
+    def __init__(self, max_size=256):
+        self.max_size = max_size
+        self.sprites = OrderedDict()
+        self.lock = threading.Lock()
+    
+    def get_label(self, track_id, color):
+        '''
+        Returns None if this label can't be pre-rendered.
+        '''
+        color = tuple(int(c) for c in color)
+        return self._get(("label", track_id, color), lambda: self._render_label(track_id, color))
+    
+    def get_triangle(self, color):
+        color = tuple(int(c) for c in color)
+        return self._get(("triangle", color), lambda: self._render_triangle(color))
+    
+    def clear(self):
+        with self.lock:
+            self.sprites.clear()
+    
+    def __len__(self):
+        return len(self.sprites)
+    
+    def _get(self, key, render):
+        with self.lock:
+            if key in self.sprites:
+                self.sprites.move_to_end(key)
+                return self.sprites[key]
+        
+        # Rendering is done outside the lock, 
+        # in the worst case two threads render the same sprite once each
+        sprite = render()
+        
+        with self.lock:
+            self.sprites[key] = sprite
+            self.sprites.move_to_end(key)
+            while len(self.sprites) > self.max_size:
+                self.sprites.popitem(last=False)
+        
+        return sprite
+    
+    def _render_label(self, track_id, color):
+        '''
+        Anchor point = top-left corner of the label rectangle.
+        
+        Returns None when the text sticks out of the rectangle (e.g. 4 digit track_ids):
+        the text is blended with whatever is below it, so outside of the rectangle 
+        its pixels depend on the frame and can't be pre-rendered.
+        '''
+        text = str(track_id)
+        
+        text_x = 12
+        if track_id > 99:
+            text_x -= 10 # So we have more space for the 3 digit track_id
+        text_y = 15
+        
+        # Draw on a canvas larger than the rectangle to see if the text goes out of it
+        pad = 2 * self.label_font_thickness + self.label_height
+        canvas = np.zeros((self.label_height + 1 + 2*pad, self.label_width + 1 + 2*pad), dtype=np.uint8)
+        cv2.putText(canvas, 
+                    text, 
+                    (text_x + pad, text_y + pad), 
+                    cv2.FONT_HERSHEY_SIMPLEX, 
+                    self.label_font_scale, 
+                    255, 
+                    self.label_font_thickness)
+        
+        text_pixels_in_rect = canvas[pad:pad + self.label_height + 1, pad:pad + self.label_width + 1]
+        if np.count_nonzero(text_pixels_in_rect) != np.count_nonzero(canvas):
+            return None
+        
+        # The rectangle is filled, so the tile is fully opaque: no mask needed
+        image = np.zeros((self.label_height + 1, self.label_width + 1, 3), dtype=np.uint8)
+        cv2.rectangle(image, (0, 0), (self.label_width, self.label_height), color, cv2.FILLED)
+        cv2.putText(image, 
+                    text, 
+                    (text_x, text_y), 
+                    cv2.FONT_HERSHEY_SIMPLEX, 
+                    self.label_font_scale, 
+                    self.label_text_color, 
+                    self.label_font_thickness)
+        
+        return Sprite(image, None, 0, 0)
+    
+    def _render_triangle(self, color):
+        '''
+        Anchor point = tip of the triangle (center of the top edge of the bbox).
+        '''
+        pad = self.triangle_border_thickness + 1
+        half_width = self.triangle_width // 2
+        left = -half_width - pad
+        top = -self.triangle_height - pad
+        
+        def draw(canvas, fill_color, border_color):
+            triangle_points = np.array([
+                [0, 0],
+                [-half_width, -self.triangle_height], # upper-left
+                [half_width, -self.triangle_height] # upper-right
+            ], dtype=np.int32) - np.array([left, top], dtype=np.int32)
+            cv2.drawContours(canvas, [triangle_points], 0, fill_color, cv2.FILLED) #filling
+            cv2.drawContours(canvas, [triangle_points], 0, border_color, self.triangle_border_thickness) #border
+        
+        return self._render(draw, 2*(half_width + pad) + 1, self.triangle_height + 2*pad + 1, left, top, color, (0,0,0))
+    
+    def _render(self, draw, width, height, offset_x, offset_y, color1, color2):
+        # Same drawing twice: once with the real colors, once in white on black to get the mask
+        image = np.zeros((height, width, 3), dtype=np.uint8)
+        draw(image, color1, color2)
+        
+        mask = np.zeros((height, width), dtype=np.uint8)
+        draw(mask, 255, 255)
+        
+        # The mask is repeated on the 3 channels: np.copyto is much faster with a mask
+        # of the same shape than with one that has to be broadcast
+        mask = np.repeat((mask > 0)[:, :, None], 3, axis=2)
+        
+        return Sprite(image, mask, offset_x, offset_y)
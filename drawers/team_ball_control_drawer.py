@@ -1,36 +1,23 @@
-import numpy as np
 import cv2
+import sys
+sys.path.append("../")
+from ball_acquisition import TeamBallControl, get_team_ball_control
 
 class TeamBallControlDrawer:
     def __init__(self):
-        pass
+        self.alpha = 0.8 # opacity of the white box behind the text
     
     def get_team_ball_control(self, player_assignment, ball_acquisition):
         
-        team_ball_control = []
-        
-        for player_assignment_frame, ball_acquisition_frame in zip(player_assignment, ball_acquisition):
-            if ball_acquisition_frame == -1:
-                team_ball_control.append(-1)
-                continue
-            
-            if ball_acquisition_frame not in player_assignment_frame:
-                team_ball_control.append(-1)
-                continue
-            
-            if player_assignment_frame[ball_acquisition_frame] == 1:
-                team_ball_control.append(1)
-            else:
-                team_ball_control.append(2)
-                
-        team_ball_control = np.array(team_ball_control)
+        team_ball_control = get_team_ball_control(player_assignment, ball_acquisition)
         
         return team_ball_control
         
     
     def draw(self, video_frames, player_assignment, ball_acquisition):
         
-        team_ball_control = self.get_team_ball_control(player_assignment, ball_acquisition)
+        # Percentages are accumulated once for the whole video
+        team_ball_control = TeamBallControl.from_ball_acquisition(player_assignment, ball_acquisition)
         
         output_video_frames = []
         
@@ -38,19 +25,33 @@ class TeamBallControlDrawer:
             if frame_num == 0:
                 continue
             
-            frame_drawn = self.draw_frame(frame, frame_num, team_ball_control)
+            frame_drawn = self.draw_frame(frame.copy(), frame_num, team_ball_control)
             output_video_frames.append(frame_drawn)
         
         return output_video_frames
     
     def draw_frame(self, frame, frame_num, team_ball_control):
+        '''
+        Draws on `frame` in place.
+        team_ball_control is a TeamBallControl (a plain per frame array is also accepted,
+        but then the cumulative counts are rebuilt on every call).
+        '''
+        if not isinstance(team_ball_control, TeamBallControl):
+            team_ball_control = TeamBallControl(team_ball_control)
         
-        overlay = frame.copy()
+        team1, team2 = team_ball_control.get_control_till_frame(frame_num)
+        
+        return self.draw_control(frame, team1, team2)
+    
+    def draw_control(self, frame, team1, team2):
+        '''
+        Draws the box with the ball control of the two teams (fractions between 0 and 1) on `frame` in place.
+        '''
         font_scale = 0.7
         font_thickness = 2
         
         # Overlay position
-        frame_height, frame_width = overlay.shape[:2]
+        frame_height, frame_width = frame.shape[:2]
         rect_x1 = int(frame_width * 0.60)
         rect_y1 = int(frame_height * 0.75)
         rect_x2 = int(frame_width * 0.99)
@@ -61,16 +62,10 @@ class TeamBallControlDrawer:
         text_y1 = int(frame_height * 0.80)
         text_y2 = int(frame_height * 0.88)
         
-        cv2.rectangle(overlay, (rect_x1, rect_y1), (rect_x2, rect_y2), (255,255,255),-1)
-        alpha = 0.8
-        cv2.addWeighted(overlay, alpha, frame, 1-alpha, 0, frame)
-        
-        team_ball_control_till_frame = team_ball_control[:frame_num+1]
-        team1_num_frames = team_ball_control_till_frame[team_ball_control_till_frame == 1].shape[0]
-        team2_num_frames = team_ball_control_till_frame[team_ball_control_till_frame == 2].shape[0]
-        
-        team1 = team1_num_frames/(team_ball_control_till_frame.shape[0])
-        team2 = team2_num_frames/(team_ball_control_till_frame.shape[0])
+        # Blend the white box only on its own region (the rectangle corners are inclusive):
+        # alpha*white + (1-alpha)*frame, written back into the frame
+        roi = frame[rect_y1:rect_y2+1, rect_x1:rect_x2+1]
+        roi[:] = cv2.addWeighted(roi, 1-self.alpha, roi, 0, self.alpha*255)
         
         
         cv2.putText(frame, 
@@ -92,4 +87,4 @@ class TeamBallControlDrawer:
                     )
         
         return frame
-    
\ No newline at end of file
+    
@@ -3,6 +3,10 @@ import sys
 import numpy as np
 sys.path.append("../")
 from utils.bbox_utils import get_bbox_width, get_center_of_bbox
+from .sprite_cache import SpriteCache
+
+# Shared by all the drawers: labels and triangles are rendered once and then copied on the frames
+sprite_cache = SpriteCache()
 
 
 # OpenCV coordinate system
@@ -47,6 +51,10 @@ def draw_triangle(frame, bbox, color):
     smaller y → higher up on the image
     '''
     
+    # Pre-rendered triangle, drawn directly only when it doesn't fit entirely in the frame
+    if sprite_cache.get_triangle(color).blit(frame, x, y):
+        return frame
+    
     triangle_points = np.array([
         [x,y],
         [x-10,y-20], # upper-left 
@@ -93,6 +101,12 @@ def draw_ellipse(frame, bbox, color, track_id=None):
             └─────────────────────────► x
 
         '''
+        # Filled rectangle + track_id text, pre-rendered once per (track_id, color).
+        # Drawn directly only when the label doesn't fit entirely in the frame
+        label_sprite = sprite_cache.get_label(track_id, color)
+        if label_sprite is not None and label_sprite.blit(frame, x1_rect, y1_rect):
+            return frame
+        
         cv2.rectangle(frame, (x1_rect, y1_rect), (x2_rect, y2_rect), color, cv2.FILLED)
         
         x1_text = x1_rect + 12
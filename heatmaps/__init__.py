@@ -0,0 +1,4 @@
+from .heatmap_grid import HeatmapGrid
+from .occupancy_heatmaps import OccupancyHeatmaps, get_player_points
+from .possession_zones import PossessionZoneMaps
+from .export import export_heatmaps
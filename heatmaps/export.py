@@ -0,0 +1,65 @@
+import cv2
+import json
+import os
+import numpy as np
+import sys
+sys.path.append("../")
+from drawers import HeatmapDrawer
+
+
+'''
+Heatmaps of a game for the coaches, in output_dir:
+
+    team_1_occupancy.png, team_2_occupancy.png
+    player_<track_id>_occupancy.png
+    team_<team_id>_possession_won.png, team_<team_id>_possession_lost.png
+    heatmaps.npz -> the raw counts (frames per cell for the occupancy, changes per cell for possession)
+    possession_changes.json -> every change with its time, team, player and position
+'''
+
+
+def export_heatmaps(output_dir, occupancy_heatmaps, possession_zone_maps=None, fps=24, start=0, end=None, image_width=840, drawer=None):
+    '''
+    Heatmaps of the frames [start, end). Returns the paths of the written files.
+    '''
+    os.makedirs(output_dir, exist_ok=True)
+    drawer = drawer if drawer is not None else HeatmapDrawer()
+
+    heatmaps = {}
+    for team_id, counts in occupancy_heatmaps.team_grid.get_all(start, end).items():
+        heatmaps[f"team_{team_id}_occupancy"] = counts
+    for track_id, counts in occupancy_heatmaps.player_grid.get_all(start, end).items():
+        heatmaps[f"player_{track_id}_occupancy"] = counts
+    if possession_zone_maps is not None:
+        for team_id, counts in possession_zone_maps.won_grid.get_all(start, end).items():
+            heatmaps[f"team_{team_id}_possession_won"] = counts
+        for team_id, counts in possession_zone_maps.lost_grid.get_all(start, end).items():
+            heatmaps[f"team_{team_id}_possession_lost"] = counts
+
+    x_min, y_min, x_max, y_max = occupancy_heatmaps.team_grid.extent
+    image_height = int(image_width * (y_max - y_min) / (x_max - x_min))
+
+    paths = []
+    for name, counts in heatmaps.items():
+        path = os.path.join(output_dir, f"{name}.png")
+        cv2.imwrite(path, drawer.render_image(counts, image_width, image_height, occupancy_heatmaps.unit))
+        paths.append(path)
+
+    counts_path = os.path.join(output_dir, "heatmaps.npz")
+    np.savez_compressed(counts_path, extent=np.array([x_min, y_min, x_max, y_max]), fps=fps, **heatmaps)
+    paths.append(counts_path)
+
+    if possession_zone_maps is not None:
+        end_frame = possession_zone_maps.num_frames if end is None else end
+        changes = [
+            dict(change, seconds=change["frame_num"] / fps)
+            for change in possession_zone_maps.changes
+            if start <= change["frame_num"] < end_frame
+        ]
+
+        changes_path = os.path.join(output_dir, "possession_changes.json")
+        with open(changes_path, "w") as f:
+            json.dump({"unit": possession_zone_maps.unit, "changes": changes}, f, indent=2)
+        paths.append(changes_path)
+
+    return paths
@@ -0,0 +1,214 @@
+from bisect import bisect_right
+import numpy as np
+
+
+'''
+Counts of points per grid cell, one grid per key (a team, a player), over time.
+
+The points are binned with array operations only: cell = row * num_cols + col of every point,
+then one np.bincount over (key, cell) for all the points of a chunk of frames.
+
+Time windows use cumulative grids: every checkpoint_interval frames the totals so far are kept,
+
+    checkpoints[i] = counts of the frames [0, i * checkpoint_interval)
+
+so the counts of the frames [start, end) are a difference of two checkpoints, plus the points of the
+few frames between start (end) and the closest checkpoint inside the window, kept in the event arrays:
+
+    frames:       0        240       480       720       960
+    checkpoints:  |─────────|─────────|─────────|─────────|
+    window:            [═════════════════════════════)
+                       └edge┘└ cp[3] - cp[1] ──┘└edge┘
+
+A checkpoint only stores the grids of the keys that got points since the previous one, the others
+didn't change. The grid of a key at checkpoint i is its last stored one at or before i:
+
+    key 12 (player on the court for 30s): stored at checkpoints 4, 5, 6 -> checkpoint 40 reads the one of 6
+
+ByteTrack never reuses an id, so the player grids have thousands of keys over a game but only the
+players on screen change between two checkpoints.
+Memory: num_cells * 4 bytes (~6.7KB with the default 30x56 grid) per checkpoint per key seen in its interval.
+
+Frames have to be added in order (streaming: chunk after chunk, or one frame at a time).
+'''
+
+
+class HeatmapGrid:
+    def __init__(self, extent, grid_shape=(30, 56), checkpoint_interval=240, unit="px"):
+        '''
+        extent -> (x_min, y_min, x_max, y_max) area covered by the grid, points outside are not counted
+        grid_shape -> (num_rows, num_cols)
+        checkpoint_interval -> frames between two cumulative grids (240 = 10 seconds at 24 fps)
+        unit -> "px" (image coordinates) or "m" (court coordinates, see court/)
+        '''
+        self.extent = tuple(float(value) for value in extent)
+        self.grid_shape = tuple(grid_shape)
+        self.num_cells = self.grid_shape[0] * self.grid_shape[1]
+        self.checkpoint_interval = checkpoint_interval
+        self.unit = unit
+
+        self.keys = []
+        self.key_index = {}
+        self.num_frames = 0 # frames added so far, the next chunk starts at this frame or later
+
+        self.totals = np.zeros((0, self.num_cells), dtype=np.int32) # counts of the frames [0, num_frames)
+
+        # Checkpoint 0 (frame 0) is all zeros, nothing stored for it
+        self.num_checkpoints = 1
+        # Per key (layer): the checkpoints where its totals were stored, and the totals
+        self.layer_checkpoint_nums = []
+        self.layer_checkpoint_totals = []
+        self._changed_layers = set() # layers with points since the last checkpoint
+
+        # Every counted point, sorted by frame: (frame_nums, layers, cells)
+        self._event_chunks = []
+        self._events = None
+
+    def get_cells(self, points):
+        '''
+        (N, 2) points -> (cell of every point, inside mask). Points outside the extent (or NaN) are not inside.
+        '''
+        points = np.asarray(points, dtype=np.float64).reshape(-1, 2)
+        x_min, y_min, x_max, y_max = self.extent
+        num_rows, num_cols = self.grid_shape
+
+        cols = (points[:, 0] - x_min) * (num_cols / (x_max - x_min))
+        rows = (points[:, 1] - y_min) * (num_rows / (y_max - y_min))
+
+        inside = (cols >= 0) & (cols < num_cols) & (rows >= 0) & (rows < num_rows) # False for NaN too
+        cells = np.zeros(len(points), dtype=np.int64)
+        cells[inside] = rows[inside].astype(np.int64) * num_cols + cols[inside].astype(np.int64)
+
+        return cells, inside
+
+    def add(self, frame_nums, keys, points, end_frame=None):
+        '''
+        One point per row: frame_nums (N,), keys (N,) ints, points (N, 2).
+        end_frame -> the frames before it are complete (a chunk can end with frames without points),
+                     by default the frame after the last point.
+        '''
+        frame_nums = np.asarray(frame_nums, dtype=np.int64).reshape(-1)
+        keys = np.asarray(keys, dtype=np.int64).reshape(-1)
+        if end_frame is None:
+            end_frame = int(frame_nums.max()) + 1 if len(frame_nums) else self.num_frames
+
+        if len(frame_nums) and frame_nums.min() < self.num_frames:
+            raise ValueError(f"Frame {frame_nums.min()} was already added, the next one is {self.num_frames}")
+
+        cells, inside = self.get_cells(points)
+        frame_nums, keys, cells = frame_nums[inside], keys[inside], cells[inside]
+
+        layers = self._get_layers(keys)
+
+        order = np.argsort(frame_nums, kind="stable")
+        frame_nums, layers, cells = frame_nums[order], layers[order], cells[order]
+
+        if len(frame_nums):
+            self._event_chunks.append((frame_nums.astype(np.int32), layers.astype(np.int32), cells.astype(np.int32)))
+            self._events = None
+
+        # Totals up to every checkpoint inside the chunk, then up to its end
+        first_index = 0
+        next_checkpoint_frame = self.num_checkpoints * self.checkpoint_interval
+        while next_checkpoint_frame <= end_frame:
+            last_index = int(np.searchsorted(frame_nums, next_checkpoint_frame))
+            self._accumulate(layers[first_index:last_index], cells[first_index:last_index])
+            self._add_checkpoint()
+
+            first_index = last_index
+            next_checkpoint_frame += self.checkpoint_interval
+
+        self._accumulate(layers[first_index:], cells[first_index:])
+        self.num_frames = max(self.num_frames, end_frame)
+
+    def get(self, key, start=0, end=None):
+        '''
+        (num_rows, num_cols) counts of key in the frames [start, end), zeros for an unknown key.
+        '''
+        counts = np.zeros(self.num_cells, dtype=np.int64)
+        layer = self.key_index.get(key)
+        if layer is None:
+            return counts.reshape(self.grid_shape)
+
+        end = self.num_frames if end is None else min(max(end, 0), self.num_frames)
+        start = min(max(start, 0), end)
+
+        if start == 0 and end == self.num_frames:
+            counts += self.totals[layer]
+            return counts.reshape(self.grid_shape)
+
+        first_checkpoint = -(-start // self.checkpoint_interval) # ceil
+        last_checkpoint = end // self.checkpoint_interval
+
+        if first_checkpoint < last_checkpoint:
+            counts += self._get_checkpoint_row(last_checkpoint, layer)
+            counts -= self._get_checkpoint_row(first_checkpoint, layer)
+            counts += self._count_events(layer, start, first_checkpoint * self.checkpoint_interval)
+            counts += self._count_events(layer, last_checkpoint * self.checkpoint_interval, end)
+        else:
+            counts += self._count_events(layer, start, end)
+
+        return counts.reshape(self.grid_shape)
+
+    def get_all(self, start=0, end=None):
+        '''
+        {key: counts} of every key.
+        '''
+        return {key: self.get(key, start, end) for key in self.keys}
+
+    def _get_layers(self, keys):
+        unique_keys, inverse = np.unique(keys, return_inverse=True)
+
+        new_keys = [int(key) for key in unique_keys if int(key) not in self.key_index]
+        for key in new_keys:
+            self.key_index[key] = len(self.keys)
+            self.keys.append(key)
+        if new_keys:
+            self.totals = np.vstack([self.totals, np.zeros((len(new_keys), self.num_cells), dtype=np.int32)])
+            for _ in new_keys:
+                self.layer_checkpoint_nums.append([])
+                self.layer_checkpoint_totals.append([])
+
+        unique_layers = np.array([self.key_index[int(key)] for key in unique_keys], dtype=np.int64)
+        return unique_layers[inverse]
+
+    def _accumulate(self, layers, cells):
+        if len(layers) == 0:
+            return
+        counts = np.bincount(layers * self.num_cells + cells, minlength=self.totals.size)
+        self.totals += counts.reshape(self.totals.shape).astype(np.int32)
+        self._changed_layers.update(np.unique(layers).tolist())
+
+    def _add_checkpoint(self):
+        # Only the keys that changed: the grid of the others is the one they already have stored
+        for layer in self._changed_layers:
+            self.layer_checkpoint_nums[layer].append(self.num_checkpoints)
+            self.layer_checkpoint_totals[layer].append(self.totals[layer].copy())
+
+        self._changed_layers = set()
+        self.num_checkpoints += 1
+
+    def _get_checkpoint_row(self, checkpoint, layer):
+        # Last checkpoint where the key was stored, at or before this one
+        index = bisect_right(self.layer_checkpoint_nums[layer], checkpoint) - 1
+        # None: no points before the checkpoint
+        return self.layer_checkpoint_totals[layer][index] if index >= 0 else 0
+
+    def _get_events(self):
+        if self._events is None:
+            if self._event_chunks:
+                self._events = tuple(np.concatenate(arrays) for arrays in zip(*self._event_chunks))
+                # One array from now on, the next concatenation only adds the new chunks
+                self._event_chunks = [self._events]
+            else:
+                self._events = (np.empty(0, dtype=np.int32),) * 3
+        return self._events
+
+    def _count_events(self, layer, start, end):
+        if end <= start:
+            return 0
+
+        frame_nums, layers, cells = self._get_events()
+        first_index, last_index = np.searchsorted(frame_nums, [start, end])
+        in_layer = layers[first_index:last_index] == layer
+        return np.bincount(cells[first_index:last_index][in_layer], minlength=self.num_cells)
@@ -0,0 +1,125 @@
+import numpy as np
+import sys
+sys.path.append("../")
+from utils import as_boxes, get_foot_positions, profile_stage
+from court import COURT_WIDTH, COURT_HEIGHT
+from .heatmap_grid import HeatmapGrid
+
+
+'''
+Where the players were: one heatmap per team and one per player.
+
+Every player counts once per frame in the cell of his feet (bottom center of the bbox, the y2 row
+drawn by draw_ellipse), or of his court position in meters when court_positions are given.
+Counts are frames: divide by the fps for seconds.
+
+    tracks of a chunk ─> (frame_nums, track_ids, team_ids, points) ─> HeatmapGrid.add ─> team grid
+                         one flat array per field, the only loop                        └─> player grid
+
+update() can be called on the whole video or chunk after chunk (live mode), and the heatmaps of
+any time window come from the cumulative grids (get_team_heatmap(team_id, start, end)).
+'''
+
+
+def get_player_points(player_tracks, player_assignment=None, court_positions=None):
+    '''
+    Flattens the tracks: (frame_nums, track_ids, team_ids, points), one row per (frame, player).
+
+    points -> foot positions in pixels, or the court positions (meters) when court_positions are given
+              (the players without a court position on a frame are left out)
+    team_ids -> -1 when the player has no team on that frame (or without player_assignment)
+    '''
+    frame_nums = []
+    track_ids = []
+    team_ids = []
+    positions = []
+
+    for frame_num, frame_tracks in enumerate(player_tracks):
+        frame_assignment = player_assignment[frame_num] if player_assignment is not None else {}
+
+        if court_positions is not None:
+            frame_positions = court_positions[frame_num]
+            frame_track_ids = [track_id for track_id in frame_tracks if track_id in frame_positions]
+            positions.extend(frame_positions[track_id] for track_id in frame_track_ids)
+        else:
+            frame_track_ids = list(frame_tracks.keys())
+            positions.extend(frame_tracks[track_id]["bbox"] for track_id in frame_track_ids)
+
+        frame_nums.extend([frame_num] * len(frame_track_ids))
+        track_ids.extend(frame_track_ids)
+        team_ids.extend(frame_assignment.get(track_id, -1) for track_id in frame_track_ids)
+
+    if court_positions is not None:
+        points = np.asarray(positions, dtype=np.float64).reshape(-1, 2)
+    else:
+        points = get_foot_positions(as_boxes(positions))
+
+    return (
+        np.asarray(frame_nums, dtype=np.int64),
+        np.asarray(track_ids, dtype=np.int64),
+        np.asarray(team_ids, dtype=np.int64),
+        points
+    )
+
+
+class OccupancyHeatmaps:
+    def __init__(self, extent, grid_shape=(30, 56), checkpoint_interval=240, unit="px"):
+        '''
+        extent -> (x_min, y_min, x_max, y_max) covered by the heatmaps, see for_frame_size and for_court
+        '''
+        self.team_grid = HeatmapGrid(extent, grid_shape, checkpoint_interval, unit)
+        self.player_grid = HeatmapGrid(extent, grid_shape, checkpoint_interval, unit)
+        self.unit = unit
+
+    @classmethod
+    def for_frame_size(cls, frame_width, frame_height, **kwargs):
+        '''
+        Image coordinates: only meaningful with a fixed camera.
+        '''
+        return cls((0, 0, frame_width, frame_height), unit="px", **kwargs)
+
+    @classmethod
+    def for_court(cls, **kwargs):
+        '''
+        Court coordinates in meters (court_positions of map_tracks_to_court), the default grid is 0.5m cells.
+        '''
+        return cls((0, 0, COURT_WIDTH, COURT_HEIGHT), unit="m", **kwargs)
+
+    @property
+    def num_frames(self):
+        return self.player_grid.num_frames
+
+    def update(self, player_tracks, player_assignment, first_frame_num=None, court_positions=None):
+        '''
+        Adds a chunk of frames: player_tracks[i] is frame first_frame_num + i
+        (by default the chunk follows the frames already added).
+        court_positions -> [{track_id: [x, y]}, ...] of the same frames, needed with unit "m"
+        '''
+        if first_frame_num is None:
+            first_frame_num = self.num_frames
+        end_frame = first_frame_num + len(player_tracks)
+
+        with profile_stage("occupancy_heatmaps.update", items=len(player_tracks)):
+            frame_nums, track_ids, team_ids, points = get_player_points(player_tracks, player_assignment, court_positions)
+            frame_nums += first_frame_num
+
+            self.player_grid.add(frame_nums, track_ids, points, end_frame)
+
+            with_team = team_ids != -1
+            self.team_grid.add(frame_nums[with_team], team_ids[with_team], points[with_team], end_frame)
+
+    def update_frame(self, frame_num, frame_tracks, frame_assignment, frame_court_positions=None):
+        '''
+        update() of a single frame, for the live mode.
+        '''
+        court_positions = [frame_court_positions] if frame_court_positions is not None else None
+        self.update([frame_tracks], [frame_assignment], frame_num, court_positions)
+
+    def get_team_heatmap(self, team_id, start=0, end=None):
+        '''
+        (num_rows, num_cols) frames spent in every cell by the players of the team in [start, end).
+        '''
+        return self.team_grid.get(team_id, start, end)
+
+    def get_player_heatmap(self, track_id, start=0, end=None):
+        return self.player_grid.get(track_id, start, end)
@@ -0,0 +1,162 @@
+import numpy as np
+import sys
+sys.path.append("../")
+from utils import get_foot_positions, profile_stage
+from ball_acquisition import get_team_ball_control
+from court import COURT_WIDTH, COURT_HEIGHT
+from .heatmap_grid import HeatmapGrid
+
+
+'''
+Where possession was won and lost, per team.
+
+From the output of BallAquisitionDetector.detect_ball_possession, only the frames where a player of a
+known team has the ball count (ball in the air, loose ball: the possession goes on):
+
+    team with the ball:  1  1  -  -  1  2  2  -  2  1
+                                        ^              ^
+                                        won by 2       won by 1
+                                     lost by 1 ┘       lost by 2 ┘ (where its last holder was)
+
+    won -> feet of the player getting the ball, on the frame he gets it (the first possession of the video too)
+    lost -> feet of the last player of the other team holding it, on his last frame with the ball
+            (the change itself is on the frame the ball is won, for the time windows)
+
+The changes are found with array operations, only the positions of the few changes are looked up.
+'''
+
+
+class PossessionZoneMaps:
+    def __init__(self, extent, grid_shape=(15, 28), checkpoint_interval=240, unit="px"):
+        '''
+        The default grid is coarser than the occupancy one (1m cells on the court): there are
+        a few dozen possession changes in a game, not thousands of positions.
+        '''
+        self.won_grid = HeatmapGrid(extent, grid_shape, checkpoint_interval, unit)
+        self.lost_grid = HeatmapGrid(extent, grid_shape, checkpoint_interval, unit)
+        self.unit = unit
+
+        self.changes = [] # [{"frame_num", "type": "won"/"lost", "team", "player_id", "point", "point_frame_num"}, ...]
+        self.num_frames = 0
+
+        # Last known holder, carried from one chunk to the next
+        self.last_team = -1
+        self.last_holder = None # (frame_num, player_id, point)
+
+    @classmethod
+    def for_frame_size(cls, frame_width, frame_height, **kwargs):
+        return cls((0, 0, frame_width, frame_height), unit="px", **kwargs)
+
+    @classmethod
+    def for_court(cls, **kwargs):
+        return cls((0, 0, COURT_WIDTH, COURT_HEIGHT), unit="m", **kwargs)
+
+    def update(self, player_tracks, player_assignment, ball_acquisition, first_frame_num=None, court_positions=None):
+        '''
+        Adds a chunk of frames, like OccupancyHeatmaps.update. ball_acquisition[i] is the player with the ball
+        on frame first_frame_num + i (-1 for nobody).
+        '''
+        if first_frame_num is None:
+            first_frame_num = self.num_frames
+        end_frame = first_frame_num + len(ball_acquisition)
+
+        with profile_stage("possession_zone_maps.update", items=len(ball_acquisition)):
+            won, lost = self.get_changes(player_tracks, player_assignment, ball_acquisition, first_frame_num, court_positions)
+
+            for grid, changes in ((self.won_grid, won), (self.lost_grid, lost)):
+                grid.add(
+                    [change["frame_num"] for change in changes],
+                    [change["team"] for change in changes],
+                    np.array([change["point"] for change in changes], dtype=np.float64).reshape(-1, 2),
+                    end_frame
+                )
+
+            self.changes.extend(sorted(won + lost, key=lambda change: change["frame_num"]))
+            self.num_frames = max(self.num_frames, end_frame)
+
+    def get_changes(self, player_tracks, player_assignment, ball_acquisition, first_frame_num=0, court_positions=None):
+        '''
+        Returns (won, lost) changes of the chunk, and moves the last holder to the end of the chunk.
+        The changes without a position for the player (no court position on that frame) are left out.
+        '''
+        ball_acquisition = np.asarray(ball_acquisition, dtype=np.int64)
+        team_ball_control = get_team_ball_control(player_assignment, ball_acquisition)
+
+        frames_with_team = np.flatnonzero(team_ball_control != -1)
+        if len(frames_with_team) == 0:
+            return [], []
+
+        teams = team_ball_control[frames_with_team]
+        holders = ball_acquisition[frames_with_team]
+
+        previous_teams = np.empty_like(teams)
+        previous_teams[0] = self.last_team
+        previous_teams[1:] = teams[:-1]
+
+        change_indexes = np.flatnonzero(teams != previous_teams)
+
+        won = []
+        lost = []
+        for index in change_indexes:
+            frame_num = int(frames_with_team[index])
+            player_id = int(holders[index])
+            point = self._get_point(player_tracks, court_positions, frame_num, player_id)
+            if point is not None:
+                won.append({
+                    "frame_num": first_frame_num + frame_num,
+                    "type": "won",
+                    "team": int(teams[index]),
+                    "player_id": player_id,
+                    "point": point,
+                    "point_frame_num": first_frame_num + frame_num
+                })
+
+            if previous_teams[index] == -1:
+                continue
+
+            if index == 0:
+                # The last holder is in the previous chunk
+                lost_frame_num, lost_player_id, lost_point = self.last_holder
+            else:
+                lost_player_id = int(holders[index - 1])
+                lost_point = self._get_point(player_tracks, court_positions, int(frames_with_team[index - 1]), lost_player_id)
+                lost_frame_num = first_frame_num + int(frames_with_team[index - 1])
+
+            if lost_point is not None:
+                lost.append({
+                    "frame_num": first_frame_num + frame_num,
+                    "type": "lost",
+                    "team": int(previous_teams[index]),
+                    "player_id": lost_player_id,
+                    "point": lost_point,
+                    "point_frame_num": lost_frame_num
+                })
+
+        last_frame_num = int(frames_with_team[-1])
+        self.last_team = int(teams[-1])
+        self.last_holder = (
+            first_frame_num + last_frame_num,
+            int(holders[-1]),
+            self._get_point(player_tracks, court_positions, last_frame_num, int(holders[-1]))
+        )
+
+        return won, lost
+
+    def get_won_heatmap(self, team_id, start=0, end=None):
+        '''
+        (num_rows, num_cols) number of times team_id won the ball in every cell in [start, end).
+        '''
+        return self.won_grid.get(team_id, start, end)
+
+    def get_lost_heatmap(self, team_id, start=0, end=None):
+        return self.lost_grid.get(team_id, start, end)
+
+    def _get_point(self, player_tracks, court_positions, frame_num, player_id):
+        if court_positions is not None:
+            point = court_positions[frame_num].get(player_id)
+            return None if point is None else [float(value) for value in point]
+
+        player_info = player_tracks[frame_num].get(player_id)
+        if player_info is None:
+            return None
+        return [float(value) for value in get_foot_positions(player_info["bbox"])[0]]
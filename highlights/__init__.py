@@ -0,0 +1,3 @@
+from .segment_selector import SegmentSelector
+from .clip_writer import write_segment_clips
+from .timeline import build_timeline, export_timeline
@@ -0,0 +1,101 @@
+import cv2
+import json
+import os
+import sys
+sys.path.append("../")
+from utils import create_video_writer, profile_stage
+
+
+# Names of the clips written by the last export, so the next one only deletes its own files
+CLIPS_MANIFEST_NAME = "clips.json"
+
+
+def write_segment_clips(video_frames, segments, output_dir, source_fps=24, output_fps=6, scale=0.5, frame_transform=None):
+    '''
+    Writes one short clip per segment and returns their paths (clip_01.avi, clip_02.avi, ...).
+    
+    video_frames -> any iterable of frames in order (a list, or iter_video to stream the file)
+    segments -> chronological [{"start_frame", "end_frame"}, ...] (SegmentSelector.select_segments)
+    output_fps -> frames per second of the clips: one frame every source_fps / output_fps is kept
+    scale -> resize factor of the clip frames
+    frame_transform -> optional (frame, frame_num) -> frame applied to the kept frames only,
+                       e.g. FrameRenderer.render_frame to annotate them
+    
+    Only one pass over the frames, the frames outside the segments are just skipped,
+    and the frames that are not kept are never drawn nor resized.
+    
+    The clips of a previous export with more segments are deleted: the folder only has the clips of the timeline.
+    Only the clips listed in its manifest (clips.json) are deleted, never other files of the folder.
+    '''
+    frame_step = max(int(round(source_fps / output_fps)), 1)
+    clip_paths = [os.path.join(output_dir, f"clip_{index+1:02d}.avi") for index in range(len(segments))]
+    
+    remove_stale_clips(output_dir, clip_paths)
+    
+    if not segments:
+        return clip_paths
+    
+    segment_index = 0
+    writer = None
+    num_written_frames = 0
+    
+    with profile_stage("write_segment_clips", memory=True) as span:
+        try:
+            for frame_num, frame in enumerate(video_frames):
+                # Past the current segment: close its clip and move on
+                while segment_index < len(segments) and frame_num >= segments[segment_index]["end_frame"]:
+                    if writer is not None:
+                        writer.release()
+                        writer = None
+                    segment_index += 1
+                
+                if segment_index == len(segments):
+                    break
+                
+                segment = segments[segment_index]
+                if frame_num < segment["start_frame"] or (frame_num - segment["start_frame"]) % frame_step != 0:
+                    continue
+                
+                if frame_transform is not None:
+                    frame = frame_transform(frame, frame_num)
+                
+                if scale != 1:
+                    frame = cv2.resize(frame, (round(frame.shape[1] * scale), round(frame.shape[0] * scale)), interpolation=cv2.INTER_AREA)
+                
+                if writer is None:
+                    writer = create_video_writer(clip_paths[segment_index], (frame.shape[1], frame.shape[0]), output_fps)
+                
+                writer.write(frame)
+                num_written_frames += 1
+        finally:
+            if writer is not None:
+                writer.release()
+        
+        span.items = num_written_frames
+    
+    return clip_paths
+
+
+def remove_stale_clips(output_dir, clip_paths):
+    '''
+    Deletes the clips of the previous export (its manifest) that are not in clip_paths,
+    then writes the manifest of clip_paths for the next export.
+    '''
+    manifest_path = os.path.join(output_dir, CLIPS_MANIFEST_NAME)
+    kept_names = [os.path.basename(clip_path) for clip_path in clip_paths]
+    
+    previous_names = []
+    if os.path.exists(manifest_path):
+        with open(manifest_path) as f:
+            previous_names = json.load(f)
+    
+    for file_name in previous_names:
+        # Only plain file names, a manifest can't point outside the folder
+        if file_name not in kept_names and os.path.basename(file_name) == file_name:
+            clip_path = os.path.join(output_dir, file_name)
+            if os.path.exists(clip_path):
+                os.remove(clip_path)
+    
+    os.makedirs(output_dir, exist_ok=True)
+    with open(manifest_path, "w") as f:
+        json.dump(kept_names, f)
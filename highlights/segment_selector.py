@@ -0,0 +1,209 @@
+import numpy as np
+import sys
+sys.path.append("../")
+from ball_acquisition import get_team_ball_control
+
+
+'''
+Picks the salient time windows of a video, so that the VLM only sees those instead of every frame.
+
+Events (all found with array operations on the whole video):
+    possession changes -> from ball_acquisition (BallAquisitionDetector):
+        "first_possession", "pass" (same team) or "turnover" (the other team gets the ball)
+    fast ball -> peaks of the ball speed above ball_speed_threshold (shots, long passes)
+
+Every event opens a window [frame - pre_seconds, frame + post_seconds], close windows are merged
+(up to max_segment_seconds, after that a new segment starts):
+
+    events:      p         t  f                       p
+    frames:  ──[═══]─────[════════]─────────────────[═══]──
+    segments:    1            2                       3
+
+and if the segments are longer than max_total_seconds in total, the lowest scoring ones are dropped.
+'''
+
+
+EVENT_SCORES = {
+    "turnover": 3.0,
+    "pass": 1.0,
+    "first_possession": 1.0,
+}
+
+
+class SegmentSelector:
+    def __init__(self, fps=24):
+        self.fps = fps
+
+        self.pre_seconds = 1.5 # context before the event
+        self.post_seconds = 2.0 # and after it
+        self.merge_gap_seconds = 1.0 # segments closer than this become one
+        self.max_segment_seconds = 8.0 # unless the merged segment would be longer than this
+
+        self.ball_speed_threshold = 900 # pixels per second
+        self.ball_speed_smoothing = 3 # frames
+
+        self.max_total_seconds = None # None = keep every segment
+
+    def select(self, ball_acquisition, ball_tracks, player_assignment):
+        '''
+        Returns (segments, events), see select_segments and get_events.
+        '''
+        events = self.get_events(ball_acquisition, ball_tracks, player_assignment)
+        segments = self.select_segments(events, len(ball_acquisition))
+        return segments, events
+
+    def get_events(self, ball_acquisition, ball_tracks, player_assignment):
+        '''
+        [{"frame_num", "type", "score", ...}, ...] sorted by frame
+        '''
+        events = self.get_possession_events(ball_acquisition, player_assignment) + self.get_ball_speed_events(ball_tracks)
+        return sorted(events, key=lambda event: event["frame_num"])
+
+    def get_possession_events(self, ball_acquisition, player_assignment):
+        ball_acquisition = np.asarray(ball_acquisition, dtype=np.int64)
+        team_ball_control = get_team_ball_control(player_assignment, ball_acquisition)
+
+        frames_with_holder = np.flatnonzero(ball_acquisition != -1)
+        if len(frames_with_holder) == 0:
+            return []
+
+        # Only the frames with a holder: the frames in between (ball in the air, loose ball) don't break a possession
+        holders = ball_acquisition[frames_with_holder]
+        teams = team_ball_control[frames_with_holder]
+
+        changes = np.ones(len(holders), dtype=bool)
+        changes[1:] = holders[1:] != holders[:-1]
+
+        events = []
+        for index in np.flatnonzero(changes):
+            event = {
+                "frame_num": int(frames_with_holder[index]),
+                "player_id": int(holders[index]),
+                "team": int(teams[index])
+            }
+
+            if index == 0:
+                event["type"] = "first_possession"
+            else:
+                event["from_player_id"] = int(holders[index - 1])
+                event["from_team"] = int(teams[index - 1])
+                same_team = teams[index] == teams[index - 1] or teams[index] == -1 or teams[index - 1] == -1
+                event["type"] = "pass" if same_team else "turnover"
+
+            event["score"] = EVENT_SCORES[event["type"]]
+            events.append(event)
+
+        return events
+
+    def get_ball_speed(self, ball_tracks):
+        '''
+        Speed of the ball center in pixels per second, NaN where the ball (or the previous frame's ball) is missing.
+        '''
+        centers = np.full((len(ball_tracks), 2), np.nan)
+        for frame_num, frame_ball in enumerate(ball_tracks):
+            bbox = frame_ball.get(1, {}).get("bbox", [])
+            if len(bbox) == 4:
+                centers[frame_num] = ((bbox[0] + bbox[2]) / 2, (bbox[1] + bbox[3]) / 2)
+
+        speed = np.full(len(ball_tracks), np.nan)
+        speed[1:] = np.linalg.norm(np.diff(centers, axis=0), axis=1) * self.fps
+
+        if self.ball_speed_smoothing > 1 and len(speed) >= self.ball_speed_smoothing:
+            # Moving average, a single jittery detection is not a fast ball
+            kernel = np.ones(self.ball_speed_smoothing) / self.ball_speed_smoothing
+            speed = np.convolve(speed, kernel, mode="same")
+
+        return speed
+
+    def get_ball_speed_events(self, ball_tracks):
+        '''
+        One event per run of frames above ball_speed_threshold, at the fastest frame of the run.
+        '''
+        speed = self.get_ball_speed(ball_tracks)
+        fast = np.nan_to_num(speed) > self.ball_speed_threshold
+        if not fast.any():
+            return []
+
+        # Start and end of every run of fast frames
+        edges = np.diff(np.concatenate(([0], fast.astype(np.int8), [0])))
+        run_starts = np.flatnonzero(edges == 1)
+        run_ends = np.flatnonzero(edges == -1)
+
+        # Fastest frame of every run
+        peak_frames = [start + int(np.argmax(speed[start:end])) for start, end in zip(run_starts, run_ends)]
+        peak_speeds = speed[peak_frames]
+
+        return [
+            {
+                "frame_num": int(peak_frame),
+                "type": "fast_ball",
+                "ball_speed": float(peak_speed),
+                "score": float(peak_speed / self.ball_speed_threshold)
+            }
+            for peak_frame, peak_speed in zip(peak_frames, peak_speeds)
+        ]
+
+    def select_segments(self, events, num_frames):
+        '''
+        Returns [{"start_frame", "end_frame" (excluded), "score", "events"}, ...] in chronological order.
+        '''
+        if not events or num_frames == 0:
+            return []
+
+        pre_frames = int(round(self.pre_seconds * self.fps))
+        post_frames = int(round(self.post_seconds * self.fps))
+        merge_gap_frames = int(round(self.merge_gap_seconds * self.fps))
+        max_segment_frames = int(round(self.max_segment_seconds * self.fps))
+
+        segments = []
+        for event in events:
+            start_frame = max(event["frame_num"] - pre_frames, 0)
+            end_frame = min(event["frame_num"] + post_frames + 1, num_frames)
+
+            if segments and start_frame - segments[-1]["end_frame"] <= merge_gap_frames and (
+                    end_frame - segments[-1]["start_frame"] <= max_segment_frames or
+                    event["frame_num"] < segments[-1]["end_frame"]):
+                # Close to the previous segment (or inside it): same segment, at most max_segment_frames long
+                segment = segments[-1]
+                segment["end_frame"] = max(segment["end_frame"], min(end_frame, segment["start_frame"] + max_segment_frames))
+                segment["score"] += event["score"]
+                segment["events"].append(event)
+                continue
+
+            if segments:
+                # A long action split in two: the new segment starts where the previous one ends
+                start_frame = max(start_frame, segments[-1]["end_frame"])
+
+            segments.append({
+                "start_frame": start_frame,
+                "end_frame": end_frame,
+                "score": event["score"],
+                "events": [event]
+            })
+
+        if self.max_total_seconds is not None:
+            segments = self._apply_budget(segments)
+
+        return segments
+
+    def _apply_budget(self, segments):
+        '''
+        Best segments first (score per second) until max_total_seconds, then back to chronological order.
+        '''
+        max_total_frames = self.max_total_seconds * self.fps
+        ranked_segments = sorted(
+            segments,
+            key=lambda segment: segment["score"] / (segment["end_frame"] - segment["start_frame"]),
+            reverse=True
+        )
+
+        kept_segments = []
+        total_frames = 0
+        for segment in ranked_segments:
+            num_frames = segment["end_frame"] - segment["start_frame"]
+            if total_frames + num_frames > max_total_frames:
+                continue
+            kept_segments.append(segment)
+            total_frames += num_frames
+
+        return sorted(kept_segments, key=lambda segment: segment["start_frame"])
@@ -0,0 +1,85 @@
+import json
+import os
+
+
+'''
+Text version of the segments for the VLM / LLM prompt, e.g.
+
+    Clip 1 (clip_01.avi): 00:01.5 - 00:05.0
+        00:03.0 white shirt player 7 gets the ball from player 4 (pass)
+        00:04.2 fast ball movement (1350 px/s), shot or long pass
+    Clip 2 (clip_02.avi): 00:08.0 - 00:11.5
+        00:09.5 dark blue shirt player 12 steals the ball from white shirt player 7 (turnover)
+
+The timestamps are the ones of the full video, so the commentary can follow the real chronology.
+'''
+
+
+def format_time(frame_num, fps):
+    # Rounded to tenths first: 59.96 s is 01:00.0, not 00:60.0
+    tenths = int(round(frame_num / fps * 10))
+    return f"{tenths // 600:02d}:{tenths % 600 // 10:02d}.{tenths % 10}"
+
+
+def describe_event(event, team_names):
+    team_name = team_names.get(event.get("team"), "unknown team")
+    
+    if event["type"] == "first_possession":
+        return f"{team_name} player {event['player_id']} has the ball"
+    
+    if event["type"] == "pass":
+        return f"{team_name} player {event['player_id']} gets the ball from player {event['from_player_id']} (pass)"
+    
+    if event["type"] == "turnover":
+        from_team_name = team_names.get(event.get("from_team"), "unknown team")
+        return f"{team_name} player {event['player_id']} takes the ball from {from_team_name} player {event['from_player_id']} (turnover)"
+    
+    if event["type"] == "fast_ball":
+        return f"fast ball movement ({event['ball_speed']:.0f} px/s), shot or long pass"
+    
+    return event["type"]
+
+
+def build_timeline(segments, fps, clip_paths=None, team_names=None):
+    '''
+    Returns the timeline text. team_names -> {1: "white shirt", 2: "dark blue shirt"}
+    '''
+    if team_names is None:
+        team_names = {1: "team 1", 2: "team 2"}
+    
+    lines = []
+    for index, segment in enumerate(segments):
+        clip_name = f" ({os.path.basename(clip_paths[index])})" if clip_paths is not None else ""
+        lines.append(f"Clip {index+1}{clip_name}: {format_time(segment['start_frame'], fps)} - {format_time(segment['end_frame'], fps)}")
+        
+        for event in segment["events"]:
+            lines.append(f"    {format_time(event['frame_num'], fps)} {describe_event(event, team_names)}")
+    
+    return "\n".join(lines)
+
+
+def export_timeline(output_dir, segments, fps, clip_paths=None, team_names=None):
+    '''
+    Writes timeline.txt (prompt) and timeline.json (same content, structured), returns their paths.
+    '''
+    os.makedirs(output_dir, exist_ok=True)
+    text_path = os.path.join(output_dir, "timeline.txt")
+    json_path = os.path.join(output_dir, "timeline.json")
+    
+    with open(text_path, "w") as f:
+        f.write(build_timeline(segments, fps, clip_paths, team_names))
+    
+    clips = []
+    for index, segment in enumerate(segments):
+        clips.append({
+            "clip_path": clip_paths[index] if clip_paths is not None else None,
+            "start_time": segment["start_frame"] / fps,
+            "end_time": segment["end_frame"] / fps,
+            "score": segment["score"],
+            "events": [dict(event, time=event["frame_num"] / fps) for event in segment["events"]]
+        })
+    
+    with open(json_path, "w") as f:
+        json.dump({"fps": fps, "clips": clips}, f, indent=2)
+    
+    return text_path, json_path
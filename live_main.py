@@ -0,0 +1,66 @@
+import argparse
+import cv2
+from utils import create_video_writer, profiler
+from trackers import PlayerTracker, BallTracker
+from team_assigner import TeamAssigner
+from realtime import FrameSource, LiveAnalyzer
+
+
+
+def main():
+    
+    parser = argparse.ArgumentParser(description="Live basketball analysis")
+    parser.add_argument("source", help="capture device index (e.g. 0) or video file played back at real time speed")
+    parser.add_argument("--budget-ms", type=float, default=None, help="per-frame latency budget, one frame period by default")
+    parser.add_argument("--output", default=None, help="also save the annotated frames to this video")
+    parser.add_argument("--show", action="store_true", help="display the annotated frames")
+    parser.add_argument("--player-model", default="models/player_detector.pt")
+    parser.add_argument("--ball-model", default="models/ball_detector_model.pt")
+    args = parser.parse_args()
+    
+    source = int(args.source) if args.source.isdigit() else args.source
+    frame_source = FrameSource(source)
+    
+    latency_budget = args.budget_ms / 1000 if args.budget_ms is not None else 1 / frame_source.fps
+    
+    live_analyzer = LiveAnalyzer(
+        PlayerTracker(args.player_model),
+        BallTracker(args.ball_model),
+        TeamAssigner(),
+        latency_budget=latency_budget
+    )
+    
+    writer = None
+    num_frames = 0
+    num_over_budget = 0
+    
+    try:
+        for frame, info in live_analyzer.run(frame_source):
+            num_frames += 1
+            num_over_budget += info["over_budget"]
+            
+            if args.output is not None:
+                if writer is None:
+                    writer = create_video_writer(args.output, (frame.shape[1], frame.shape[0]), frame_source.fps)
+                writer.write(frame)
+            
+            if args.show:
+                cv2.imshow("basket_analysis", frame)
+                if cv2.waitKey(1) & 0xFF == ord("q"):
+                    break
+    finally:
+        if writer is not None:
+            writer.release()
+        if args.show:
+            cv2.destroyAllWindows()
+    
+    if profiler.enabled:
+        profiler.export_chrome_trace("output_videos/live_profile_trace.json")
+        profiler.export_summary("output_videos/live_profile_summary.json")
+    
+    print(f"{num_frames} frames emitted, {frame_source.num_dropped_frames} dropped, {num_over_budget} over the {latency_budget*1000:.0f}ms budget")
+    
+
+
+if __name__ == "__main__":
+    main()
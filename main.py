@@ -1,76 +1,65 @@
-from utils import read_video, save_video
-from trackers import PlayerTracker, BallTracker
-from drawers import PlayerTracksDrawer, BallTracksDrawer, TeamBallControlDrawer
-from team_assigner import TeamAssigner
-from ball_acquisition import BallAquisitionDetector
+import os
+from utils import profiler
+from pipeline import PipelineRunner, build_basketball_stages
 
 
 
 def main():
     
-    #Read video
-    video_frames = read_video("input_videos/video_1.mp4")
-    
-    #Initialize Tracker
-    player_tracker = PlayerTracker("models/player_detector.pt")
-    ball_tracker = BallTracker("models/ball_detector_model.pt")
-    
-    #Run Trackers
-    player_tracks = player_tracker.get_object_tracks(
-        video_frames,
-        read_from_stub=True,
-        stub_path="stubs/player_track_stubs.pkl"
+    # Every step (read video, trackers, team assignment, ball acquisition, drawing, saving)
+    # is a stage of the pipeline, see pipeline/basketball_stages.py.
+    # The runner executes independent stages in parallel and caches their outputs in stubs/pipeline:
+    # on the next run only the stages whose params (or inputs) changed are recomputed.
+    stages, resources = build_basketball_stages(
+        player_model_path="models/player_detector.pt",
+        ball_model_path="models/ball_detector_model.pt",
+        output_video_path="output_videos/output_video.avi",
+        player_track_stub_path="stubs/player_track_stubs.pkl",
+        ball_track_stub_path="stubs/ball_track_stubs.pkl",
+        player_assignment_stub_path="stubs/player_assignment_stub.pkl",
+        num_workers=os.cpu_count() or 1 # cpu_count() is None when it can't be determined
     )
     
-    #Ball Tracker
-    ball_tracks = ball_tracker.get_object_tracks(
-        video_frames,
-        read_from_stub=True,
-        stub_path="stubs/ball_track_stubs.pkl"
-    )
-    
-    # Remove wrong ball detections
-    ball_tracks = ball_tracker.remove_wrong_detections(ball_tracks)
-    
-    # Interpolate ball tracks
-    ball_tracks = ball_tracker.interpolate_ball_positions(ball_tracks)
+    runner = PipelineRunner(stages, cache_dir="stubs/pipeline", resources=resources)
     
-    # Assign player teams
-    team_assigner = TeamAssigner()
-    player_assignment = team_assigner.get_player_teams_across_frames(
-        video_frames, 
-        player_tracks, 
-        read_from_stub = True,
-        stub_path = "stubs/player_assignment_stub.pkl"
-        )
+    # e.g. to draw the team ball control too (only render and encode are executed again):
+    #runner.set_params("render", draw_team_ball_control=True)
     
-    # Ball acquisition
-    ball_acquisition_detector = BallAquisitionDetector()
-    ball_acquisition = ball_acquisition_detector.detect_ball_possession(player_tracks, ball_tracks)
-    #print(ball_acquisition)
+    # e.g. players detected at a lower resolution than the ball (see benchmarks/resolution_report.py):
+    #runner.set_params("track_players", inference_resolution={"mode": "adaptive", "min_object_size": 16})
+
+    # e.g. ball from the best trajectory over the top 5 candidates of every frame instead of the greedy filter
+    # (without the ball stub: the stub only has the best box of every frame):
+    #runner.set_params("track_balls", num_candidates=5, stub_path=None)
+    #runner.set_params("clean_ball_tracks", method="trajectory")
+
+    # e.g. drawing workers in processes (frames shared in memory, not pickled) instead of threads:
+    #runner.set_params("render", render_mode="process")
+
+    # e.g. full games on a small node: per-frame outputs kept under 4GB, the rest spilled to disk
+    # (the frames are decoded again when needed instead of being kept, render_mode must stay "thread"):
+    #runner = PipelineRunner(stages, cache_dir="stubs/pipeline", resources=resources, memory_budget=4 * 1024**3, spill_dir="stubs/spill")
+
+    runner.run(["output_video_path"], video_path="input_videos/video_1.mp4")
     
-    # Draw output
-    # Initialize Drawers
-    player_tracks_drawer = PlayerTracksDrawer()
-    ball_tracks_drawer = BallTracksDrawer()
-    team_ball_control_drawer= TeamBallControlDrawer()
+    # Short clips of the salient moments + timeline.txt for the commentary (llm_commenter.ipynb),
+    # instead of feeding the whole video to the VLM:
+    #runner.run(["highlights_timeline_path"], video_path="input_videos/video_1.mp4")
     
-    # Draw Object Tracks
-    output_video_frames = player_tracks_drawer.draw(
-        video_frames, 
-        player_tracks, 
-        player_assignment,
-        ball_acquisition
-        )
-    output_video_frames = ball_tracks_drawer.draw(output_video_frames, ball_tracks)
+    # Occupancy heatmaps per team and per player, and where possession was won and lost (PNG + counts):
+    #runner.run(["heatmaps_dir"], video_path="input_videos/video_1.mp4")
+    # or the occupancy of team 1 over the last 30 seconds drawn on the output video:
+    #runner.set_params("render", heatmap_team=1, heatmap_window_frames=720)
     
-    # Draw team ball control
-    #output_video_frames = team_ball_control_drawer.draw(output_video_frames, player_assignment, ball_acquisition)
+    # Court coordinates in meters (needs the court keypoint model, see court/):
+    #outputs = runner.run(["player_court_positions", "ball_court_positions"], video_path="input_videos/video_1.mp4")
     
-    #Save video
-    save_video(output_video_frames,"output_videos/output_video.avi")
+    # Run with BASKET_PROFILE=1 to get where the time and memory go
+    if profiler.enabled:
+        profiler.export_chrome_trace("output_videos/profile_trace.json")
+        profiler.export_summary("output_videos/profile_summary.json")
     
 
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
@@ -0,0 +1,5 @@
+from .stage import Stage
+from .resources import LazyResources, RunResources
+from .pipeline_runner import PipelineRunner
+from .basketball_stages import build_basketball_stages, build_basketball_resources
+from .batch_runner import BatchRunner, ModelPool, find_videos, get_clip_names
@@ -0,0 +1,443 @@
+import sys
+import numpy as np
+sys.path.append("../")
+from utils import read_video, read_video_lazy, iter_video, get_video_frame_size, collect
+from trackers import PlayerTracker, BallTracker, InferenceResolution, TrackStitcher
+from drawers import (
+    PlayerTracksDrawer,
+    BallTracksDrawer,
+    TeamBallControlDrawer,
+    PlayerTracksLayer,
+    BallTracksLayer,
+    PossessionLayer,
+    TeamBallControlLayer,
+    SpeedLayer,
+    HeatmapLayer,
+    FrameRenderer
+)
+from team_assigner import TeamAssigner
+from ball_acquisition import BallAquisitionDetector
+from court import CourtKeypointDetector, CourtMapper, map_tracks_to_court
+from speed_and_distance import PlayerMotionAnalyzer
+from highlights import SegmentSelector, write_segment_clips, export_timeline
+from heatmaps import OccupancyHeatmaps, PossessionZoneMaps, export_heatmaps
+from .stage import Stage
+from .resources import LazyResources
+
+
+'''
+The stages of main.py, declared with their inputs and outputs:
+
+    video_path ─> decode ─> video_frames ─┬─> track_players ─> raw_player_tracks ─> stitch_player_tracks ─> player_tracks, player_id_mapping
+                                          └─> track_balls ─> raw_ball_tracks, ball_candidates ─> clean_ball_tracks ─> ball_tracks
+
+    video_frames, player_tracks, player_id_mapping ─> assign_teams ─> player_assignment
+
+    player_tracks, ball_tracks ─> detect_possession ─> ball_acquisition
+    video_frames, player_tracks, ball_tracks ─> map_to_court ─> court_homographies, player_court_positions, ball_court_positions
+    player_tracks (, player_court_positions) ─> analyze_player_motion ─> player_motion
+    video_path, player_tracks, player_assignment, ball_acquisition (, player_court_positions) ─> build_heatmaps
+        ─> occupancy_heatmaps, possession_zone_maps ─> export_heatmaps ─> heatmaps_dir
+    player_tracks, ball_tracks, player_assignment, ball_acquisition
+        (, player_motion when draw_speed, occupancy_heatmaps when heatmap_team) ─> render ─> frame_renderer
+    video_path, frame_renderer ─> encode ─> output_video_path
+    
+    ball_acquisition, ball_tracks, player_assignment ─> select_highlights ─> highlight_segments
+    video_path, frame_renderer, highlight_segments ─> export_highlights ─> highlights_timeline_path
+        (short clips of the salient moments + text timeline, the input of the commentary VLM)
+'''
+
+
+def decode_video(video_path, memory_budget=None):
+    # Under a memory budget the frames are decoded chunk by chunk when a stage indexes them
+    if memory_budget is not None:
+        return read_video_lazy(video_path, memory_budget)
+    return read_video(video_path)
+
+
+def track_players(video_frames, player_tracker, inference_resolution=None, stub_path=None, memory_budget=None):
+    # The settings are a param of the stage: changing them invalidates the cached tracks
+    player_tracker.inference_resolution = InferenceResolution.from_settings(inference_resolution, class_name="Player")
+    player_tracker.reset_tracker()
+    
+    # stub_path is only used to seed the pipeline with already computed tracks
+    # Under a memory budget the tracks go into a ChunkedSequence batch after batch, while the frames are detected
+    return player_tracker.get_object_tracks(
+        video_frames,
+        read_from_stub=stub_path is not None,
+        stub_path=stub_path,
+        memory_budget=memory_budget
+    )
+
+
+def stitch_player_tracks(video_frames, raw_player_tracks, enabled, max_gap_frames, max_cost, memory_budget=None):
+    # The id mapping renames the ids of the data made from the raw tracks (the team assignment stub)
+    if not enabled:
+        return raw_player_tracks, {}
+
+    track_stitcher = TrackStitcher(max_gap_frames=max_gap_frames, max_cost=max_cost)
+    return track_stitcher.stitch(raw_player_tracks, video_frames, memory_budget)
+
+
+def track_balls(video_frames, ball_tracker, inference_resolution=None, num_candidates=1, stub_path=None, memory_budget=None):
+    ball_tracker.inference_resolution = InferenceResolution.from_settings(inference_resolution, class_name="Ball")
+    ball_tracker.num_candidates = num_candidates
+    
+    if num_candidates > 1 and stub_path is None:
+        # One detection pass for both: the tracks are the best candidate of every frame
+        ball_candidates = ball_tracker.get_object_candidates(video_frames, memory_budget=memory_budget)
+        raw_ball_tracks = collect(
+            (ball_tracker.get_tracks_from_candidates(frame_candidates) for frame_candidates in ball_candidates),
+            memory_budget
+        )
+        return raw_ball_tracks, ball_candidates
+    
+    raw_ball_tracks = ball_tracker.get_object_tracks(
+        video_frames,
+        read_from_stub=stub_path is not None,
+        stub_path=stub_path,
+        memory_budget=memory_budget
+    )
+    
+    # Stubs only have the tracks: their ball is the only candidate
+    ball_candidates = collect((
+        np.array([frame_tracks[1]["bbox"] + [1.0]]) if 1 in frame_tracks else np.empty((0, 5))
+        for frame_tracks in raw_ball_tracks
+    ), memory_budget)
+    return raw_ball_tracks, ball_candidates
+
+
+def clean_ball_tracks(raw_ball_tracks, ball_candidates, ball_tracker, method="greedy", memory_budget=None):
+    if method == "trajectory":
+        # Best whole-video trajectory over the top-k candidates (BallTrajectorySolver)
+        ball_tracks = ball_tracker.solve_trajectory(ball_candidates, memory_budget)
+    else:
+        # Filtered one frame at a time, raw_ball_tracks (may be cached) is not edited
+        ball_tracks = collect(ball_tracker.iter_filtered_detections(raw_ball_tracks), memory_budget)
+    
+    ball_tracks = ball_tracker.interpolate_ball_positions(ball_tracks, memory_budget)
+    return ball_tracks
+
+
+def assign_teams(video_frames, player_tracks, player_id_mapping, team_assigner, team1_class_name, team2_class_name, stub_path=None,
+                 memory_budget=None):
+    # The TeamAssigner is shared to keep CLIP loaded, the classes are the ones of this stage
+    team_assigner.team1_class_name = team1_class_name
+    team_assigner.team2_class_name = team2_class_name
+    
+    return team_assigner.get_player_teams_across_frames(
+        video_frames,
+        player_tracks,
+        read_from_stub=stub_path is not None,
+        stub_path=stub_path,
+        stub_id_mapping=player_id_mapping, # the stub may have the ids of the tracks before stitching
+        memory_budget=memory_budget
+    )
+
+
+def detect_possession(player_tracks, ball_tracks, possession_threshold, min_frames, containment_threshold):
+    ball_acquisition_detector = BallAquisitionDetector()
+    ball_acquisition_detector.possession_threshold = possession_threshold
+    ball_acquisition_detector.min_frames = min_frames
+    ball_acquisition_detector.containment_threshold = containment_threshold
+
+    return ball_acquisition_detector.detect_ball_possession(player_tracks, ball_tracks)
+
+
+def map_to_court(video_frames, player_tracks, ball_tracks, court_mapper, keyframe_interval, memory_budget=None):
+    court_mapper.keyframe_interval = keyframe_interval
+    court_mapper.reset()
+    
+    court_homographies = court_mapper.get_homographies(video_frames, memory_budget)
+    player_court_positions = map_tracks_to_court(player_tracks, court_homographies, point="foot", memory_budget=memory_budget)
+    ball_court_positions = map_tracks_to_court(ball_tracks, court_homographies, point="center", memory_budget=memory_budget)
+    
+    return court_homographies, player_court_positions, ball_court_positions
+
+
+def analyze_player_motion(player_tracks, fps, sprint_speed, player_court_positions=None):
+    player_motion_analyzer = PlayerMotionAnalyzer(fps)
+    player_motion_analyzer.sprint_speed = sprint_speed
+    
+    return player_motion_analyzer.analyze(player_tracks, player_court_positions)
+
+
+def build_heatmaps(video_path, player_tracks, player_assignment, ball_acquisition, grid_shape, checkpoint_interval,
+                   player_court_positions=None):
+    if player_court_positions is not None:
+        occupancy_heatmaps = OccupancyHeatmaps.for_court(grid_shape=grid_shape, checkpoint_interval=checkpoint_interval)
+        possession_zone_maps = PossessionZoneMaps.for_court(checkpoint_interval=checkpoint_interval)
+    else:
+        frame_width, frame_height = get_video_frame_size(video_path)
+        occupancy_heatmaps = OccupancyHeatmaps.for_frame_size(frame_width, frame_height, grid_shape=grid_shape, checkpoint_interval=checkpoint_interval)
+        possession_zone_maps = PossessionZoneMaps.for_frame_size(frame_width, frame_height, checkpoint_interval=checkpoint_interval)
+    
+    occupancy_heatmaps.update(player_tracks, player_assignment, court_positions=player_court_positions)
+    possession_zone_maps.update(player_tracks, player_assignment, ball_acquisition, court_positions=player_court_positions)
+    
+    return occupancy_heatmaps, possession_zone_maps
+
+
+def export_game_heatmaps(occupancy_heatmaps, possession_zone_maps, output_dir, fps):
+    export_heatmaps(output_dir, occupancy_heatmaps, possession_zone_maps, fps=fps)
+    return output_dir
+
+
+def build_renderer(player_tracks, ball_tracks, player_assignment, ball_acquisition, player_motion, occupancy_heatmaps,
+                   team1_color, team2_color, ball_pointer_color, draw_team_ball_control, draw_speed, num_workers,
+                   render_mode="thread", heatmap_team=None, heatmap_window_frames=None, memory_budget=None):
+    # The layers are pickled to every worker process: a ChunkedSequence becomes a full list there
+    if render_mode == "process" and num_workers > 1 and memory_budget is not None:
+        raise ValueError("render_mode='process' copies the whole tracks in every worker, it can't respect a memory budget: "
+                         "use render_mode='thread'")
+
+    player_tracks_drawer = PlayerTracksDrawer(team1_color, team2_color)
+    ball_tracks_drawer = BallTracksDrawer()
+    ball_tracks_drawer.ball_pointer_color = ball_pointer_color
+
+    layers = [
+        PlayerTracksLayer(player_tracks, player_assignment, player_tracks_drawer),
+        PossessionLayer(player_tracks, ball_acquisition, player_tracks_drawer.ball_holder_color),
+        BallTracksLayer(ball_tracks, ball_tracks_drawer),
+    ]
+
+    if draw_speed:
+        layers.append(SpeedLayer(player_tracks, player_motion))
+    
+    if draw_team_ball_control:
+        layers.append(TeamBallControlLayer(player_assignment, ball_acquisition, TeamBallControlDrawer()))
+    
+    if heatmap_team is not None:
+        layers.append(HeatmapLayer(occupancy_heatmaps.team_grid, heatmap_team, window_frames=heatmap_window_frames))
+
+    # render_mode "process": drawing workers in processes, the frames shared through a SharedFrameStore
+    return FrameRenderer(layers, num_workers=num_workers, mode=render_mode)
+
+
+def encode_video(video_path, frame_renderer, output_video_path, fps):
+    # The frames are read again from the file one at a time:
+    # the decoded frames may be cached and the renderer draws in place
+    frame_renderer.render(iter_video(video_path), output_video_path, fps)
+    return output_video_path
+
+
+def select_highlights(ball_acquisition, ball_tracks, player_assignment, fps, ball_speed_threshold, max_total_seconds):
+    segment_selector = SegmentSelector(fps)
+    segment_selector.ball_speed_threshold = ball_speed_threshold
+    segment_selector.max_total_seconds = max_total_seconds
+    
+    segments, _ = segment_selector.select(ball_acquisition, ball_tracks, player_assignment)
+    return segments
+
+
+def export_highlights(video_path, frame_renderer, highlight_segments, output_dir, fps, output_fps, scale, team_names):
+    # Annotated clips like the full output video, but only the kept frames are drawn
+    clip_paths = write_segment_clips(
+        iter_video(video_path),
+        highlight_segments,
+        output_dir,
+        source_fps=fps,
+        output_fps=output_fps,
+        scale=scale,
+        frame_transform=frame_renderer.render_frame
+    )
+    
+    text_path, _ = export_timeline(output_dir, highlight_segments, fps, clip_paths, team_names)
+    return text_path
+
+
+def build_basketball_stages(
+    player_model_path="models/player_detector.pt",
+    ball_model_path="models/ball_detector_model.pt",
+    court_model_path="models/court_keypoint_detector.pt",
+    output_video_path="output_videos/output_video.avi",
+    player_track_stub_path=None,
+    ball_track_stub_path=None,
+    player_assignment_stub_path=None,
+    num_workers=1,
+    player_inference_resolution=None,
+    ball_inference_resolution=None,
+    use_court_positions=False,
+    highlights_output_dir="output_videos/highlights",
+    heatmaps_output_dir="output_videos/heatmaps",
+    ball_trajectory_method="greedy"
+):
+    '''
+    Returns (stages, resources) for a PipelineRunner.
+    The models are resources: loaded once, only if a stage using them actually has to run.
+    
+    player_inference_resolution, ball_inference_resolution -> resolution of each detector,
+        None (frames as they are), an imgsz or a dict of InferenceResolution settings, e.g.
+        {"mode": "adaptive", "min_object_size": 16}
+    use_court_positions -> player speeds, distances and heatmaps in meters from the court keypoints, in pixels otherwise
+    ball_trajectory_method -> "greedy" (best ball of every frame, far jumps removed one frame after the other)
+        or "trajectory" (top 5 candidates per frame, best trajectory of the whole video, see BallTrajectorySolver)
+    '''
+    stages = [
+        Stage("decode", decode_video,
+              inputs=["video_path"],
+              outputs=["video_frames"],
+              resources=["memory_budget"], # the one of the PipelineRunner
+              cache=False), # too big to be pickled
+
+        Stage("track_players", track_players,
+              inputs=["video_frames"],
+              outputs=["raw_player_tracks"],
+              params={
+                  "inference_resolution": player_inference_resolution,
+                  "stub_path": player_track_stub_path
+              },
+              resources=["player_tracker", "memory_budget"]),
+
+        Stage("stitch_player_tracks", stitch_player_tracks,
+              # one id per player across occlusions: fewer CLIP calls, possession streaks not reset
+              inputs=["video_frames", "raw_player_tracks"],
+              outputs=["player_tracks", "player_id_mapping"],
+              params={
+                  "enabled": True,
+                  "max_gap_frames": 30,
+                  "max_cost": 1.5
+              },
+              resources=["memory_budget"]),
+
+        Stage("track_balls", track_balls,
+              inputs=["video_frames"],
+              outputs=["raw_ball_tracks", "ball_candidates"],
+              params={
+                  "inference_resolution": ball_inference_resolution,
+                  "num_candidates": 5 if ball_trajectory_method == "trajectory" else 1,
+                  "stub_path": ball_track_stub_path
+              },
+              resources=["ball_tracker", "memory_budget"]),
+
+        Stage("clean_ball_tracks", clean_ball_tracks,
+              inputs=["raw_ball_tracks", "ball_candidates"],
+              outputs=["ball_tracks"],
+              params={"method": ball_trajectory_method},
+              resources=["ball_tracker", "memory_budget"]),
+
+        Stage("assign_teams", assign_teams,
+              inputs=["video_frames", "player_tracks", "player_id_mapping"],
+              outputs=["player_assignment"],
+              params={
+                  "team1_class_name": "white shirt",
+                  "team2_class_name": "dark blue shirt",
+                  "stub_path": player_assignment_stub_path
+              },
+              resources=["team_assigner", "memory_budget"]),
+
+        Stage("detect_possession", detect_possession,
+              inputs=["player_tracks", "ball_tracks"],
+              outputs=["ball_acquisition"],
+              params={
+                  "possession_threshold": 50,
+                  "min_frames": 11,
+                  "containment_threshold": 0.8
+              }),
+
+        Stage("map_to_court", map_to_court,
+              inputs=["video_frames", "player_tracks", "ball_tracks"],
+              outputs=["court_homographies", "player_court_positions", "ball_court_positions"],
+              params={"keyframe_interval": 50},
+              resources=["court_mapper", "memory_budget"]),
+
+        Stage("analyze_player_motion", analyze_player_motion,
+              # in meters with the court positions (court keypoint model needed), in pixels otherwise
+              inputs=["player_tracks", "player_court_positions"] if use_court_positions else ["player_tracks"],
+              outputs=["player_motion"],
+              params={
+                  "fps": 24,
+                  "sprint_speed": 5.5
+              }),
+
+        Stage("build_heatmaps", build_heatmaps,
+              # occupancy per team and per player, where possession was won and lost
+              inputs=["video_path", "player_tracks", "player_assignment", "ball_acquisition"]
+                     + (["player_court_positions"] if use_court_positions else []),
+              outputs=["occupancy_heatmaps", "possession_zone_maps"],
+              params={
+                  "grid_shape": (30, 56),
+                  "checkpoint_interval": 240
+              }),
+
+        Stage("export_heatmaps", export_game_heatmaps,
+              inputs=["occupancy_heatmaps", "possession_zone_maps"],
+              outputs=["heatmaps_dir"],
+              params={
+                  "output_dir": heatmaps_output_dir,
+                  "fps": 24
+              },
+              output_files=["heatmaps_dir"]),
+
+        Stage("render", build_renderer,
+              inputs=["player_tracks", "ball_tracks", "player_assignment", "ball_acquisition", "player_motion", "occupancy_heatmaps"],
+              # the motion and the heatmaps (court positions with use_court_positions) are only computed
+              # when the speeds / a heatmap are drawn
+              optional_inputs={
+                  "player_motion": lambda params: params["draw_speed"],
+                  "occupancy_heatmaps": lambda params: params["heatmap_team"] is not None
+              },
+              outputs=["frame_renderer"],
+              params={
+                  "team1_color": [255,245,238],
+                  "team2_color": [128,0,0],
+                  "ball_pointer_color": (0,255,0),
+                  "draw_team_ball_control": False,
+                  "draw_speed": False,
+                  "num_workers": num_workers,
+                  "render_mode": "thread",
+                  "heatmap_team": None, # e.g. 1: occupancy of team 1 drawn on the video
+                  "heatmap_window_frames": None
+              },
+              resources=["memory_budget"],
+              cache=False), # just the layers, nothing expensive to keep
+
+        Stage("encode", encode_video,
+              inputs=["video_path", "frame_renderer"],
+              outputs=["output_video_path"],
+              params={
+                  "output_video_path": output_video_path,
+                  "fps": 24
+              },
+              output_files=["output_video_path"]), # written again if the video was deleted
+
+        Stage("select_highlights", select_highlights,
+              inputs=["ball_acquisition", "ball_tracks", "player_assignment"],
+              outputs=["highlight_segments"],
+              params={
+                  "fps": 24,
+                  "ball_speed_threshold": 900,
+                  "max_total_seconds": None
+              }),
+
+        Stage("export_highlights", export_highlights,
+              inputs=["video_path", "frame_renderer", "highlight_segments"],
+              outputs=["highlights_timeline_path"],
+              params={
+                  "output_dir": highlights_output_dir,
+                  "fps": 24,
+                  "output_fps": 6,
+                  "scale": 0.5,
+                  "team_names": {1: "white shirt", 2: "dark blue shirt"}
+              },
+              output_files=["highlights_timeline_path"]),
+    ]
+
+    resources = build_basketball_resources(player_model_path, ball_model_path, court_model_path)
+
+    return stages, resources
+
+
+def build_basketball_resources(player_model_path="models/player_detector.pt",
+                               ball_model_path="models/ball_detector_model.pt",
+                               court_model_path="models/court_keypoint_detector.pt"):
+    '''
+    One set of models. Each model is loaded the first time a stage needs it,
+    and then reused by every run that gets these resources.
+    '''
+    return LazyResources({
+        "player_tracker": lambda: PlayerTracker(player_model_path),
+        "ball_tracker": lambda: BallTracker(ball_model_path),
+        "team_assigner": lambda: TeamAssigner(),
+        "court_mapper": lambda: CourtMapper(CourtKeypointDetector(court_model_path)),
+    })
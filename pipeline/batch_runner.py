@@ -0,0 +1,234 @@
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+import json
+import os
+import queue
+import threading
+import time
+import traceback
+from .pipeline_runner import PipelineRunner
+from .basketball_stages import build_basketball_stages, build_basketball_resources
+
+
+VIDEO_EXTENSIONS = (".mp4", ".avi", ".mov", ".mkv")
+
+
+def find_videos(input_path):
+    '''
+    input_path is either:
+        - a directory -> every video file inside it (not recursive)
+        - a manifest -> text file with one video path per line (relative paths are relative to the manifest,
+                        empty lines and lines starting with # are skipped)
+    '''
+    if os.path.isdir(input_path):
+        return sorted(
+            os.path.join(input_path, file_name)
+            for file_name in os.listdir(input_path)
+            if file_name.lower().endswith(VIDEO_EXTENSIONS)
+        )
+
+    manifest_dir = os.path.dirname(input_path)
+    video_paths = []
+
+    with open(input_path) as f:
+        for line in f:
+            line = line.strip()
+            if not line or line.startswith("#"):
+                continue
+            video_paths.append(line if os.path.isabs(line) else os.path.join(manifest_dir, line))
+
+    return video_paths
+
+
+def get_clip_names(video_paths):
+    '''
+    Unique name of every clip, used for its output video and its cache directory:
+    its path relative to the common directory of the clips, without extension, "/" -> "__"
+
+        game1/clip_01.mp4, game2/clip_01.mp4 -> game1__clip_01, game2__clip_01
+
+    Raises ValueError when a clip is listed twice or two clips get the same name
+    (e.g. clip_01.mp4 and clip_01.avi): their workers would write the same files.
+    '''
+    if not video_paths:
+        return []
+
+    full_paths = [os.path.realpath(video_path) for video_path in video_paths]
+    root_dir = os.path.commonpath([os.path.dirname(full_path) for full_path in full_paths])
+
+    clip_names = []
+    paths_per_name = {}
+    for video_path, full_path in zip(video_paths, full_paths):
+        relative_path = os.path.splitext(os.path.relpath(full_path, root_dir))[0]
+        clip_name = relative_path.replace(os.sep, "__")
+
+        if clip_name in paths_per_name:
+            raise ValueError(f"{video_path} and {paths_per_name[clip_name]} would share the outputs of clip {clip_name}")
+
+        paths_per_name[clip_name] = video_path
+        clip_names.append(clip_name)
+
+    return clip_names
+
+
+class ModelPool:
+    '''
+    Sets of loaded models shared by the batch workers.
+
+    A worker takes a set for the duration of one clip and gives it back afterwards,
+    so at most `size` sets are ever created (one per worker) and each model is loaded
+    once per set instead of once per clip. The sets are never used by two clips at the same time,
+    which matters because the trackers keep per-video state (e.g. ByteTrack).
+    '''
+    def __init__(self, resources_factory, size):
+        self.resources_factory = resources_factory
+        self.size = size
+        self.num_created = 0
+        self.available = queue.Queue()
+        self.lock = threading.Lock()
+
+    @contextmanager
+    def checkout(self):
+        resources = self._get()
+        try:
+            yield resources
+        finally:
+            self.available.put(resources)
+
+    def _get(self):
+        with self.lock:
+            if self.available.empty() and self.num_created < self.size:
+                self.num_created += 1
+                return self.resources_factory()
+
+        return self.available.get()
+
+
+class BatchRunner:
+    '''
+    Runs the basketball pipeline on many clips with a pool of workers.
+
+    - Models are shared through a ModelPool (loaded once per worker, not once per clip).
+    - A failing clip doesn't stop the batch: it is retried up to max_retries times and then reported as failed.
+    - Every clip gets its own output video and its own pipeline cache (a clip already processed is not recomputed),
+      named after its path (get_clip_names): clips with the same file name in different directories don't collide.
+    - The report contains per-clip and aggregate throughput (frames/sec, clips/hour).
+    - With a memory_budget (bytes) every clip keeps its per-frame outputs under it, the rest is spilled to disk.
+    '''
+    def __init__(self,
+                 output_dir,
+                 num_workers=2,
+                 max_retries=1,
+                 player_model_path="models/player_detector.pt",
+                 ball_model_path="models/ball_detector_model.pt",
+                 render_workers=1,
+                 memory_budget=None):
+
+        self.output_dir = output_dir
+        self.num_workers = num_workers
+        self.max_retries = max_retries
+        self.player_model_path = player_model_path
+        self.ball_model_path = ball_model_path
+        self.render_workers = render_workers
+        self.memory_budget = memory_budget # bytes per clip, see PipelineRunner
+
+        self.model_pool = ModelPool(
+            lambda: build_basketball_resources(player_model_path, ball_model_path),
+            num_workers
+        )
+
+    def run(self, video_paths):
+        # Before any worker starts: two clips with the same name would overwrite each other
+        clip_names = get_clip_names(video_paths)
+
+        start_time = time.perf_counter()
+
+        with ThreadPoolExecutor(max_workers=self.num_workers) as executor:
+            clip_reports = list(executor.map(self.process_clip, video_paths, clip_names))
+
+        elapsed_time = time.perf_counter() - start_time
+
+        report = {
+            "clips": clip_reports,
+            "summary": self._summarize(clip_reports, elapsed_time)
+        }
+
+        os.makedirs(self.output_dir, exist_ok=True)
+        with open(os.path.join(self.output_dir, "batch_report.json"), "w") as f:
+            json.dump(report, f, indent=2)
+
+        return report
+
+    def process_clip(self, video_path, clip_name=None):
+        '''
+        clip_name -> name of its output video and cache directory, the file name without extension by default
+                     (run() gives the unique names of get_clip_names)
+        '''
+        if clip_name is None:
+            clip_name = os.path.splitext(os.path.basename(video_path))[0]
+
+        clip_report = {
+            "video_path": video_path,
+            "clip_name": clip_name,
+            "status": "failed",
+            "attempts": 0,
+            "errors": []
+        }
+
+        for attempt in range(self.max_retries + 1):
+            clip_report["attempts"] = attempt + 1
+            start_time = time.perf_counter()
+
+            try:
+                with self.model_pool.checkout() as resources:
+                    num_frames, output_video_path = self._run_pipeline(video_path, clip_name, resources)
+            except Exception:
+                # Isolate the failure to this clip, the other workers keep going
+                clip_report["errors"].append(traceback.format_exc())
+                continue
+
+            elapsed_time = time.perf_counter() - start_time
+            clip_report.update({
+                "status": "ok",
+                "output_video_path": output_video_path,
+                "num_frames": num_frames,
+                "seconds": elapsed_time,
+                "fps": num_frames / elapsed_time if elapsed_time > 0 else 0.0
+            })
+            break
+
+        return clip_report
+
+    def _run_pipeline(self, video_path, clip_name, resources):
+        stages, _ = build_basketball_stages(
+            output_video_path=os.path.join(self.output_dir, f"{clip_name}.avi"),
+            num_workers=self.render_workers
+        )
+
+        runner = PipelineRunner(
+            stages,
+            cache_dir=os.path.join(self.output_dir, "cache", clip_name),
+            resources=resources,
+            memory_budget=self.memory_budget
+        )
+
+        try:
+            # ball_acquisition has one value per frame, cheap way to know the number of frames
+            outputs = runner.run(["output_video_path", "ball_acquisition"], video_path=video_path)
+            return len(outputs["ball_acquisition"]), outputs["output_video_path"]
+        finally:
+            runner.close()
+
+    def _summarize(self, clip_reports, elapsed_time):
+        ok_reports = [clip_report for clip_report in clip_reports if clip_report["status"] == "ok"]
+        total_frames = sum(clip_report["num_frames"] for clip_report in ok_reports)
+
+        return {
+            "num_clips": len(clip_reports),
+            "num_ok": len(ok_reports),
+            "num_failed": len(clip_reports) - len(ok_reports),
+            "total_frames": total_frames,
+            "seconds": elapsed_time,
+            "fps": total_frames / elapsed_time if elapsed_time > 0 else 0.0,
+            "clips_per_hour": len(ok_reports) / elapsed_time * 3600 if elapsed_time > 0 else 0.0
+        }
@@ -0,0 +1,262 @@
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+import hashlib
+import os
+import sys
+sys.path.append("../")
+from utils import read_stub, save_stub, profile_stage, ChunkedSequence, MemoryBudget
+from .resources import LazyResources, RunResources
+
+
+class PipelineRunner:
+    '''
+    Runs a set of stages as a DAG: a stage runs as soon as all of its inputs are available,
+    so independent stages (e.g. ball tracking and player tracking + team assignment) run in parallel.
+
+    Every stage gets a fingerprint built from its name, its params and the fingerprints of its inputs:
+
+        decode ─┬─> track_players ──> assign_teams ──┐
+                │                                    ├─> detect_possession ─> render ─> encode
+                └─> track_balls ──> clean_ball_tracks┘
+
+    If the color of a team changes, only the fingerprint of render (and so of encode) changes,
+    the tracks, the team assignment and the possession are loaded from the cache.
+    If a tracking param changes, everything after that tracker is recomputed.
+
+    Outputs are kept in memory (so calling run() again after set_params() only recomputes what changed)
+    and, for the stages with cache=True, saved to cache_dir to be reused in later runs.
+
+    With a memory_budget (bytes or a MemoryBudget) the per-frame outputs (lists) become ChunkedSequences:
+
+        track_players ─> [{...}, {...}, ...] ─> ChunkedSequence: chunks of 256 frames, the least recently used
+                                                                 ones written to spill_dir when over the budget
+
+    The next stages index them like lists, the spilled chunks are read back transparently.
+    The decoded frames are not even kept: decode returns a sequence that decodes a chunk when it is indexed.
+
+    The drawing workers of render_mode="process" would each get a full copy of the tracks:
+    that mode is rejected under a budget.
+
+    The per-frame stages ask for the "memory_budget" resource and fill their ChunkedSequence frame after frame
+    (collect()), so their whole-video list never exists. The lists still returned (cache loads,
+    small outputs like the ball possession) are chunked here, after the stage.
+    '''
+    def __init__(self, stages, cache_dir=None, max_workers=4, resources=None, memory_budget=None, spill_dir=None):
+        self.stages = {}
+        self.producers = {} # output name -> stage producing it
+
+        for stage in stages:
+            if stage.name in self.stages:
+                raise ValueError(f"Duplicated stage name: {stage.name}")
+            self.stages[stage.name] = stage
+
+            for output in stage.outputs:
+                if output in self.producers:
+                    raise ValueError(f"Output {output} is produced by both {self.producers[output].name} and {stage.name}")
+                self.producers[output] = stage
+
+        self.cache_dir = cache_dir
+        self.max_workers = max_workers
+        self.resources = resources if resources is not None else LazyResources()
+
+        if memory_budget is not None and not isinstance(memory_budget, MemoryBudget):
+            memory_budget = MemoryBudget(memory_budget, spill_dir=spill_dir)
+        self.memory_budget = memory_budget
+
+        # stage name -> (fingerprint, {output name: value})
+        self.memory_cache = {}
+
+        # Names of the stages actually executed during the last run (the others came from a cache)
+        self.executed_stages = []
+
+    def set_params(self, stage_name, **params):
+        self.stages[stage_name].params.update(params)
+
+    def run(self, targets=None, **inputs):
+        '''
+        inputs -> values that no stage produces (e.g. video_path)
+        targets -> names of the outputs wanted, all of them by default
+
+        Returns a dictionary with the values of the targets.
+        '''
+        if targets is None:
+            targets = list(self.producers)
+
+        fingerprints = self.get_fingerprints(inputs)
+
+        # Stages whose outputs are needed but can't be taken from a cache
+        values = dict(inputs)
+        stages_to_run = self._find_stages_to_run(targets, fingerprints, values)
+
+        self.executed_stages = []
+        self._run_stages(stages_to_run, fingerprints, values)
+
+        return {target: values[target] for target in targets}
+
+    def get_fingerprints(self, inputs):
+        fingerprints = {}
+
+        for stage in self._topological_order():
+            input_fingerprints = []
+            for input_name in stage.get_inputs():
+                if input_name in self.producers:
+                    input_fingerprints.append(fingerprints[self.producers[input_name].name])
+                elif input_name in inputs:
+                    input_fingerprints.append(self._fingerprint_value(inputs[input_name]))
+                else:
+                    raise ValueError(f"Input {input_name} of stage {stage.name} is not produced by any stage nor given to run()")
+
+            params = sorted((key, repr(value)) for key, value in stage.params.items())
+            fingerprints[stage.name] = self._hash(repr((stage.name, params, input_fingerprints)))
+
+        return fingerprints
+
+    def _find_stages_to_run(self, targets, fingerprints, values):
+        '''
+        Walks the DAG backwards from the targets.
+        A stage found in a cache stops the walk: its inputs are not needed at all.
+        '''
+        stages_to_run = set()
+        visited = set()
+        to_visit = [self.producers[target] for target in targets if target not in values]
+
+        while to_visit:
+            stage = to_visit.pop()
+            if stage.name in visited:
+                continue
+            visited.add(stage.name)
+
+            cached_outputs = self._read_cache(stage, fingerprints[stage.name])
+            if cached_outputs is not None:
+                values.update(cached_outputs)
+                continue
+
+            stages_to_run.add(stage.name)
+            for input_name in stage.get_inputs():
+                if input_name in self.producers:
+                    to_visit.append(self.producers[input_name])
+
+        return stages_to_run
+
+    def _run_stages(self, stages_to_run, fingerprints, values):
+        remaining = set(stages_to_run)
+        running = {}
+
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            while remaining or running:
+                # Submit every stage whose inputs are all available
+                for stage_name in sorted(remaining):
+                    stage = self.stages[stage_name]
+                    stage_inputs = stage.get_inputs()
+                    if all(input_name in values for input_name in stage_inputs):
+                        input_values = {input_name: values[input_name] for input_name in stage_inputs}
+                        future = executor.submit(self._run_stage, stage, input_values)
+                        running[future] = stage
+                        remaining.discard(stage_name)
+
+                if not running:
+                    raise RuntimeError(f"Stages {sorted(remaining)} can't run: their inputs are never produced (cycle?)")
+
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+
+                for future in done:
+                    stage = running.pop(future)
+                    outputs = future.result()
+                    values.update(outputs)
+
+                    self._write_cache(stage, fingerprints[stage.name], outputs)
+                    self.executed_stages.append(stage.name)
+
+    def close(self):
+        '''
+        Drops the outputs kept in memory and deletes the spilled chunks.
+        '''
+        self.memory_cache = {}
+        if self.memory_budget is not None:
+            self.memory_budget.close()
+
+    def _run_stage(self, stage, input_values):
+        # The stages asking for the "memory_budget" resource get the one of this runner
+        resources = RunResources(self.resources, {"memory_budget": self.memory_budget})
+
+        with profile_stage(f"stage.{stage.name}", memory=True):
+            outputs = stage.run(input_values, resources)
+
+        return self._bound_outputs(outputs)
+
+    def _bound_outputs(self, outputs):
+        '''
+        Per-frame lists -> ChunkedSequences under the memory budget (nothing changes without a budget).
+        The outputs that already are ChunkedSequences are kept as they are.
+        '''
+        if self.memory_budget is None:
+            return outputs
+
+        return {
+            name: ChunkedSequence.from_iterable(value, budget=self.memory_budget) if isinstance(value, list) else value
+            for name, value in outputs.items()
+        }
+
+    def _read_cache(self, stage, fingerprint):
+        cached = self.memory_cache.get(stage.name)
+        if cached is not None and cached[0] == fingerprint:
+            return cached[1] if self._output_files_exist(stage, cached[1]) else None
+
+        if not stage.cache or self.cache_dir is None:
+            return None
+
+        cached = read_stub(True, self._get_cache_path(stage))
+        if cached is None or cached["fingerprint"] != fingerprint:
+            return None
+
+        if not self._output_files_exist(stage, cached["outputs"]):
+            return None
+
+        # The ChunkedSequences are pickled as lists
+        outputs = self._bound_outputs(cached["outputs"])
+        self.memory_cache[stage.name] = (fingerprint, outputs)
+        return outputs
+
+    def _output_files_exist(self, stage, outputs):
+        # The fingerprint says the outputs are up to date, not that their files were not deleted since
+        return all(os.path.exists(outputs[name]) for name in stage.output_files)
+
+    def _write_cache(self, stage, fingerprint, outputs):
+        self.memory_cache[stage.name] = (fingerprint, outputs)
+
+        if stage.cache and self.cache_dir is not None:
+            save_stub(self._get_cache_path(stage), {"fingerprint": fingerprint, "outputs": outputs})
+
+    def _get_cache_path(self, stage):
+        return os.path.join(self.cache_dir, f"{stage.name}.pkl")
+
+    def _topological_order(self):
+        order = []
+        visited = set()
+
+        def visit(stage, path):
+            if stage.name in visited:
+                return
+            if stage.name in path:
+                raise ValueError(f"The stages contain a cycle: {' -> '.join(path + [stage.name])}")
+
+            for input_name in stage.inputs:
+                if input_name in self.producers:
+                    visit(self.producers[input_name], path + [stage.name])
+
+            visited.add(stage.name)
+            order.append(stage)
+
+        for stage in self.stages.values():
+            visit(stage, [])
+
+        return order
+
+    def _fingerprint_value(self, value):
+        # For files the content may change while the path stays the same
+        if isinstance(value, str) and os.path.isfile(value):
+            file_stat = os.stat(value)
+            return self._hash(repr((value, file_stat.st_size, file_stat.st_mtime_ns)))
+        return self._hash(repr(value))
+
+    def _hash(self, text):
+        return hashlib.sha1(text.encode("utf-8")).hexdigest()
@@ -0,0 +1,44 @@
+import threading
+
+
+class LazyResources:
+    '''
+    Shared objects (models, trackers...) created the first time a stage asks for them.
+    
+    If every stage of a run is read from the cache the models are never loaded.
+    '''
+    def __init__(self, factories=None):
+        self.factories = dict(factories) if factories is not None else {}
+        self.resources = {}
+        
+        # One lock per resource: stages running in parallel may ask for the same resource
+        # (it must be created only once), but two different models can be loaded at the same time
+        self.locks = {}
+        self.locks_lock = threading.Lock()
+    
+    def register(self, name, factory):
+        self.factories[name] = factory
+    
+    def get(self, name):
+        with self.locks_lock:
+            lock = self.locks.setdefault(name, threading.Lock())
+        
+        with lock:
+            if name not in self.resources:
+                self.resources[name] = self.factories[name]()
+            return self.resources[name]
+
+
+class RunResources:
+    '''
+    The resources of a run: a few values of the runner (e.g. its memory budget) on top of shared resources,
+    without registering them in the shared LazyResources (other runners may use it at the same time).
+    '''
+    def __init__(self, resources, values):
+        self.resources = resources
+        self.values = dict(values)
+    
+    def get(self, name):
+        if name in self.values:
+            return self.values[name]
+        return self.resources.get(name)
@@ -0,0 +1,58 @@
+class Stage:
+    '''
+    One step of the pipeline.
+    
+    name -> unique name of the stage
+    func -> function that does the work. It is called with keyword arguments:
+            one per input, one per param and one per resource.
+    inputs -> names of the values the stage reads (outputs of other stages or inputs given to the runner)
+    outputs -> names of the values the stage produces. 
+               With one output func returns the value, with more outputs it returns a tuple in the same order.
+    params -> settings of the stage (thresholds, colors, paths...). 
+              Changing one of them invalidates this stage and everything downstream of it.
+    resources -> names of shared objects the stage needs (e.g. loaded models).
+                 They don't change the results, so they are not part of the fingerprint.
+    cache -> whether the outputs can be saved to disk and reused in later runs
+             (False for outputs that are too big, like the video frames, or that can't be pickled).
+    optional_inputs -> {input name: function(params) -> bool} for the inputs only needed with some params
+                       (e.g. the player motion only when the speeds are drawn). When the function returns False
+                       the input is None and its producer is not run: nor is it part of the fingerprint.
+    output_files -> names of the outputs that are paths of files (or folders) written by the stage.
+                    The cached outputs are only reused while these paths still exist:
+                    a deleted output video is written again.
+    '''
+    def __init__(self, name, func, inputs=(), outputs=(), params=None, resources=(), cache=True, output_files=(),
+                 optional_inputs=None):
+        self.name = name
+        self.func = func
+        self.inputs = list(inputs)
+        self.outputs = list(outputs)
+        self.params = dict(params) if params is not None else {}
+        self.resources = list(resources)
+        self.cache = cache
+        self.output_files = list(output_files)
+        self.optional_inputs = dict(optional_inputs) if optional_inputs is not None else {}
+    
+    def get_inputs(self):
+        '''
+        The inputs needed with the current params.
+        '''
+        return [
+            name for name in self.inputs
+            if name not in self.optional_inputs or self.optional_inputs[name](self.params)
+        ]
+    
+    def run(self, input_values, resources):
+        kwargs = {name: input_values.get(name) for name in self.inputs}
+        kwargs.update(self.params)
+        kwargs.update({name: resources.get(name) for name in self.resources})
+        
+        result = self.func(**kwargs)
+        
+        if len(self.outputs) == 1:
+            return {self.outputs[0]: result}
+        
+        return dict(zip(self.outputs, result))
+    
+    def __repr__(self):
+        return f"Stage({self.name}: {self.inputs} -> {self.outputs})"
@@ -0,0 +1,2 @@
+from .frame_source import FrameSource
+from .live_analyzer import LiveAnalyzer, DegradationController
@@ -0,0 +1,77 @@
+import time
+import cv2
+
+
+class FrameSource:
+    '''
+    Frames at the rate of the source.
+    
+    source -> int for a capture device (webcam, capture card), path for a video file.
+    
+    A capture device gives the frames when they are captured. A file is played back at real time speed,
+    so it can stand in for a live feed: frame i is available at start + i/fps, 
+    a consumer that is early waits for it, a consumer that is late gets the most recent frame
+    and the frames in between are dropped (as they would be on a live feed).
+    
+    Yields (frame_num, frame, capture_time), capture_time on the time.perf_counter() clock.
+    '''
+    def __init__(self, source, realtime=True):
+        self.source = source
+        self.is_device = isinstance(source, int)
+        self.realtime = realtime
+        
+        self.cap = cv2.VideoCapture(source)
+        self.fps = self.cap.get(cv2.CAP_PROP_FPS) or 24
+        
+        self.num_dropped_frames = 0
+    
+    def __iter__(self):
+        try:
+            if self.is_device or not self.realtime:
+                yield from self._iter_frames()
+            else:
+                yield from self._iter_frames_at_source_rate()
+        finally:
+            self.cap.release()
+    
+    def _iter_frames(self):
+        frame_num = 0
+        while True:
+            ret, frame = self.cap.read()
+            if not ret:
+                break
+            
+            yield frame_num, frame, time.perf_counter()
+            frame_num += 1
+    
+    def _iter_frames_at_source_rate(self):
+        start_time = time.perf_counter()
+        frame_num = 0
+        
+        while True:
+            now = time.perf_counter()
+            # Frame that a live feed would be showing right now
+            current_frame_num = int((now - start_time) * self.fps)
+            
+            if current_frame_num < frame_num:
+                # Early: wait for the frame to "arrive"
+                time.sleep(start_time + frame_num / self.fps - now)
+            
+            # Late: skip the frames we missed, grab() doesn't decode them
+            ended = False
+            while frame_num < current_frame_num:
+                if not self.cap.grab():
+                    ended = True
+                    break
+                frame_num += 1
+                self.num_dropped_frames += 1
+            
+            if ended:
+                break
+            
+            ret, frame = self.cap.read()
+            if not ret:
+                break
+            
+            yield frame_num, frame, start_time + frame_num / self.fps
+            frame_num += 1
@@ -0,0 +1,248 @@
+import time
+import sys
+sys.path.append("../")
+from utils import profile_stage
+from trackers import BallDetectionFilter
+from drawers import PlayerTracksDrawer, BallTracksDrawer, TeamBallControlDrawer
+from ball_acquisition import BallAquisitionDetector
+
+
+class DegradationController:
+    '''
+    Picks how much work to do on each frame to stay within the latency budget.
+
+    Each level is a dict:
+        detect_every -> run the detectors every N frames (the other frames reuse the last tracks)
+        imgsz -> inference resolution of the detectors (None = model default)
+
+    The latency is smoothed (exponential moving average). Above the budget for `degrade_patience` frames
+    in a row we go one level down (cheaper), below recover_ratio * budget for `patience` frames in a row
+    we go one level back up.
+
+    The average is kept across level changes: a single slow frame right after a change
+    can't push the level down again, so one spike doesn't cascade to the lowest level.
+    '''
+    default_levels = [
+        {"detect_every": 1, "imgsz": None},
+        {"detect_every": 1, "imgsz": 480},
+        {"detect_every": 2, "imgsz": 480},
+        {"detect_every": 3, "imgsz": 320},
+    ]
+
+    def __init__(self, latency_budget, levels=None, smoothing=0.2, recover_ratio=0.6, patience=24, degrade_patience=6):
+        self.latency_budget = latency_budget
+        self.levels = levels if levels is not None else self.default_levels
+        self.smoothing = smoothing
+        self.recover_ratio = recover_ratio
+        self.patience = patience
+        self.degrade_patience = degrade_patience
+
+        self.level = 0
+        self.smoothed_latency = None
+        self.frames_under_budget = 0
+        self.frames_over_budget = 0
+
+    def get_settings(self):
+        return self.levels[self.level]
+
+    def update(self, latency):
+        if self.smoothed_latency is None:
+            self.smoothed_latency = latency
+        else:
+            self.smoothed_latency = self.smoothing * latency + (1 - self.smoothing) * self.smoothed_latency
+
+        if self.smoothed_latency > self.latency_budget:
+            self.frames_under_budget = 0
+            self.frames_over_budget += 1
+            if self.frames_over_budget >= self.degrade_patience and self.level < len(self.levels) - 1:
+                self.level += 1
+                # The new level needs degrade_patience frames over budget of its own before going further down
+                self.frames_over_budget = 0
+        elif self.smoothed_latency < self.recover_ratio * self.latency_budget:
+            self.frames_over_budget = 0
+            self.frames_under_budget += 1
+            if self.frames_under_budget >= self.patience and self.level > 0:
+                self.level -= 1
+                self.frames_under_budget = 0
+        else:
+            self.frames_under_budget = 0
+            self.frames_over_budget = 0
+
+        return self.level
+
+
+class LiveAnalyzer:
+    '''
+    Incremental version of the pipeline: every frame goes through detection, ball filtering,
+    team assignment, ball possession and drawing as soon as it arrives, and is emitted annotated.
+
+    Differences with the batch pipeline, since future frames are not known:
+        - missing ball detections can't be interpolated, the last good position is kept for up to
+          max_ball_hold_frames frames
+        - team ball control is the running percentage up to the current frame
+        - the team of a player is re-classified team_refresh_frames after it was classified (by default
+          the team assigner's cache_frames, the batch pipeline cleans the whole cache every cache_frames). At most max_team_refreshes_per_frame
+          visible players are expired on a frame, the oldest first, so the players seen together
+          don't all go through CLIP again on the same frame:
+
+              bulk reset  ->  frame 50: [p1 p2 p3 p4 p5 p6] in one CLIP batch
+              staggered   ->  frame 50: [p1 p2]  frame 51: [p3 p4]  frame 52: [p5 p6]
+
+    Under overload the DegradationController makes the work per frame explicitly cheaper
+    (lower inference resolution, detection skipped on some frames) instead of falling behind.
+    '''
+    def __init__(self,
+                 player_tracker,
+                 ball_tracker,
+                 team_assigner,
+                 latency_budget=1/24,
+                 degradation_levels=None,
+                 max_ball_hold_frames=12,
+                 draw_team_ball_control=True,
+                 team_refresh_frames=None,
+                 max_team_refreshes_per_frame=2):
+
+        self.player_tracker = player_tracker
+        self.ball_tracker = ball_tracker
+        self.team_assigner = team_assigner
+        self.team_assigner.load_model()
+
+        self.latency_budget = latency_budget
+        self.degradation_levels = degradation_levels
+        self.max_ball_hold_frames = max_ball_hold_frames
+        self.draw_team_ball_control = draw_team_ball_control
+        self.team_refresh_frames = team_refresh_frames if team_refresh_frames is not None else team_assigner.cache_frames
+        self.max_team_refreshes_per_frame = max_team_refreshes_per_frame
+
+        self.player_tracks_drawer = PlayerTracksDrawer()
+        self.ball_tracks_drawer = BallTracksDrawer()
+        self.team_ball_control_drawer = TeamBallControlDrawer()
+
+        # Same possession rules as the batch pipeline
+        self.ball_acquisition_detector = BallAquisitionDetector()
+
+        self.reset()
+
+    def reset(self):
+        self.player_tracker.reset_tracker()
+        self.team_assigner.player_team_dict = {}
+        self.team_classified_frame_nums = {}
+        self.controller = DegradationController(self.latency_budget, self.degradation_levels)
+        self.ball_detection_filter = BallDetectionFilter()
+
+        self.num_processed_frames = 0
+        self.last_player_tracks = {}
+        self.last_ball_tracks = {}
+        self.last_ball_frame_num = None
+        self.consecutive_possession_count = {}
+
+        self.num_team_frames = {1: 0, 2: 0}
+        self.num_frames = 0
+
+    def run(self, frame_source):
+        '''
+        frame_source -> iterable of (frame_num, frame, capture_time), e.g. a FrameSource
+
+        Yields (annotated_frame, info) where info has the frame number, the latency
+        (capture -> annotated frame ready) and the degradation level used for the frame.
+        '''
+        for frame_num, frame, capture_time in frame_source:
+            settings = self.controller.get_settings()
+            level = self.controller.level
+
+            with profile_stage("live.process_frame"):
+                frame = self.process_frame(frame_num, frame, settings)
+
+            latency = time.perf_counter() - capture_time
+            self.controller.update(latency)
+
+            yield frame, {
+                "frame_num": frame_num,
+                "latency": latency,
+                "level": level,
+                "over_budget": latency > self.latency_budget
+            }
+
+    def process_frame(self, frame_num, frame, settings):
+        run_detection = self.num_processed_frames % settings["detect_every"] == 0
+        self.num_processed_frames += 1
+
+        if run_detection:
+            self.last_player_tracks = self.player_tracker.get_frame_tracks(frame, settings["imgsz"])
+            self._update_ball_tracks(frame_num, self.ball_tracker.get_frame_tracks(frame, settings["imgsz"]))
+        elif self.last_ball_frame_num is not None and frame_num - self.last_ball_frame_num > self.max_ball_hold_frames:
+            self.last_ball_tracks = {}
+
+        player_tracks = self.last_player_tracks
+        ball_tracks = self.last_ball_tracks
+
+        # Team assignment, the expired players are re-classified a few per frame
+        self._expire_player_teams(frame_num, player_tracks)
+
+        # The new (and expired) players of the frame in one CLIP batch
+        player_assignment = self.team_assigner.get_frame_player_teams(frame, player_tracks)
+        for player_id in self.team_assigner.player_team_dict:
+            self.team_classified_frame_nums.setdefault(player_id, frame_num)
+
+        # Ball possession
+        player_id_has_ball, self.consecutive_possession_count = self.ball_acquisition_detector.detect_frame_possession(
+            player_tracks,
+            ball_tracks,
+            self.consecutive_possession_count
+        )
+
+        # Draw in place
+        frame = self.player_tracks_drawer.draw_frame(frame, player_tracks, player_assignment, player_id_has_ball)
+        frame = self.ball_tracks_drawer.draw_frame(frame, ball_tracks)
+
+        if self.draw_team_ball_control:
+            self._update_team_ball_control(player_assignment, player_id_has_ball)
+            frame = self.team_ball_control_drawer.draw_control(
+                frame,
+                self.num_team_frames[1] / self.num_frames,
+                self.num_team_frames[2] / self.num_frames
+            )
+
+        return frame
+
+    def _expire_player_teams(self, frame_num, player_tracks):
+        '''
+        Removes from the team cache the players classified at least team_refresh_frames ago.
+        Players not in the frame cost nothing to expire, the visible ones are expired oldest first
+        and at most max_team_refreshes_per_frame per frame, the others wait for the next frames.
+        (frame numbers are compared, not frame counts, since frames can be dropped)
+        '''
+        expired = [
+            player_id for player_id, classified_frame_num in self.team_classified_frame_nums.items()
+            if frame_num - classified_frame_num >= self.team_refresh_frames
+        ]
+        visible = sorted(
+            (player_id for player_id in expired if player_id in player_tracks),
+            key=lambda player_id: self.team_classified_frame_nums[player_id]
+        )
+        to_expire = [player_id for player_id in expired if player_id not in player_tracks]
+        to_expire += visible[:self.max_team_refreshes_per_frame]
+
+        for player_id in to_expire:
+            del self.team_classified_frame_nums[player_id]
+            self.team_assigner.player_team_dict.pop(player_id, None)
+
+    def _update_ball_tracks(self, frame_num, ball_tracks):
+        ball_bbox = ball_tracks.get(1, {}).get("bbox", [])
+
+        if ball_bbox and self.ball_detection_filter.update(frame_num, ball_bbox):
+            self.last_ball_tracks = ball_tracks
+            self.last_ball_frame_num = frame_num
+        elif self.last_ball_frame_num is not None and frame_num - self.last_ball_frame_num > self.max_ball_hold_frames:
+            # Ball lost for too long, stop showing the old position
+            self.last_ball_tracks = {}
+
+    def _update_team_ball_control(self, player_assignment, player_id_has_ball):
+        self.num_frames += 1
+
+        team_id = player_assignment.get(player_id_has_ball, -1)
+        if team_id == -1:
+            return
+
+        # Same rule as get_team_ball_control: team 1 stays 1, any other team counts as team 2
+        self.num_team_frames[1 if team_id == 1 else 2] += 1
@@ -0,0 +1 @@
+from .player_motion import PlayerMotionAnalyzer, PlayerMotion, get_run_lengths
@@ -0,0 +1,274 @@
+import json
+import os
+import numpy as np
+import pandas as pd
+
+
+'''
+Per-player distance, speed, acceleration and sprints, computed on the whole video at once.
+
+The tracks are first turned into one position matrix, one column per track_id:
+
+    positions[frame_num, track_index] = (x, y)     NaN when the track is not there on that frame
+
+and every step after that is an array operation on all the players together:
+
+    positions ─> fill short gaps ─> smooth ─> diff * fps ─> speed ─> diff * fps ─> acceleration
+                                                 │                     │
+                                                 └─> distance          └─> sprints (runs above sprint_speed)
+
+Units: court coordinates (meters, see court/) when they are given, pixels otherwise.
+'''
+
+
+def get_run_lengths(mask):
+    '''
+    Length of the run of equal values every element of a (num_frames, num_columns) bool array belongs to,
+    and where the runs start. The runs don't go from one column to the next.
+
+        mask[:, 0]   = [F, T, T, T, F, T]
+        lengths[:, 0] = [1, 3, 3, 3, 1, 1]
+        starts[:, 0]  = [T, T, F, F, T, T]
+    '''
+    starts = np.ones(mask.shape, dtype=bool)
+    starts[1:] = mask[1:] != mask[:-1]
+
+    # Column by column (Fortran order): the first frame of every column starts a new run
+    run_ids = np.cumsum(starts.ravel(order="F")).reshape(mask.shape, order="F")
+    lengths = np.bincount(run_ids.ravel())[run_ids]
+
+    return lengths, starts
+
+
+class PlayerMotion:
+    '''
+    Results of the PlayerMotionAnalyzer, one row per frame and one column per track:
+
+        positions -> (num_frames, num_tracks, 2) smoothed positions
+        speed -> (num_frames, num_tracks) units per second
+        acceleration -> (num_frames, num_tracks) units per second^2
+        distance -> (num_frames, num_tracks) distance covered since the start of the video
+        sprinting -> (num_frames, num_tracks) bool
+
+    All NaN (False for sprinting) where the track is not there.
+    Looking a value up for the drawers is just an index: nothing is recomputed per frame.
+    '''
+    def __init__(self, track_ids, positions, speed, acceleration, distance, sprinting, fps, unit):
+        self.track_ids = list(track_ids)
+        self.track_index = {track_id: index for index, track_id in enumerate(self.track_ids)}
+        self.positions = positions
+        self.speed = speed
+        self.acceleration = acceleration
+        self.distance = distance
+        self.sprinting = sprinting
+        self.fps = fps
+        self.unit = unit # "m" or "px"
+
+    def __len__(self):
+        return len(self.speed)
+
+    def get_speed(self, frame_num, track_id):
+        '''
+        Speed of a track on a frame (units per second), None when unknown.
+        '''
+        track_index = self.track_index.get(track_id)
+        if track_index is None or frame_num >= len(self.speed):
+            return None
+
+        speed = self.speed[frame_num, track_index]
+        return None if np.isnan(speed) else float(speed)
+
+    def get_frame_speeds(self, frame_num):
+        '''
+        {track_id: speed} of the tracks with a known speed on this frame.
+        '''
+        frame_speeds = self.speed[frame_num]
+        return {
+            self.track_ids[track_index]: float(frame_speeds[track_index])
+            for track_index in np.flatnonzero(~np.isnan(frame_speeds))
+        }
+
+    def get_player_summaries(self):
+        '''
+        {track_id: {num_frames, distance, mean_speed, max_speed, max_acceleration, num_sprints, unit}}
+        Speeds in units per second (km/h are 3.6 * m/s).
+        '''
+        num_frames = np.sum(~np.isnan(self.positions[:, :, 0]), axis=0)
+        # distance is cumulative: the last known value of every track is its total
+        distance = np.nanmax(np.nan_to_num(self.distance), axis=0) if len(self.distance) else np.zeros(len(self.track_ids))
+
+        # Every run of True in sprinting is one sprint
+        _, sprint_starts = get_run_lengths(self.sprinting)
+        num_sprints = np.sum(sprint_starts & self.sprinting, axis=0)
+
+        # nanmean/nanmax warn on tracks with no speed at all (one frame): compute them on the others only
+        has_speed = np.any(~np.isnan(self.speed), axis=0)
+        mean_speed = np.full(len(self.track_ids), np.nan)
+        max_speed = np.full(len(self.track_ids), np.nan)
+        max_acceleration = np.full(len(self.track_ids), np.nan)
+        mean_speed[has_speed] = np.nanmean(self.speed[:, has_speed], axis=0)
+        max_speed[has_speed] = np.nanmax(self.speed[:, has_speed], axis=0)
+
+        has_acceleration = np.any(~np.isnan(self.acceleration), axis=0)
+        max_acceleration[has_acceleration] = np.nanmax(np.abs(self.acceleration[:, has_acceleration]), axis=0)
+
+        summaries = {}
+        for track_index, track_id in enumerate(self.track_ids):
+            summaries[track_id] = {
+                "num_frames": int(num_frames[track_index]),
+                "distance": float(distance[track_index]),
+                "mean_speed": self._to_float(mean_speed[track_index]),
+                "max_speed": self._to_float(max_speed[track_index]),
+                "max_acceleration": self._to_float(max_acceleration[track_index]),
+                "num_sprints": int(num_sprints[track_index]),
+                "unit": self.unit
+            }
+
+        return summaries
+
+    def get_frame_columns(self):
+        '''
+        Long table, one row per (frame, track) where the track is there:
+        frame_num, track_id, x, y, speed, acceleration, distance, sprinting
+        '''
+        frame_nums, track_indexes = np.nonzero(~np.isnan(self.positions[:, :, 0]))
+
+        return pd.DataFrame({
+            "frame_num": frame_nums,
+            "track_id": np.asarray(self.track_ids)[track_indexes] if len(self.track_ids) else np.empty(0, dtype=int),
+            "x": self.positions[frame_nums, track_indexes, 0],
+            "y": self.positions[frame_nums, track_indexes, 1],
+            "speed": self.speed[frame_nums, track_indexes],
+            "acceleration": self.acceleration[frame_nums, track_indexes],
+            "distance": self.distance[frame_nums, track_indexes],
+            "sprinting": self.sprinting[frame_nums, track_indexes]
+        })
+
+    def export(self, summary_path, frame_columns_path=None):
+        '''
+        Player summaries as JSON, per-frame columns as CSV.
+        '''
+        for path in (summary_path, frame_columns_path):
+            if path is not None and os.path.dirname(path):
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+
+        with open(summary_path, "w") as f:
+            json.dump({str(track_id): summary for track_id, summary in self.get_player_summaries().items()}, f, indent=2)
+
+        if frame_columns_path is not None:
+            self.get_frame_columns().to_csv(frame_columns_path, index=False)
+
+    def _to_float(self, value):
+        return None if np.isnan(value) else float(value)
+
+
+class PlayerMotionAnalyzer:
+    def __init__(self, fps=24):
+        self.fps = fps
+
+        self.max_gap_frames = 12 # gaps of a track up to this long are interpolated, longer ones stay empty
+        self.smoothing_window = 5 # frames of the centered moving average on the positions
+
+        # Only in meters, the pixel speeds depend on the camera
+        self.sprint_speed = 5.5 # m/s (~20 km/h)
+        self.min_sprint_frames = 12 # half a second at 24 fps
+        self.max_speed = 12.0 # m/s, above it the track jumped (ID switch, wrong homography): speed unknown
+
+    def analyze(self, player_tracks, court_positions=None):
+        '''
+        player_tracks -> [{track_id: {"bbox": [x1,y1,x2,y2]}}, ...]
+        court_positions -> [{track_id: [x, y]}, ...] in meters (map_tracks_to_court), or None to work in pixels
+                           with the bottom center of the bboxes
+        '''
+        unit = "m" if court_positions is not None else "px"
+        track_ids, positions = self.get_position_matrix(player_tracks, court_positions)
+
+        positions = self.fill_gaps(positions)
+        positions = self.smooth(positions)
+
+        # Distance and speed between consecutive frames, NaN when one of the two positions is missing
+        steps = np.full(positions.shape[:2], np.nan)
+        steps[1:] = np.linalg.norm(np.diff(positions, axis=0), axis=2)
+        speed = steps * self.fps
+
+        if unit == "m":
+            jumps = speed > self.max_speed
+            speed[jumps] = np.nan
+            steps[jumps] = np.nan
+
+        speed = self._rolling_mean(speed)
+
+        acceleration = np.full(speed.shape, np.nan)
+        acceleration[1:] = np.diff(speed, axis=0) * self.fps
+
+        distance = np.nancumsum(steps, axis=0)
+        distance[np.isnan(positions[:, :, 0])] = np.nan
+
+        sprinting = np.zeros(speed.shape, dtype=bool)
+        if unit == "m":
+            above_sprint_speed = np.nan_to_num(speed) > self.sprint_speed
+            run_lengths, _ = get_run_lengths(above_sprint_speed)
+            sprinting = above_sprint_speed & (run_lengths >= self.min_sprint_frames)
+
+        return PlayerMotion(track_ids, positions, speed, acceleration, distance, sprinting, self.fps, unit)
+
+    def get_position_matrix(self, player_tracks, court_positions=None):
+        '''
+        Returns (track_ids, positions) with positions (num_frames, num_tracks, 2), NaN where a track is missing.
+        This is the only loop over the tracks, everything after it works on the matrix.
+        '''
+        track_ids = sorted({track_id for frame_tracks in player_tracks for track_id in frame_tracks})
+        track_index = {track_id: index for index, track_id in enumerate(track_ids)}
+
+        positions = np.full((len(player_tracks), len(track_ids), 2), np.nan)
+
+        for frame_num, frame_tracks in enumerate(player_tracks):
+            if court_positions is not None:
+                for track_id, court_position in court_positions[frame_num].items():
+                    if track_id in track_index:
+                        positions[frame_num, track_index[track_id]] = court_position
+                continue
+
+            for track_id, track in frame_tracks.items():
+                x1, _, x2, y2 = track["bbox"]
+                # Feet: the point of the player on the floor
+                positions[frame_num, track_index[track_id]] = ((x1 + x2) / 2, y2)
+
+        return track_ids, positions
+
+    def fill_gaps(self, positions):
+        '''
+        Linear interpolation of the gaps up to max_gap_frames inside every track
+        (not before its first frame nor after its last one).
+        '''
+        num_frames, num_tracks, _ = positions.shape
+        if num_frames == 0 or num_tracks == 0:
+            return positions
+
+        flat_positions = positions.reshape(num_frames, num_tracks * 2)
+        interpolated = pd.DataFrame(flat_positions).interpolate(limit_area="inside").to_numpy(copy=True)
+
+        missing = np.isnan(flat_positions)
+        gap_lengths, _ = get_run_lengths(missing)
+        # Longer gaps: the player left the frame or the track is a different person, no made up positions
+        long_gaps = missing & (gap_lengths > self.max_gap_frames)
+        interpolated[long_gaps] = np.nan
+
+        return interpolated.reshape(num_frames, num_tracks, 2)
+
+    def smooth(self, positions):
+        num_frames, num_tracks, _ = positions.shape
+        smoothed = self._rolling_mean(positions.reshape(num_frames, num_tracks * 2))
+        return smoothed.reshape(num_frames, num_tracks, 2)
+
+    def _rolling_mean(self, values):
+        '''
+        Centered moving average of every column, the missing values stay missing
+        (no positions made up at the borders of the tracks).
+        '''
+        if self.smoothing_window <= 1 or values.size == 0:
+            return values
+
+        smoothed = pd.DataFrame(values).rolling(self.smoothing_window, center=True, min_periods=1).mean().to_numpy(copy=True)
+        smoothed[np.isnan(values)] = np.nan
+        return smoothed
@@ -0,0 +1,195 @@
+import cv2
+import numpy as np
+import sys
+sys.path.append("../")
+from utils import as_boxes, get_areas, get_paired_containment, profile_stage
+
+
+'''
+CLIP inputs of many player crops at once, without PIL and without the CLIPProcessor image pipeline.
+
+The CLIPProcessor resizes the shortest side of every image to 224, center crops 224x224, scales to [0, 1]
+and normalizes with the CLIP mean and std, one PIL image at a time. For a player bbox (taller than wide)
+the center crop is the central square of the bbox, so the square is cut from the frame directly:
+
+    ┌───┐
+    │   │
+    ├───┤ <─ square of side = bbox width, centered in the bbox (the shirt)
+    │ ■ │ ──> cv2.resize to 224x224 into batch[i] (uint8, preallocated)
+    ├───┤
+    │   │
+    └───┘
+
+and the whole batch is converted in one go into the preallocated float32 tensor:
+
+    batch (N, 224, 224, 3) BGR uint8 ──> pixel_values (N, 3, 224, 224) RGB float32 = batch * scale + offset
+                                         (scale = 1 / (255 * std), offset = -mean / std, per channel)
+
+Crops that would mislead CLIP are filtered out before (get_valid_mask):
+    tiny -> bbox smaller than min_width x min_height pixels inside the frame
+    truncated -> less than min_visible_fraction of the bbox inside the frame
+    occluded -> more than max_occlusion of the square covered by a player in front
+                (a player whose feet are lower in the image is closer to the camera)
+'''
+
+
+CLIP_MEAN = (0.48145466, 0.4578275, 0.40821073)
+CLIP_STD = (0.26862954, 0.26130258, 0.27577711)
+
+
+class CropPreprocessor:
+    def __init__(self, image_size=224, image_mean=CLIP_MEAN, image_std=CLIP_STD, batch_size=64):
+        self.image_size = image_size
+        self.batch_size = batch_size # initial capacity of the buffers, they grow if a call needs more
+
+        image_mean = np.asarray(image_mean, dtype=np.float32)
+        image_std = np.asarray(image_std, dtype=np.float32)
+        self.scale = (1 / (255 * image_std)).reshape(3, 1, 1)
+        self.offset = (-image_mean / image_std).reshape(3, 1, 1)
+
+        self.min_width = 10
+        self.min_height = 20
+        self.min_visible_fraction = 0.75
+        self.max_occlusion = 0.4
+
+        self._batch = None # (capacity, size, size, 3) uint8
+        self._pixel_values = None # (capacity, 3, size, size) float32
+
+    @classmethod
+    def from_processor(cls, processor, batch_size=64):
+        '''
+        Same size, mean and std as the image processor of a CLIPProcessor (CLIP defaults otherwise).
+        '''
+        image_processor = getattr(processor, "image_processor", None)
+        crop_size = getattr(image_processor, "crop_size", None)
+        if isinstance(crop_size, dict):
+            crop_size = crop_size.get("height")
+
+        return cls(
+            image_size=crop_size or 224,
+            image_mean=getattr(image_processor, "image_mean", None) or CLIP_MEAN,
+            image_std=getattr(image_processor, "image_std", None) or CLIP_STD,
+            batch_size=batch_size
+        )
+
+    def get_crop_regions(self, bboxes, frame_shape):
+        '''
+        Returns (regions, visible_fractions):
+            regions -> (N, 4) int [x1, y1, x2, y2] central square of every bbox, inside the frame
+            visible_fractions -> (N,) part of the bbox area inside the frame
+        '''
+        frame_height, frame_width = frame_shape[:2]
+        boxes = as_boxes(bboxes)
+
+        visible = np.clip(boxes, 0, [frame_width, frame_height, frame_width, frame_height])
+
+        areas = get_areas(boxes)
+        visible_fractions = np.divide(get_areas(visible), areas, out=np.zeros(len(boxes)), where=areas > 0)
+
+        # Central square of the visible part
+        widths = visible[:, 2] - visible[:, 0]
+        heights = visible[:, 3] - visible[:, 1]
+        sides = np.minimum(widths, heights)
+        centers_x = (visible[:, 0] + visible[:, 2]) / 2
+        centers_y = (visible[:, 1] + visible[:, 3]) / 2
+
+        regions = np.stack([
+            centers_x - sides / 2,
+            centers_y - sides / 2,
+            centers_x + sides / 2,
+            centers_y + sides / 2
+        ], axis=1)
+        regions = np.round(regions).astype(np.int64)
+
+        return regions, visible_fractions
+
+    def get_valid_mask(self, bboxes, frame_shape, frame_nums=None):
+        '''
+        (N,) True for the crops worth encoding.
+        frame_nums -> (N,) frame of every bbox, the occlusion is only checked between the bboxes of the same frame
+                      (all the bboxes are from the same frame when None)
+        '''
+        boxes = as_boxes(bboxes)
+        regions, visible_fractions = self.get_crop_regions(boxes, frame_shape)
+
+        valid = (
+            (regions[:, 2] - regions[:, 0] >= self.min_width) &
+            (np.minimum(boxes[:, 3], frame_shape[0]) - np.maximum(boxes[:, 1], 0) >= self.min_height) &
+            (visible_fractions >= self.min_visible_fraction)
+        )
+
+        occlusion = self.get_occlusion(regions, boxes, frame_nums)
+        return valid & (occlusion <= self.max_occlusion)
+
+    def get_occlusion(self, regions, bboxes, frame_nums=None):
+        '''
+        (N,) largest part of every region covered by one bbox of a player in front, on the same frame.
+        All the pairs of the video in one get_paired_containment call.
+        '''
+        boxes = as_boxes(bboxes)
+        num_boxes = len(boxes)
+        occlusion = np.zeros(num_boxes)
+        if num_boxes < 2:
+            return occlusion
+
+        frame_nums = np.zeros(num_boxes, dtype=np.int64) if frame_nums is None else np.asarray(frame_nums, dtype=np.int64)
+        order = np.argsort(frame_nums, kind="stable")
+        sorted_frame_nums = frame_nums[order]
+
+        # Every (i, j) of the same frame: i repeated once per box of its frame, j running over that frame
+        group_starts = np.searchsorted(sorted_frame_nums, sorted_frame_nums, side="left")
+        group_sizes = np.searchsorted(sorted_frame_nums, sorted_frame_nums, side="right") - group_starts
+
+        first = np.repeat(np.arange(num_boxes), group_sizes)
+        position_in_pair = np.arange(len(first)) - np.repeat(np.cumsum(group_sizes) - group_sizes, group_sizes)
+        second = group_starts[first] + position_in_pair
+        first, second = order[first], order[second]
+
+        # In front: feet lower in the image
+        in_front = boxes[second, 3] > boxes[first, 3]
+        first, second = first[in_front], second[in_front]
+        if len(first) == 0:
+            return occlusion
+
+        containment = get_paired_containment(regions[first], boxes[second])
+        np.maximum.at(occlusion, first, containment)
+        return occlusion
+
+    def preprocess(self, video_frames, frame_nums, bboxes):
+        '''
+        One crop per row: video_frames[frame_nums[i]] cut at bboxes[i].
+        Returns the (N, 3, size, size) float32 pixel values, a view on a buffer reused by the next call:
+        it has to be consumed (e.g. sent to the model) before calling preprocess again.
+        '''
+        frame_nums = np.asarray(frame_nums, dtype=np.int64).reshape(-1)
+        num_crops = len(frame_nums)
+        batch, pixel_values = self._get_buffers(num_crops)
+
+        with profile_stage("crop_preprocessor.preprocess", items=num_crops):
+            if num_crops == 0:
+                return pixel_values
+
+            # The frames of a video all have the same shape
+            regions, _ = self.get_crop_regions(bboxes, video_frames[frame_nums[0]].shape)
+
+            for index, (frame_num, (x1, y1, x2, y2)) in enumerate(zip(frame_nums, regions)):
+                crop = video_frames[frame_num][y1:y2, x1:x2]
+                if crop.size == 0:
+                    batch[index] = 0
+                    continue
+                # Bicubic like the CLIPProcessor, written straight into the batch
+                cv2.resize(crop, (self.image_size, self.image_size), dst=batch[index], interpolation=cv2.INTER_CUBIC)
+
+            # BGR -> RGB by reversing the channel axis, HWC -> CHW, scale and normalize: one pass and an add
+            np.multiply(batch.transpose(0, 3, 1, 2)[:, ::-1], self.scale, out=pixel_values)
+            pixel_values += self.offset
+
+        return pixel_values
+
+    def _get_buffers(self, num_crops):
+        if self._batch is None or len(self._batch) < num_crops:
+            capacity = max(num_crops, self.batch_size)
+            self._batch = np.empty((capacity, self.image_size, self.image_size, 3), dtype=np.uint8)
+            self._pixel_values = np.empty((capacity, 3, self.image_size, self.image_size), dtype=np.float32)
+
+        return self._batch[:num_crops], self._pixel_values[:num_crops]
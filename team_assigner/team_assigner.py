@@ -1,9 +1,10 @@
-from PIL import Image
 from transformers import CLIPProcessor, CLIPModel
-import cv2
+import numpy as np
+import torch
 import sys
 sys.path.append(".../")
-from utils import read_stub, save_stub
+from utils import read_stub, save_stub, profile_stage, as_boxes, collect
+from .crop_preprocessor import CropPreprocessor
 
 
 class TeamAssigner:
@@ -15,167 +16,137 @@ class TeamAssigner:
         self.team2_class_name = team2_class_name
         
         self.player_team_dict = {}
+        self.last_player_teams = {} # not cleaned every 50 frames: the team of a player whose crop can't be used
+        
+        self.model = None
+        self.processor = None
+        
+        # Crops cut, resized and normalized into one tensor per batch, see crop_preprocessor.py
+        self.crop_preprocessor = None
+        self.batch_size = 64
+        self.cache_frames = 50 # the teams are classified again every cache_frames frames
+        
+        self._text_inputs = None # tokenized class names, (classes, inputs)
         
         
     def load_model(self, ):
         
+        # Loaded only once, the same TeamAssigner can be reused for several videos
+        if self.model is not None:
+            return
+        
         self.model = CLIPModel.from_pretrained("patrickjohncyh/fashion-clip")
         self.processor = CLIPProcessor.from_pretrained("patrickjohncyh/fashion-clip")
+    
+    def get_crop_preprocessor(self):
+        if self.crop_preprocessor is None:
+            self.crop_preprocessor = CropPreprocessor.from_processor(self.processor, self.batch_size)
+        return self.crop_preprocessor
+    
+    def get_text_inputs(self, classes):
+        # The class names are tokenized once, not with every image
+        if self._text_inputs is None or self._text_inputs[0] != classes:
+            self._text_inputs = (classes, self.processor(text=list(classes), return_tensors="pt", padding=True))
+        return self._text_inputs[1]
 
 
     def get_player_color(self, frame, bbox):
         # bbox = [x1, y1, x2, y2]
+        return self.get_player_colors([frame], [0], [bbox])[0]
+    
+    def get_player_colors(self, video_frames, frame_nums, bboxes):
         '''
+        Class name of many crops: video_frames[frame_nums[i]] cut at bboxes[i].
+        
         frame is a NumPy array with shape (height, width, channels).
 
         To crop a region, we select:
             a range of rows (vertical axis → y),
             and a range of columns (horizontal axis → x).
         
-        first slice (:) → rows (height)
-
-        second slice (:) → columns (width)
-        '''
-        image = frame[int(bbox[1]):int(bbox[3]), int(bbox[0]):int(bbox[2])]
-        
-        # OpenCV uses BGR color order, while CLIP (via PIL) expects RGB.
-        rgb_image = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
-        pil_image = Image.fromarray(rgb_image)
-        
-        classes = [self.team1_class_name, self.team2_class_name]
-        
-        inputs = self.processor(text=classes, images=pil_image, return_tensors="pt", padding=True)
-
-        '''
-        CLIP computes similarity scores between the image and each text prompt.
-        Result example (for 1 image, 2 text labels):
-
-        logits_per_image = tensor([[12.3, 9.5]])
-
-        12.3 → similarity with “white shirt”
-
-        9.5 → similarity with “dark blue shirt”
-        If you have 1 image and 2 text prompts (“white shirt” and “dark blue shirt”), the shape is:
-
-        logits_per_image.shape = (1, 2)
-
-        Row	Meaning
-        Axis 0 (dim=0)	image index (we only have 1)
-        Axis 1 (dim=1)	text prompt index (one score per label)
-        '''
-        outputs = self.model(**inputs)
-        logits_per_image = outputs.logits_per_image # this is the image-text similarity score
-        
-        '''
-        Applies softmax → converts scores into normalized probabilities:
-
-        probs = tensor([[0.90, 0.10]])
-
-        Meaning:
-
-        90 % chance → white shirt
-
-        10 % chance → dark blue shirt.
-        
-        We apply softmax across the label dimension, so the two scores become probabilities that add up to 1 for each image.
-
-        If we used dim=0, it would normalize across images (nonsense here, because we only have one image).
-        So dim=1 = “normalize along the class axis.”
+        The CropPreprocessor cuts the crops of batch_size players, converts them from BGR (OpenCV)
+        to RGB (CLIP) and normalizes them into one float tensor: no PIL image, one CLIP forward per batch.
         '''
-        probs = logits_per_image.softmax(dim=1) # we can take the softmax to get the label probabilities
+        classes = (self.team1_class_name, self.team2_class_name)
+        text_inputs = self.get_text_inputs(classes)
+        crop_preprocessor = self.get_crop_preprocessor()
         
-        '''
-        probs.argmax(dim=1) → finds the index of the highest probability (0 or 1).
-
-        probs is a PyTorch tensor of shape (N, M):
-            Symbol	Meaning
-                N	number of images in the batch
-                M	number of text prompts (classes/labels)
-
-        Example — if you have 1 image and 2 team names (“white shirt”, “dark blue shirt”):
-
-        probs = tensor([[0.85, 0.15]])
-
-        Shape = (1, 2)
+        frame_nums = np.asarray(frame_nums, dtype=np.int64).reshape(-1)
+        class_names = []
         
-        argmax(dim=1) finds the index of the maximum value along the specified dimension.
-
-        dim=1 → along the columns, i.e., across the text classes for each image.
-
-        Let’s compute:
-
-        >>> probs.argmax(dim=1)
-        tensor([0])
-
-
-        Explanation:
-
-        The largest value per row is in column index 0 (0.85 > 0.15).
-
-        The result is a tensor of shape (N,), with one integer per image.
-
-        If we had multiple images:
-
-        probs = tensor([
-            [0.85, 0.15],  # image 0
-            [0.10, 0.90],  # image 1
-        ])
-
-
-        then:
-
-        >>> probs.argmax(dim=1)
-        tensor([0, 1])
-
-        Image 0 → best match = index 0
+        for first_index in range(0, len(frame_nums), self.batch_size):
+            last_index = first_index + self.batch_size
+            pixel_values = crop_preprocessor.preprocess(video_frames, frame_nums[first_index:last_index], bboxes[first_index:last_index])
+            
+            '''
+            CLIP computes similarity scores between every image and each text prompt.
+            Result example (for 2 images, 2 text labels):
 
-        Image 1 → best match = index 1
+            logits_per_image = tensor([[12.3, 9.5],
+                                       [8.1, 11.7]])
 
-        classes[index] → maps index back to text label.
+            12.3 → similarity of image 0 with “white shirt”
 
-        We have 1 image in the batch.
-        So probs.argmax(dim=1) returns something like:
+            9.5 → similarity of image 0 with “dark blue shirt”
+            With N images and 2 text prompts (“white shirt” and “dark blue shirt”), the shape is:
 
-        tensor([0])
-        That's a 1D tensor with a single element — not a plain Python integer.
+            logits_per_image.shape = (N, 2)
 
-        To extract the value (the actual scalar 0), you do [0].
+            Row	Meaning
+            Axis 0 (dim=0)	image index (one row per crop of the batch)
+            Axis 1 (dim=1)	text prompt index (one score per label)
+            
+            inference_mode: no gradients are kept, we only classify.
+            '''
+            with profile_stage("clip.forward", items=len(pixel_values)), torch.inference_mode():
+                # from_numpy: the tensor is the preallocated buffer, no copy
+                outputs = self.model(**text_inputs, pixel_values=torch.from_numpy(pixel_values))
+            logits_per_image = outputs.logits_per_image # this is the image-text similarity score
+            
+            '''
+            Applies softmax → converts scores into normalized probabilities:
 
-        >>> probs.argmax(dim=1)[0]
-        tensor(0)
+            probs = tensor([[0.94, 0.06],
+                            [0.03, 0.97]])
 
-        Now it's just a single scalar tensor, representing which class index is the predicted one for that image.
+            Meaning (image 0):
 
-        We then use it as an index into our list of class names:
+            94 % chance → white shirt
 
-        class_name = classes[probs.argmax(dim=1)[0]]
+            6 % chance → dark blue shirt.
+            
+            We apply softmax across the label dimension, so the two scores become probabilities that add up to 1 for each image.
 
+            If we used dim=0, it would normalize across images (nonsense here, every crop is a different player).
+            So dim=1 = “normalize along the class axis.”
+            '''
+            probs = logits_per_image.softmax(dim=1) # we can take the softmax to get the label probabilities
+            
+            '''
+            probs.argmax(dim=1) → finds the index of the highest probability (0 or 1) of every image.
 
-        classes = ["white shirt", "dark blue shirt"]
-        probs = tensor([[0.85, 0.15]])
+            probs is a PyTorch tensor of shape (N, M):
+                Symbol	Meaning
+                    N	number of images in the batch
+                    M	number of text prompts (classes/labels)
 
+            argmax(dim=1) finds the index of the maximum value along the specified dimension.
 
-        Compute step by step:
-            1) probs.argmax(dim=1) → tensor([0])
-            2) [0] → scalar 0
-            3) classes[0] → "white shirt"
+            dim=1 → along the columns, i.e., across the text classes for each image.
 
-        Final output:
-        class_name = "white shirt"
-        
-        Another example:
-                probs = tensor([[0.25, 0.75]])
-                argmax(dim=1) → tensor([1])
+            >>> probs.argmax(dim=1)
+            tensor([0, 1])
 
-                [0] → 1
+            Image 0 → best match = index 0 → classes[0] → "white shirt"
 
-                classes[1] → "dark blue shirt"
+            Image 1 → best match = index 1 → classes[1] → "dark blue shirt"
 
-                Result → "dark blue shirt"
+            The result is a tensor of shape (N,), one integer per image: int() of each element
+            is the index into our list of class names.
+            '''
+            class_names.extend(classes[int(class_index)] for class_index in probs.argmax(dim=1))
         
-        '''
-        class_name = classes[probs.argmax(dim=1)[0]]
-        return class_name
+        return class_names
     
     def get_player_team(self, frame, player_bbox, player_id):
         
@@ -192,30 +163,151 @@ class TeamAssigner:
         
         return team_id
         
-    def get_player_teams_across_frames(self, video_frames, player_tracks, read_from_stub = False, stub_path = None):
-        
+    def get_player_teams_across_frames(self, video_frames, player_tracks, read_from_stub = False, stub_path = None, stub_id_mapping = None,
+                                       memory_budget = None):
+        '''
+        stub_id_mapping -> {old player id: new player id} of the TrackStitcher, for a stub made
+                           with the tracks before stitching: its ids are renamed the same way.
+        A stub whose players don't match the tracks is not used.
+        memory_budget -> MemoryBudget: the assignment is a ChunkedSequence, filled frame after frame
+        '''
         player_assignment = read_stub(read_from_stub, stub_path)
-        if player_assignment is not None:
-            if len(player_assignment) == len(video_frames):
+        if player_assignment is not None and len(player_assignment) == len(video_frames):
+            player_assignment = self._match_stub_to_tracks(player_assignment, player_tracks, stub_id_mapping)
+            if player_assignment is not None:
                 return player_assignment
         
         self.load_model()
         
-        player_assignment = []
+        with profile_stage("get_player_teams_across_frames", items=len(player_tracks), memory=True):
+            player_assignment = self._get_player_teams_across_frames(video_frames, player_tracks, memory_budget)
         
-        for frame_num, player_track in enumerate(player_tracks):
-            player_assignment.append({})
+        save_stub(stub_path,player_assignment)
+        
+        return player_assignment
+    
+    def _match_stub_to_tracks(self, player_assignment, player_tracks, stub_id_mapping=None):
+        '''
+        The stub as it is, or with the ids renamed, whichever has the players of the tracks on every frame.
+        None if neither does.
+        '''
+        def matches(assignment):
+            return all(frame_assignment.keys() == frame_tracks.keys() for frame_assignment, frame_tracks in zip(assignment, player_tracks))
+        
+        if matches(player_assignment):
+            return player_assignment
+        
+        if stub_id_mapping:
+            player_assignment = [
+                {stub_id_mapping.get(player_id, player_id): team_id for player_id, team_id in frame_assignment.items()}
+                for frame_assignment in player_assignment
+            ]
+            if matches(player_assignment):
+                return player_assignment
+        
+        return None
+    
+    def get_frame_player_teams(self, frame, frame_tracks):
+        '''
+        {player_id: team_id} of one frame, like get_player_team for every player
+        but with the players not in the cache classified in one batch (live mode).
+        
+        A player whose crop is tiny, cut by the border of the frame or hidden by another player
+        keeps his last known team and is classified on a later frame, with a better crop.
+        '''
+        player_ids = list(frame_tracks.keys())
+        unknown = [index for index, player_id in enumerate(player_ids) if player_id not in self.player_team_dict]
+        
+        if unknown:
+            bboxes = as_boxes([frame_tracks[player_id]["bbox"] for player_id in player_ids])
+            valid = self.get_crop_preprocessor().get_valid_mask(bboxes, frame.shape)
             
-            # Every 50 frames i will clean the cache, so it has the opportunity to correct the wrong classifications
-            if frame_num %50 == 0:
-                self.player_team_dict={}
+            # Without a known team there is nothing better than the crop we have
+            to_classify = [index for index in unknown if valid[index] or player_ids[index] not in self.last_player_teams]
             
-            for player_id, track in player_track.items():
-                team = self.get_player_team(video_frames[frame_num],track["bbox"], player_id)
-                player_assignment[frame_num][player_id] = team
+            if to_classify:
+                class_names = self.get_player_colors([frame], [0] * len(to_classify), bboxes[to_classify])
+                for index, class_name in zip(to_classify, class_names):
+                    team_id = 1 if class_name == self.team1_class_name else 2
+                    self.player_team_dict[player_ids[index]] = team_id
+                    self.last_player_teams[player_ids[index]] = team_id
         
-        save_stub(stub_path,player_assignment)
+        return {
+            player_id: self.player_team_dict.get(player_id, self.last_player_teams.get(player_id))
+            for player_id in player_ids
+        }
+    
+    def _get_player_teams_across_frames(self, video_frames, player_tracks, memory_budget=None):
+        '''
+        Every 50 frames (cache_frames) the cache is cleaned, so it has the opportunity to correct the wrong classifications:
+        a player is classified once per window of 50 frames, on the first frame of the window where his crop is usable.
         
-        return player_assignment
-                
-                
\ No newline at end of file
+        The crops to classify only depend on the tracks, so they are all chosen first and then classified in batches:
+        
+            (frame, player, bbox) of the video ─> usable crops (CropPreprocessor.get_valid_mask)
+                ─> first usable crop of every (window, player) ─> get_player_colors ─> team of every (frame, player)
+        
+        A player without any usable crop in a window keeps his team of the previous windows,
+        or gets his first crop of the window classified if he has none.
+        '''
+        # One row per (frame, player), as arrays: a few numbers per row, not a Python list of every box of the video
+        num_frames = len(player_tracks)
+        frame_player_counts = np.zeros(num_frames, dtype=np.int64)
+        frame_player_ids = []
+        frame_bboxes = []
+        for frame_num, player_track in enumerate(player_tracks):
+            frame_player_counts[frame_num] = len(player_track)
+            if player_track:
+                frame_player_ids.append(np.fromiter(player_track.keys(), dtype=np.int64, count=len(player_track)))
+                frame_bboxes.append(as_boxes([track["bbox"] for track in player_track.values()]))
+        
+        if not frame_player_ids:
+            return collect(({} for _ in range(num_frames)), memory_budget)
+        
+        frame_nums = np.repeat(np.arange(num_frames, dtype=np.int64), frame_player_counts)
+        player_ids = np.concatenate(frame_player_ids)
+        bboxes = np.concatenate(frame_bboxes)
+        del frame_player_ids, frame_bboxes
+        
+        valid = self.get_crop_preprocessor().get_valid_mask(bboxes, video_frames[0].shape, frame_nums)
+        
+        # One group per (window, player), sorted by window then player
+        windows = frame_nums // self.cache_frames
+        group_keys, group_ids = np.unique(np.stack([windows, player_ids], axis=1), axis=0, return_inverse=True)
+        group_ids = group_ids.reshape(-1)
+        num_groups = len(group_keys)
+        
+        # First row (= first frame, the rows are in frame order) of every group, and its first usable one
+        first_rows = np.full(num_groups, len(frame_nums), dtype=np.int64)
+        np.minimum.at(first_rows, group_ids, np.arange(len(frame_nums)))
+        first_valid_rows = np.full(num_groups, len(frame_nums), dtype=np.int64)
+        np.minimum.at(first_valid_rows, group_ids[valid], np.flatnonzero(valid))
+        has_valid = first_valid_rows < len(frame_nums)
+        
+        # Group whose team is used: itself, or the last group of the same player with a usable crop
+        by_player = np.lexsort((group_keys[:, 0], group_keys[:, 1]))
+        last_valid = np.where(has_valid[by_player], np.arange(num_groups), -1)
+        last_valid = np.maximum.accumulate(last_valid)
+        same_player = (last_valid != -1) & (group_keys[by_player[np.maximum(last_valid, 0)], 1] == group_keys[by_player, 1])
+        source_groups = np.arange(num_groups)
+        source_groups[by_player] = np.where(same_player, by_player[np.maximum(last_valid, 0)], by_player)
+        
+        # Classified: the groups with a usable crop, and the groups of the players without any so far
+        classified = has_valid | (source_groups == np.arange(num_groups))
+        classified_groups = np.flatnonzero(classified)
+        classified_rows = np.where(has_valid, first_valid_rows, first_rows)[classified_groups]
+        
+        class_names = self.get_player_colors(video_frames, frame_nums[classified_rows], bboxes[classified_rows])
+        
+        group_teams = np.zeros(num_groups, dtype=np.int64)
+        group_teams[classified_groups] = [1 if class_name == self.team1_class_name else 2 for class_name in class_names]
+        row_teams = group_teams[source_groups][group_ids]
+        
+        # The rows are in frame order: the ones of frame i are [frame_starts[i], frame_starts[i + 1])
+        frame_starts = np.concatenate([[0], np.cumsum(frame_player_counts)])
+        player_assignment = (
+            dict(zip(player_ids[start:end].tolist(), row_teams[start:end].tolist()))
+            for start, end in zip(frame_starts[:-1].tolist(), frame_starts[1:].tolist())
+        )
+        
+        return collect(player_assignment, memory_budget)
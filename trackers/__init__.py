@@ -1,2 +1,5 @@
 from .player_tracker import PlayerTracker
-from .ball_tracker import BallTracker
\ No newline at end of file
+from .ball_tracker import BallTracker, BallDetectionFilter
+from .ball_trajectory_solver import BallTrajectorySolver
+from .inference_resolution import InferenceResolution
+from .track_stitcher import TrackStitcher
@@ -1,4 +1,3 @@
-from ultralytics import YOLO
 import sys
 import supervision as sv
 import numpy as np
@@ -6,95 +5,170 @@ import pandas as pd
 
 
 sys.path.append("../")
-from utils import read_stub, save_stub
+from utils import read_stub, save_stub, profile_stage, collect
+from .inference_resolution import InferenceResolution, rescale_detections
+from .ball_trajectory_solver import BallTrajectorySolver
 
 class BallTracker:
-    def __init__(self, model_path):
+    def __init__(self, model_path, inference_resolution=None):
+        # Imported here: the filtering / interpolation methods (and the benchmarks) don't need ultralytics
+        from ultralytics import YOLO
         self.model = YOLO(model_path)
+        # None = frames as they are, see InferenceResolution.from_settings for the other settings
+        self.inference_resolution = InferenceResolution.from_settings(inference_resolution, class_name="Ball")
+        
+        # Ball candidates kept per frame for the BallTrajectorySolver, 1 = only the best box (the tracks)
+        self.num_candidates = 1
+        self.candidate_conf = 0.15 # the candidates go below the conf of the tracks, the solver decides
     
     def detect_frames(self, frames):
+        '''
+        Yields (detection, scale) of every frame, batch after batch: only the Results
+        (and their copy of the frame) of one batch are alive at a time, see PlayerTracker.detect_frames.
+        '''
         batch_size = 20
-        detections = []
         
         for i in range(0, len(frames), batch_size):
             batch_frames = frames[i:i+batch_size]
-            batch_detections = self.model.predict(batch_frames, conf=0.5)
-            detections+=batch_detections
-            
-        return detections
+            with profile_stage("ball_detector.predict", items=len(batch_frames)):
+                batch_detections = self.inference_resolution.predict(self.model, batch_frames, conf=self._get_predict_conf())
+            yield from batch_detections
     
-    def get_object_tracks(self, frames, read_from_stub=False, stub_path=None):
-        
+    def get_object_tracks(self, frames, read_from_stub=False, stub_path=None, memory_budget=None):
+        '''
+        memory_budget -> MemoryBudget: the tracks are a ChunkedSequence, filled while the frames are detected
+        '''
         tracks = read_stub(read_from_stub, stub_path)
         if tracks is not None:
             if len(tracks) == len(frames):
                 return tracks
-            
-        detections = self.detect_frames(frames)
-        tracks = []
         
-        for frame_num, detection in enumerate(detections):
-            cls_name = detection.names
-            cls_name_inv = {v:k for k,v in cls_name.items()}
-            
-            detection_supervision = sv.Detections.from_ultralytics(detection)
-            tracks.append({})
-            chosen_bbox = None
-            max_confidence = 0
-            
-            for frame_detection in detection_supervision:
-                bbox = frame_detection[0].tolist()
-                cls_id = frame_detection[3]
-                confidence = frame_detection[2]
-                
-                if cls_id == cls_name_inv["Ball"]:
-                    if max_confidence < confidence:
-                        chosen_bbox = bbox
-                        max_confidence = confidence
-            
-            if chosen_bbox is not None:
-                # The '1' is hardcoded as there is 1 object(track_id) we care about -> the ball
-                tracks[frame_num][1] = {"bbox":chosen_bbox}
+        tracks = collect(
+            (self.get_tracks_from_detection(detection, scale) for detection, scale in self.detect_frames(frames)),
+            memory_budget
+        )
         
         save_stub(stub_path, tracks)
         return tracks
     
+    def get_object_candidates(self, frames, read_from_stub=False, stub_path=None, memory_budget=None):
+        '''
+        Top num_candidates ball boxes of every frame: [(n, 5) array [x1, y1, x2, y2, conf], ...]
+        '''
+        ball_candidates = read_stub(read_from_stub, stub_path)
+        if ball_candidates is not None:
+            if len(ball_candidates) == len(frames):
+                return ball_candidates
+        
+        ball_candidates = collect(
+            (self.get_candidates_from_detection(detection, scale) for detection, scale in self.detect_frames(frames)),
+            memory_budget
+        )
+        
+        save_stub(stub_path, ball_candidates)
+        return ball_candidates
+    
+    def get_frame_tracks(self, frame, imgsz=None):
+        '''
+        Ball detection of a single frame, for when the frames arrive one at a time (live mode).
+        imgsz -> inference resolution, None to use the inference_resolution settings
+        '''
+        with profile_stage("ball_detector.predict"):
+            detection, scale = self.inference_resolution.predict(self.model, frame, imgsz, conf=self._get_predict_conf(), verbose=False)[0]
+        
+        return self.get_tracks_from_detection(detection, scale)
+    
+    def get_tracks_from_detection(self, detection, scale=1.0):
+        return self.get_tracks_from_candidates(self.get_candidates_from_detection(detection, scale))
+    
+    def get_candidates_from_detection(self, detection, scale=1.0):
+        '''
+        The ball boxes of a detection, best first: (n, 5) array [x1, y1, x2, y2, conf], n <= num_candidates
+        '''
+        cls_name = detection.names
+        cls_name_inv = {v:k for k,v in cls_name.items()}
+        
+        detection_supervision = sv.Detections.from_ultralytics(detection)
+        # Back to the coordinates of the source frame when it was resized for the inference
+        detection_supervision = rescale_detections(detection_supervision, scale)
+        
+        is_ball = (detection_supervision.class_id == cls_name_inv["Ball"]) & (detection_supervision.confidence >= self.candidate_conf)
+        candidates = np.column_stack([
+            detection_supervision.xyxy[is_ball],
+            detection_supervision.confidence[is_ball]
+        ]).astype(np.float64).reshape(-1, 5)
+        
+        best_first = np.argsort(-candidates[:, 4], kind="stable")[:max(self.num_candidates, 1)]
+        return candidates[best_first]
+    
+    def get_tracks_from_candidates(self, candidates):
+        frame_tracks = {}
+        
+        # The best candidate is the ball of the tracks, only above the usual conf
+        if len(candidates) and candidates[0, 4] >= 0.5:
+            # The '1' is hardcoded as there is 1 object(track_id) we care about -> the ball
+            frame_tracks[1] = {"bbox":candidates[0, :4].tolist()}
+        
+        return frame_tracks
+    
+    def solve_trajectory(self, ball_candidates, memory_budget=None):
+        '''
+        Alternative to remove_wrong_detections: the best trajectory over the whole video
+        from the top-k candidates of every frame (BallTrajectorySolver), as ball tracks.
+        '''
+        ball_trajectory_solver = BallTrajectorySolver(num_candidates=max(self.num_candidates, 1))
+        return ball_trajectory_solver.get_ball_tracks(ball_candidates, memory_budget)
+    
+    def _get_predict_conf(self):
+        return min(self.candidate_conf, 0.5) if self.num_candidates > 1 else 0.5
+    
     def remove_wrong_detections(self, ball_positions):
+        with profile_stage("remove_wrong_detections", items=len(ball_positions)):
+            return self._remove_wrong_detections(ball_positions)
+    
+    def _remove_wrong_detections(self, ball_positions):
         
-        maximum_allowed_distance = 25 # Pixels per frame
-        # So if the ball det disappears for 3 frame we will have 25*3
-        last_good_frame_index = -1
+        for i, frame_tracks in enumerate(self.iter_filtered_detections(ball_positions)):
+            if not frame_tracks:
+                ball_positions[i] = {}
+            
+        return ball_positions
+    
+    def iter_filtered_detections(self, ball_positions):
+        '''
+        Yields the tracks of every frame, {} for the wrong detections: like remove_wrong_detections
+        but without editing ball_positions (e.g. a cached ChunkedSequence), one frame at a time.
+        '''
+        ball_detection_filter = BallDetectionFilter()
         
-        for i in range(len(ball_positions)):
+        for i, frame_tracks in enumerate(ball_positions):
             # We use get (1,) because we have track_id = 1, returns empty dict otherwise
             # And we take the bbox of the ball tracked
-            current_bbox = ball_positions[i].get(1,{}).get("bbox", [])
+            current_bbox = frame_tracks.get(1,{}).get("bbox", [])
             
             if len(current_bbox) == 0:
-                continue
-            
-            # Handling the 1st detection of the ball
-            if last_good_frame_index == -1:
-                last_good_frame_index=i
-                continue
-            
-            last_good_box = ball_positions[last_good_frame_index].get(1,{}).get("bbox", [])
-            frame_gap = i - last_good_frame_index
-            adjusted_max_distance = maximum_allowed_distance * frame_gap
-            
-            # Calculate the dist between the last good bbox and the current position
-            # using their (x,y), that's why we take the first 2 [:2] elements
-            if np.linalg.norm(np.array(last_good_box[:2]) - np.array(current_bbox[:2])) > adjusted_max_distance:
-                ball_positions[i] = {}
+                yield frame_tracks
+            elif ball_detection_filter.update(i, current_bbox):
+                yield frame_tracks
             else:
-                last_good_frame_index = i
-            
-        return ball_positions
+                yield {}
             
     
-    def interpolate_ball_positions(self, ball_positions):
-        ball_positions = [ x.get(1,{}).get("bbox", []) for x in ball_positions]
-        df_ball_positions = pd.DataFrame(ball_positions, columns=["x1", "y1", "x2", "y2"])
+    def interpolate_ball_positions(self, ball_positions, memory_budget=None):
+        '''
+        memory_budget -> MemoryBudget: the interpolated tracks are a ChunkedSequence, filled frame after frame
+        '''
+        with profile_stage("interpolate_ball_positions", items=len(ball_positions)):
+            return self._interpolate_ball_positions(ball_positions, memory_budget)
+    
+    def _interpolate_ball_positions(self, ball_positions, memory_budget=None):
+        # (num_frames, 4) array, NaN where there is no ball: 32 bytes per frame instead of a list per frame
+        bboxes = np.full((len(ball_positions), 4), np.nan)
+        for i, frame_tracks in enumerate(ball_positions):
+            bbox = frame_tracks.get(1,{}).get("bbox", [])
+            if len(bbox):
+                bboxes[i] = bbox[:4]
+        df_ball_positions = pd.DataFrame(bboxes, columns=["x1", "y1", "x2", "y2"])
         
         # Interpolate missing values
         '''
@@ -150,9 +224,48 @@ class BallTracker:
         [{1: {"bbox": x}} for x in df_ball_positions.to_numpy().tolist()]
 
         Each x here is one [x1, y1, x2, y2] list.
+        
+        Here it is a generator given to collect() instead, one row converted at a time:
+        under a memory budget the dicts go into the chunks of a ChunkedSequence as they are made.
 
         '''
-        ball_positions = [ {1:{"bbox" : x}} for x in df_ball_positions.to_numpy().tolist()]
+        ball_positions = ({1:{"bbox" : x.tolist()}} for x in df_ball_positions.to_numpy())
         
-        return ball_positions
-        
\ No newline at end of file
+        return collect(ball_positions, memory_budget)
+        
+
+class BallDetectionFilter:
+    '''
+    Rejects the ball detections that are too far from the last good one.
+    Works one frame at a time, so it is used both on a whole video (remove_wrong_detections)
+    and on a live stream.
+    '''
+    def __init__(self, maximum_allowed_distance=25):
+        self.maximum_allowed_distance = maximum_allowed_distance # Pixels per frame
+        # So if the ball det disappears for 3 frame we will have 25*3
+        self.last_good_frame_index = -1
+        self.last_good_box = None
+    
+    def update(self, frame_index, current_bbox):
+        '''
+        Returns True if the detection is kept, False if it is a wrong detection.
+        '''
+        # Handling the 1st detection of the ball
+        if self.last_good_frame_index == -1:
+            self._set_last_good(frame_index, current_bbox)
+            return True
+        
+        frame_gap = frame_index - self.last_good_frame_index
+        adjusted_max_distance = self.maximum_allowed_distance * frame_gap
+        
+        # Calculate the dist between the last good bbox and the current position
+        # using their (x,y), that's why we take the first 2 [:2] elements
+        if np.linalg.norm(np.array(self.last_good_box[:2]) - np.array(current_bbox[:2])) > adjusted_max_distance:
+            return False
+        
+        self._set_last_good(frame_index, current_bbox)
+        return True
+    
+    def _set_last_good(self, frame_index, bbox):
+        self.last_good_frame_index = frame_index
+        self.last_good_box = bbox
@@ -0,0 +1,271 @@
+import numpy as np
+import sys
+sys.path.append("../")
+from utils import profile_stage, collect
+
+
+'''
+Best ball trajectory of a whole video from the top-k ball candidates of every frame,
+instead of keeping the best box of each frame and filtering them greedily (BallDetectionFilter).
+
+A trajectory picks at most one candidate per frame. Its cost:
+    confidence -> -log(conf) of every picked candidate
+    motion -> (speed / max_speed)^2 between two consecutive picked candidates, impossible above max_speed
+    miss -> miss_cost for every frame without a picked candidate
+    restart -> restart_cost to pick a candidate with no motion link to the previous one
+               (first ball of the video, ball lost for more than max_gap_frames, teleport)
+
+              frame:   t-2     t-1      t
+    candidates:        ●a      ●c      ●e
+                       ●b      ●d      ●f
+                                        ^ best(t, e) = conf(e) + min over a, b, c, d (best + motion)
+                                                       or best "no ball" until t-1 + restart
+
+The best cost of every (frame, candidate) is computed frame after frame (Viterbi),
+each frame with one array operation over (max_gap_frames, k, k) links: O(T * k^2).
+The trajectory is then read backwards from the last frame.
+
+A lone false positive far from the ball costs two restarts, more than missing a frame,
+so it is skipped even with a high confidence; a weak candidate that continues the trajectory is kept.
+
+For streams, update() gives the decision of frame t - lag when frame t arrives (bounded-lag):
+the best trajectory until t is read backwards for lag frames only.
+'''
+
+
+class BallTrajectorySolver:
+    def __init__(self,
+                 num_candidates=5,
+                 max_speed=40,
+                 max_gap_frames=10,
+                 miss_cost=2.0,
+                 restart_cost=4.0,
+                 lag=12):
+
+        self.num_candidates = num_candidates # k
+        self.max_speed = max_speed # pixels per frame
+        self.max_gap_frames = max_gap_frames # longest jump over frames without a picked candidate
+        self.miss_cost = miss_cost # -log(0.135): weaker candidates are only picked if they continue the trajectory
+        self.restart_cost = restart_cost
+        self.lag = lag # frames of delay of update()
+
+        self.motion_weight = 1.0
+
+        self.reset()
+
+    def reset(self):
+        '''
+        Forgets the stream of update().
+        '''
+        self.frame_num = -1
+        self.last_no_ball_cost = 0.0
+        self.history = [] # last lag + max_gap_frames + 1 frames: (candidates, centers, costs, back_frames, back_indexes, no_ball_back)
+
+    def solve(self, ball_candidates):
+        '''
+        ball_candidates -> one (n, 5) array [x1, y1, x2, y2, conf] per frame (n can be 0)
+        Returns the index (in ball_candidates) of the picked candidate of every frame, -1 for no ball.
+        '''
+        with profile_stage("ball_trajectory_solver.solve", items=len(ball_candidates)):
+            num_frames = len(ball_candidates)
+            candidates = np.full((num_frames, self.num_candidates, 5), np.nan)
+            original_indexes = np.full((num_frames, self.num_candidates), -1, dtype=np.int64)
+            for frame_num, frame_candidates in enumerate(ball_candidates):
+                candidates[frame_num], best_first = self.get_candidate_array(frame_candidates)
+                original_indexes[frame_num, :len(best_first)] = best_first
+
+            centers = self._get_centers(candidates)
+
+            costs = np.full((num_frames, self.num_candidates), np.inf)
+            back_frames = np.full((num_frames, self.num_candidates), -1, dtype=np.int64)
+            back_indexes = np.full((num_frames, self.num_candidates), -1, dtype=np.int64)
+            no_ball_back = np.full(num_frames, -1, dtype=np.int64)
+
+            no_ball_cost = 0.0
+            for frame_num in range(num_frames):
+                first_frame = max(frame_num - self.max_gap_frames, 0)
+                costs[frame_num], back_frames[frame_num], back_indexes[frame_num], no_ball_cost, no_ball_back[frame_num] = self._forward_step(
+                    frame_num,
+                    candidates[frame_num],
+                    centers[frame_num],
+                    costs[first_frame:frame_num],
+                    centers[first_frame:frame_num],
+                    np.arange(first_frame, frame_num),
+                    no_ball_cost
+                )
+
+            picked_indexes = self._backtrack(num_frames - 1, 0, lambda frame_num: (back_frames[frame_num], back_indexes[frame_num], no_ball_back[frame_num]))
+
+            # Index among the k best -> index in the candidates of the frame
+            picked = picked_indexes != -1
+            picked_indexes[picked] = original_indexes[np.flatnonzero(picked), picked_indexes[picked]]
+            return picked_indexes
+
+    def get_ball_tracks(self, ball_candidates, memory_budget=None):
+        '''
+        solve() in the format of the ball tracks: [{1: {"bbox": [...]}} or {}, ...]
+        memory_budget -> MemoryBudget: the tracks are a ChunkedSequence, filled frame after frame
+        '''
+        picked_indexes = self.solve(ball_candidates)
+
+        return collect((
+            {1: {"bbox": [float(value) for value in np.asarray(frame_candidates)[picked_index, :4]]}} if picked_index != -1 else {}
+            for frame_candidates, picked_index in zip(ball_candidates, picked_indexes)
+        ), memory_budget)
+
+    def update(self, frame_candidates):
+        '''
+        Streaming: frame_candidates of the next frame, (n, 5) array [x1, y1, x2, y2, conf].
+        Returns (frame_num, bbox or None) for frame frame_num - lag, or None while less than lag frames came.
+        '''
+        self.frame_num += 1
+        candidates, _ = self.get_candidate_array(frame_candidates)
+        centers = self._get_centers(candidates)
+
+        previous = self.history[-self.max_gap_frames:] if self.max_gap_frames else []
+        if previous:
+            previous_costs = np.stack([frame[2] for frame in previous])
+            previous_centers = np.stack([frame[1] for frame in previous])
+        else:
+            previous_costs = np.empty((0, self.num_candidates))
+            previous_centers = np.empty((0, self.num_candidates, 2))
+        previous_frame_nums = np.arange(self.frame_num - len(previous), self.frame_num)
+
+        costs, back_frames, back_indexes, self.last_no_ball_cost, no_ball_back = self._forward_step(
+            self.frame_num, candidates, centers, previous_costs, previous_centers, previous_frame_nums, self.last_no_ball_cost
+        )
+
+        self.history.append((candidates, centers, costs, back_frames, back_indexes, no_ball_back))
+        self.history = self.history[-(self.lag + self.max_gap_frames + 1):]
+
+        decided_frame_num = self.frame_num - self.lag
+        if decided_frame_num < 0:
+            return None
+
+        return decided_frame_num, self._get_streaming_bbox(decided_frame_num)
+
+    def flush(self):
+        '''
+        End of the stream: [(frame_num, bbox or None), ...] of the last lag frames, not returned by update() yet.
+        '''
+        first_frame_num = max(self.frame_num - self.lag + 1, 0)
+        return [(frame_num, self._get_streaming_bbox(frame_num)) for frame_num in range(first_frame_num, self.frame_num + 1)]
+
+    def get_candidate_array(self, frame_candidates):
+        '''
+        Returns ((k, 5) array of the k best candidates with NaN rows when there are fewer,
+                 their indexes in frame_candidates).
+        '''
+        candidate_array = np.full((self.num_candidates, 5), np.nan)
+        frame_candidates = np.asarray(frame_candidates, dtype=np.float64).reshape(-1, 5)
+
+        best_first = np.argsort(-frame_candidates[:, 4], kind="stable")[:self.num_candidates]
+        candidate_array[:len(best_first)] = frame_candidates[best_first]
+
+        return candidate_array, best_first
+
+    def _get_centers(self, candidates):
+        return np.stack([
+            (candidates[..., 0] + candidates[..., 2]) / 2,
+            (candidates[..., 1] + candidates[..., 3]) / 2
+        ], axis=-1)
+
+    def _forward_step(self, frame_num, candidates, centers, previous_costs, previous_centers, previous_frame_nums, previous_no_ball_cost):
+        '''
+        Best cost of every candidate of a frame, from the best costs of the max_gap_frames frames before it.
+
+        previous_costs -> (g, k), previous_centers -> (g, k, 2), previous_frame_nums -> (g,)
+        previous_no_ball_cost -> best cost of a trajectory until the previous frame (with or without a ball at its end)
+
+        Returns (costs (k,), back_frames (k,), back_indexes (k,), no_ball_cost, no_ball_back):
+            back_frames/back_indexes -> frame and index of the previous picked candidate, -1 for a restart
+            no_ball_cost -> best cost of a trajectory until this frame
+            no_ball_back -> index of the candidate it ends with on this frame, -1 if there is no ball on this frame
+        '''
+        confidence_costs = -np.log(np.clip(candidates[:, 4], 1e-6, 1.0))
+        confidence_costs[np.isnan(confidence_costs)] = np.inf
+
+        # Restart, the same for every candidate
+        costs = previous_no_ball_cost + self.restart_cost + confidence_costs
+        back_frames = np.full(self.num_candidates, -1, dtype=np.int64)
+        back_indexes = np.full(self.num_candidates, -1, dtype=np.int64)
+
+        if len(previous_costs):
+            gaps = (frame_num - previous_frame_nums)[:, None, None] # (g, 1, 1)
+
+            # (g, k previous, k current) speeds of every link
+            distances = np.linalg.norm(centers[None, None, :, :] - previous_centers[:, :, None, :], axis=3)
+            speeds = distances / gaps
+
+            link_costs = self.motion_weight * (speeds / self.max_speed) ** 2 + self.miss_cost * (gaps - 1)
+            link_costs[~(speeds <= self.max_speed)] = np.inf # NaN (missing candidates) too
+            link_costs = link_costs + previous_costs[:, :, None]
+
+            # Best previous (frame, candidate) of every current candidate
+            flat_link_costs = link_costs.reshape(-1, self.num_candidates)
+            best_links = np.argmin(flat_link_costs, axis=0)
+            best_link_costs = flat_link_costs[best_links, np.arange(self.num_candidates)] + confidence_costs
+
+            linked = best_link_costs < costs
+            costs[linked] = best_link_costs[linked]
+            back_frames[linked] = previous_frame_nums[best_links[linked] // self.num_candidates]
+            back_indexes[linked] = best_links[linked] % self.num_candidates
+
+        no_ball_cost = previous_no_ball_cost + self.miss_cost
+        no_ball_back = -1
+        best_index = int(np.argmin(costs))
+        if costs[best_index] < no_ball_cost:
+            no_ball_cost = float(costs[best_index])
+            no_ball_back = best_index
+
+        return costs, back_frames, back_indexes, no_ball_cost, no_ball_back
+
+    def _backtrack(self, last_frame_num, first_frame_num, get_back_pointers):
+        '''
+        Reads the best trajectory backwards from the end of last_frame_num down to first_frame_num.
+        get_back_pointers(frame_num) -> (back_frames, back_indexes, no_ball_back) of that frame.
+        Returns the picked indexes of frames first_frame_num..last_frame_num.
+        '''
+        picked_indexes = np.full(last_frame_num - first_frame_num + 1, -1, dtype=np.int64)
+
+        frame_num = last_frame_num
+        candidate_index = get_back_pointers(frame_num)[2] if frame_num >= 0 else -1
+
+        while frame_num >= first_frame_num:
+            back_frames, back_indexes, no_ball_back = get_back_pointers(frame_num)
+
+            if candidate_index == -1:
+                # No ball on this frame: the best trajectory until the previous frame
+                frame_num -= 1
+                if frame_num >= first_frame_num:
+                    candidate_index = get_back_pointers(frame_num)[2]
+                continue
+
+            picked_indexes[frame_num - first_frame_num] = candidate_index
+            back_frame = back_frames[candidate_index]
+
+            if back_frame == -1:
+                # Restart: before it, the best trajectory until the previous frame
+                frame_num -= 1
+                if frame_num >= first_frame_num:
+                    candidate_index = get_back_pointers(frame_num)[2]
+            else:
+                # Jump to the previous picked candidate, the frames in between have no ball
+                candidate_index = back_indexes[candidate_index]
+                frame_num = back_frame
+
+        return picked_indexes
+
+    def _get_streaming_bbox(self, frame_num):
+        first_history_frame_num = self.frame_num - len(self.history) + 1
+
+        def get_back_pointers(history_frame_num):
+            _, _, _, back_frames, back_indexes, no_ball_back = self.history[history_frame_num - first_history_frame_num]
+            return back_frames, back_indexes, no_ball_back
+
+        picked_index = self._backtrack(self.frame_num, frame_num, get_back_pointers)[0]
+        if picked_index == -1:
+            return None
+
+        candidates = self.history[frame_num - first_history_frame_num][0]
+        return [float(value) for value in candidates[picked_index, :4]]
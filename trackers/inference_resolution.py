@@ -0,0 +1,188 @@
+import cv2
+import numpy as np
+
+
+class InferenceResolution:
+    '''
+    Chooses the resolution the frames are given to a detector at, and maps the boxes back to the frame.
+
+    mode:
+        "native" -> the frames are passed as they are (ultralytics letterboxes them to the model imgsz,
+                    model_imgsz = 640 by default), the behaviour of the trackers before these settings existed
+        "fixed" -> the frames are downscaled so that their long side is imgsz
+        "adaptive" -> the smallest of candidate_sizes at which the objects we look for are still
+                      at least min_object_size pixels (their short side), from the boxes detected so far.
+                      Falls back to "native" until something is detected, and when nothing is detected
+                      at a reduced resolution (the objects may have become too small).
+
+    Players are big: they can be detected at a much lower resolution than the ball.
+
+        frame 1280x720, players ~50px wide, min_object_size=16
+        -> scale 16/50 = 0.32 -> long side >= 410 -> imgsz 480 (candidate_sizes) -> boxes * 1280/480
+
+    The frames are never upscaled, and never run at model_imgsz or more: native already runs at model_imgsz,
+    a bigger imgsz would only be slower (e.g. fixed 960 on a 1080p video = native).
+    The sizes are rounded up to a multiple of the model stride (32): ultralytics would round them itself,
+    with a warning, and resize the frame a second time to the rounded size (e.g. fixed 500 -> 512).
+    The boxes are rescaled to the source frame before tracking,
+    so everything downstream (ByteTrack, possession, drawing) works in the frame coordinates as before.
+    '''
+    def __init__(self,
+                 mode="native",
+                 imgsz=None,
+                 candidate_sizes=(320, 480, 640),
+                 min_object_size=16,
+                 class_name=None,
+                 smoothing=0.5,
+                 model_imgsz=640,
+                 stride=32):
+
+        if mode not in ("native", "fixed", "adaptive"):
+            raise ValueError(f"Unknown inference resolution mode: {mode}")
+        if mode == "fixed" and imgsz is None:
+            raise ValueError("The fixed mode needs an imgsz")
+
+        self.mode = mode
+        self.imgsz = imgsz
+        self.candidate_sizes = sorted(candidate_sizes)
+        self.min_object_size = min_object_size
+        self.class_name = class_name # the objects whose size drives the adaptive mode, None = all
+        self.smoothing = smoothing
+        self.model_imgsz = model_imgsz # imgsz of the native predictions (the ultralytics default)
+        self.stride = stride # largest stride of the YOLO models, imgsz must be a multiple of it
+
+        self.reset()
+
+    @classmethod
+    def from_settings(cls, settings, class_name=None):
+        '''
+        settings -> None (native), an int (fixed imgsz) or a dict of the __init__ arguments,
+                    which is what the pipeline stages take as params
+        '''
+        if settings is None:
+            return cls(class_name=class_name)
+        if isinstance(settings, int):
+            return cls("fixed", imgsz=settings, class_name=class_name)
+
+        settings = dict(settings)
+        settings.setdefault("class_name", class_name)
+        return cls(**settings)
+
+    def reset(self):
+        # Short side of the objects in source pixels, smoothed over the batches
+        self.object_size = None
+
+    def get_imgsz(self, frame_shape):
+        '''
+        Long side the frame is resized to (a multiple of the stride), None to pass it as it is (native).
+        '''
+        # Native runs at the smallest of the two: a size from there up can't be faster
+        native_size = min(max(frame_shape[:2]), self.model_imgsz)
+
+        if self.mode == "native":
+            return None
+
+        if self.mode == "fixed":
+            imgsz = self.round_to_stride(self.imgsz)
+            return imgsz if imgsz < native_size else None
+
+        if self.object_size is None:
+            return None
+
+        required_size = max(frame_shape[:2]) * self.min_object_size / self.object_size
+        for candidate_size in self.candidate_sizes:
+            if candidate_size >= required_size:
+                candidate_size = self.round_to_stride(candidate_size)
+                return candidate_size if candidate_size < native_size else None
+
+        return None
+
+    def round_to_stride(self, size):
+        return int(-(-size // self.stride) * self.stride)
+
+    def resize(self, frame, imgsz=None):
+        '''
+        Returns (resized frame, scale) with scale = resized / source.
+        imgsz -> long side to use instead of the one of the settings (e.g. the live mode degradation levels)
+        '''
+        if imgsz is None:
+            imgsz = self.get_imgsz(frame.shape)
+        else:
+            imgsz = self.round_to_stride(imgsz)
+
+        source_size = max(frame.shape[:2])
+        if imgsz is None or imgsz >= source_size:
+            return frame, 1.0
+
+        scale = imgsz / source_size
+        height, width = frame.shape[:2]
+        # INTER_AREA: averages the pixels instead of skipping them, small objects survive the downscaling better
+        resized_frame = cv2.resize(frame, (round(width * scale), round(height * scale)), interpolation=cv2.INTER_AREA)
+
+        return resized_frame, scale
+
+    def predict(self, model, frames, imgsz=None, **kwargs):
+        '''
+        model.predict on the resized frames.
+        Returns a list of (detection, scale): the boxes of detection are in the resized frame,
+        rescale_detections brings them back to the source frame.
+        '''
+        if isinstance(frames, np.ndarray):
+            frames = [frames]
+
+        resized_frames = []
+        scales = []
+        for frame in frames:
+            resized_frame, scale = self.resize(frame, imgsz)
+            resized_frames.append(resized_frame)
+            scales.append(scale)
+
+        if scales[0] == 1.0 and imgsz is None:
+            detections = model.predict(resized_frames, imgsz=self.model_imgsz, **kwargs)
+        else:
+            # imgsz = long side of the resized frames (a multiple of the stride): the letterbox only pads the short side
+            detections = model.predict(resized_frames, imgsz=self.round_to_stride(max(resized_frames[0].shape[:2])), **kwargs)
+
+        for detection, scale in zip(detections, scales):
+            self.update(detection, scale)
+
+        return list(zip(detections, scales))
+
+    def update(self, detection, scale):
+        '''
+        Adaptive mode: updates the object size with the boxes of a detection.
+        '''
+        if self.mode != "adaptive":
+            return
+
+        boxes = detection.boxes
+        xyxy = boxes.xyxy.cpu().numpy() / scale
+
+        if self.class_name is not None and len(xyxy):
+            class_ids = boxes.cls.cpu().numpy().astype(int)
+            class_names = np.array([detection.names[class_id] for class_id in class_ids])
+            xyxy = xyxy[class_names == self.class_name]
+
+        if len(xyxy) == 0:
+            if scale < 1.0:
+                # Nothing at a reduced resolution: back to native until the objects are seen again
+                self.object_size = None
+            return
+
+        short_sides = np.minimum(xyxy[:, 2] - xyxy[:, 0], xyxy[:, 3] - xyxy[:, 1])
+        # The small objects are the ones that decide whether they are still detected
+        object_size = float(np.percentile(short_sides, 25))
+
+        if self.object_size is None:
+            self.object_size = object_size
+        else:
+            self.object_size = self.smoothing * object_size + (1 - self.smoothing) * self.object_size
+
+
+def rescale_detections(detection_supervision, scale):
+    '''
+    sv.Detections of a resized frame -> same detections in the source frame (in place)
+    '''
+    if scale != 1.0 and len(detection_supervision) > 0:
+        detection_supervision.xyxy = detection_supervision.xyxy / scale
+    return detection_supervision
@@ -1,58 +1,93 @@
-from ultralytics import YOLO
 import supervision as sv
 import sys
 sys.path.append("../") #go back 1 directory
-from utils import read_stub, save_stub
+from utils import read_stub, save_stub, profile_stage, collect
+from .inference_resolution import InferenceResolution, rescale_detections
 
 
 
 class PlayerTracker:
-    def __init__(self, model_path):
+    def __init__(self, model_path, inference_resolution=None):
+        # Imported here: the filtering / interpolation methods (and the benchmarks) don't need ultralytics
+        from ultralytics import YOLO
         self.model = YOLO(model_path)
+        # None = frames as they are, see InferenceResolution.from_settings for the other settings
+        self.inference_resolution = InferenceResolution.from_settings(inference_resolution, class_name="Player")
         self.tracker = sv.ByteTrack()
+    
+    def reset_tracker(self):
+        # ByteTrack keeps the tracks of the previous frames: 
+        # it must start from scratch when the same PlayerTracker is used on a new video
+        self.tracker = sv.ByteTrack()
+        # The object sizes of the adaptive resolution are the ones of the previous video too
+        self.inference_resolution.reset()
         
     def detect_frames(self, frames):
+        '''
+        Yields (detection, scale) of every frame, batch after batch.
+        
+        Every ultralytics Results keeps a copy of its full size frame (orig_img): they are turned into tracks
+        as they come, so only the Results of one batch are alive at a time, not the ones of the whole video.
+        '''
         batch_size = 20
-        detections = []
         
         for i in range(0, len(frames), batch_size):
             batch_frames = frames[i:i+batch_size]
-            batch_detections = self.model.predict(batch_frames, conf=0.5)
-            detections+=batch_detections
-        return detections
+            with profile_stage("player_detector.predict", items=len(batch_frames)):
+                batch_detections = self.inference_resolution.predict(self.model, batch_frames, conf=0.5)
+            yield from batch_detections
     
-    def get_object_tracks(self, frames, read_from_stub = False, stub_path=None):
-        
+    def get_object_tracks(self, frames, read_from_stub = False, stub_path=None, memory_budget=None):
+        '''
+        memory_budget -> MemoryBudget: the tracks are a ChunkedSequence, filled while the frames are detected
+        '''
         tracks = read_stub(read_from_stub, stub_path)
         if tracks is not None:
             if len(tracks) == len(frames):
                 return tracks
         
-        detections = self.detect_frames(frames)
-        tracks = []
+        tracks = collect(
+            (self.get_tracks_from_detection(detection, scale) for detection, scale in self.detect_frames(frames)),
+            memory_budget
+        )
         
-        for frame_num, detection in enumerate(detections):
-            #Dictionary -> 0:person, 1:bicycle, 2:car
-            cls_names = detection.names
-            
-            #Inverted Dictionary -> person:0, bicycle:1, car:2 
-            cls_names_inv = {v:k for k,v in cls_names.items()}
-            
-            detection_supervision = sv.Detections.from_ultralytics(detection)
+        save_stub(stub_path, tracks)
+        
+        return tracks
+    
+    def get_frame_tracks(self, frame, imgsz=None):
+        '''
+        Detection + tracking of a single frame, for when the frames arrive one at a time (live mode).
+        imgsz -> inference resolution, None to use the inference_resolution settings
+        '''
+        with profile_stage("player_detector.predict"):
+            detection, scale = self.inference_resolution.predict(self.model, frame, imgsz, conf=0.5, verbose=False)[0]
+        
+        return self.get_tracks_from_detection(detection, scale)
+    
+    def get_tracks_from_detection(self, detection, scale=1.0):
+        #Dictionary -> 0:person, 1:bicycle, 2:car
+        cls_names = detection.names
+        
+        #Inverted Dictionary -> person:0, bicycle:1, car:2 
+        cls_names_inv = {v:k for k,v in cls_names.items()}
+        
+        detection_supervision = sv.Detections.from_ultralytics(detection)
+        # Back to the coordinates of the source frame when it was resized for the inference
+        detection_supervision = rescale_detections(detection_supervision, scale)
+        with profile_stage("bytetrack.update"):
             detection_with_tracks = self.tracker.update_with_detections(detection_supervision)
+        
+        frame_tracks = {}
+        
+        for frame_detection in detection_with_tracks:
+            bbox = frame_detection[0].tolist()
+            cls_id = frame_detection[3]
+            track_id = frame_detection[4]
             
-            tracks.append({})
-            
-            for frame_detection in detection_with_tracks:
-                bbox = frame_detection[0].tolist()
-                cls_id = frame_detection[3]
-                track_id = frame_detection[4]
-                
-                if cls_id == cls_names_inv["Player"]:
-                    tracks[frame_num][track_id] = {"bbox":bbox}
+            if cls_id == cls_names_inv["Player"]:
+                frame_tracks[track_id] = {"bbox":bbox}
         
-        save_stub(stub_path, tracks)
+        return frame_tracks
         
-        return tracks
         
-        
\ No newline at end of file
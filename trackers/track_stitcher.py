@@ -0,0 +1,309 @@
+import cv2
+import numpy as np
+from scipy.optimize import linear_sum_assignment
+from scipy.sparse import coo_matrix
+from scipy.sparse.csgraph import connected_components
+import sys
+sys.path.append("../")
+from utils import profile_stage, get_foot_positions, get_heights, collect
+
+
+class TrackStitcher:
+    '''
+    Joins the fragments of the same player that ByteTrack split into several track_ids (occlusions, missed detections).
+
+    Every track_id is a fragment with a first and a last frame. A fragment that ends can continue
+    into a fragment that starts a few frames later:
+
+        track 4:  ████████████            (ends at frame 120)
+        track 17:                ████████ (starts at frame 124) -> becomes track 4
+
+    Only the pairs where the new fragment starts 1 to max_gap_frames frames after the end can be linked:
+    they are found by sorting the fragments by first frame, and the costs are computed for them only,
+    at once, as arrays over the pairs (a full game has thousands of fragments, a dense matrix of every
+    pair would take GBs):
+        motion -> distance between where the ending fragment would be (last position + velocity * gap)
+                  and where the new one starts, in bbox heights (same meaning near and far from the camera)
+        size -> difference of the bbox heights (log ratio)
+        appearance -> Bhattacharyya distance of the shirt color histograms (HSV, upper half of the bbox)
+        gap -> frames in between, shorter gaps are more likely
+
+    Impossible pairs (too far away) get an infinite cost and linear_sum_assignment picks the cheapest set
+    of links: every fragment continues into at most one other. The pairs form small independent blocks
+    (fragments that end and start around the same time): each block is solved on its own, with the
+    same result as one assignment over the whole video.
+    Chains (4 -> 17 -> 31) are followed, so every fragment takes the id of the first one.
+
+    Fewer ids means fewer CLIP calls in the TeamAssigner (one per new id) and possession streaks that
+    don't restart after an occlusion.
+    '''
+    def __init__(self,
+                 max_gap_frames=30,
+                 max_distance=0.6,
+                 max_distance_per_frame=0.08,
+                 max_cost=1.5,
+                 num_endpoint_frames=5):
+
+        self.max_gap_frames = max_gap_frames
+        self.max_distance = max_distance # bbox heights, at a gap of 0
+        self.max_distance_per_frame = max_distance_per_frame # bbox heights, allowed on top per frame of gap
+        self.max_cost = max_cost # links more expensive than this are not made
+        self.num_endpoint_frames = num_endpoint_frames # frames used for the velocity and the appearance of an endpoint
+
+        self.motion_weight = 1.0
+        self.size_weight = 1.0
+        self.appearance_weight = 0.5 # the teams wear the same shirt: appearance mostly separates the teams, motion the players
+        self.gap_weight = 0.3
+
+        self.histogram_bins = (8, 4) # hue, saturation
+
+    def stitch(self, player_tracks, video_frames=None, memory_budget=None):
+        '''
+        player_tracks -> [{track_id: {"bbox": [...]}}, ...]
+        video_frames -> for the appearance, None to stitch with the motion and the size only
+        memory_budget -> MemoryBudget: the stitched tracks are a ChunkedSequence, filled frame after frame
+
+        Returns (stitched tracks, {old track_id: new track_id} for the ids that changed).
+        '''
+        with profile_stage("track_stitcher.stitch", items=len(player_tracks), memory=True):
+            id_mapping = self.get_id_mapping(player_tracks, video_frames)
+            return self.rewrite_ids(player_tracks, id_mapping, memory_budget), id_mapping
+
+    def get_id_mapping(self, player_tracks, video_frames=None):
+        fragments = self.get_fragments(player_tracks)
+        if len(fragments["track_ids"]) < 2:
+            return {}
+
+        ending_indexes, starting_indexes = self.get_candidate_pairs(fragments)
+        costs = self.get_pair_costs(fragments, ending_indexes, starting_indexes, player_tracks, video_frames)
+
+        possible = np.isfinite(costs)
+        ending_indexes, starting_indexes, costs = self.solve_assignment(
+            ending_indexes[possible], starting_indexes[possible], costs[possible], len(fragments["track_ids"])
+        )
+
+        accepted = costs <= self.max_cost
+        track_ids = fragments["track_ids"]
+
+        # next fragment of each fragment
+        links = {
+            track_ids[ending_index]: track_ids[starting_index]
+            for ending_index, starting_index in zip(ending_indexes[accepted], starting_indexes[accepted])
+        }
+
+        # Follow the chains from their first fragment: 4 -> 17 -> 31 gives {17: 4, 31: 4}
+        id_mapping = {}
+        linked_ids = set(links.values())
+        for track_id in track_ids:
+            if track_id in linked_ids or track_id not in links:
+                continue
+
+            next_id = links[track_id]
+            while next_id is not None:
+                id_mapping[next_id] = track_id
+                next_id = links.get(next_id)
+
+        return id_mapping
+
+    def get_fragments(self, player_tracks):
+        '''
+        First/last frame, bbox, and velocity (pixels per frame) at both ends of every track_id, as arrays.
+        '''
+        frame_nums_per_id = {}
+        for frame_num, frame_tracks in enumerate(player_tracks):
+            for track_id in frame_tracks:
+                frame_nums_per_id.setdefault(track_id, []).append(frame_num)
+
+        track_ids = sorted(frame_nums_per_id)
+        num_fragments = len(track_ids)
+
+        fragments = {
+            "track_ids": track_ids,
+            "first_frame": np.zeros(num_fragments, dtype=np.int64),
+            "last_frame": np.zeros(num_fragments, dtype=np.int64),
+            "first_bbox": np.zeros((num_fragments, 4)),
+            "last_bbox": np.zeros((num_fragments, 4)),
+            "start_velocity": np.zeros((num_fragments, 2)),
+            "end_velocity": np.zeros((num_fragments, 2)),
+            "start_frames": [],
+            "end_frames": []
+        }
+
+        for index, track_id in enumerate(track_ids):
+            frame_nums = frame_nums_per_id[track_id]
+            start_frames = frame_nums[:self.num_endpoint_frames]
+            end_frames = frame_nums[-self.num_endpoint_frames:]
+
+            fragments["first_frame"][index] = frame_nums[0]
+            fragments["last_frame"][index] = frame_nums[-1]
+            fragments["first_bbox"][index] = player_tracks[frame_nums[0]][track_id]["bbox"]
+            fragments["last_bbox"][index] = player_tracks[frame_nums[-1]][track_id]["bbox"]
+            fragments["start_velocity"][index] = self._get_velocity(player_tracks, track_id, start_frames)
+            fragments["end_velocity"][index] = self._get_velocity(player_tracks, track_id, end_frames)
+            fragments["start_frames"].append(start_frames)
+            fragments["end_frames"].append(end_frames)
+
+        return fragments
+
+    def get_candidate_pairs(self, fragments):
+        '''
+        (ending indexes, starting indexes) of the pairs where the starting fragment begins
+        1 to max_gap_frames frames after the end of the ending one.
+
+            first frames, sorted:  3  40  118  121  124  150  260
+            fragment ending at 120 ─────────────[121  124  150] -> 3 pairs (gap 1, 4, 30)
+
+        About (number of fragments * fragments starting in max_gap_frames) pairs instead of every pair.
+        '''
+        by_first_frame = np.argsort(fragments["first_frame"], kind="stable")
+        sorted_first_frames = fragments["first_frame"][by_first_frame]
+
+        # Window [last + 1, last + max_gap_frames] of every ending fragment in the sorted first frames
+        window_starts = np.searchsorted(sorted_first_frames, fragments["last_frame"] + 1, side="left")
+        window_ends = np.searchsorted(sorted_first_frames, fragments["last_frame"] + self.max_gap_frames, side="right")
+        counts = window_ends - window_starts
+
+        ending_indexes = np.repeat(np.arange(len(counts)), counts)
+        # Position of every pair in the window of its ending fragment
+        offsets = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+        starting_indexes = by_first_frame[np.repeat(window_starts, counts) + offsets]
+
+        return ending_indexes, starting_indexes
+
+    def get_pair_costs(self, fragments, ending_indexes, starting_indexes, player_tracks, video_frames=None):
+        '''
+        Cost of every (ending fragment, starting fragment) pair, inf when they are too far away.
+        '''
+        gap = fragments["first_frame"][starting_indexes] - fragments["last_frame"][ending_indexes]
+
+        last_bbox = fragments["last_bbox"][ending_indexes]
+        first_bbox = fragments["first_bbox"][starting_indexes]
+
+        # Feet positions, where the ending fragment should be at the first frame of the starting one
+        last_feet = get_foot_positions(last_bbox)
+        first_feet = get_foot_positions(first_bbox)
+        predicted_feet = last_feet + fragments["end_velocity"][ending_indexes] * gap[:, None]
+
+        last_height = np.maximum(get_heights(last_bbox), 1)
+        first_height = np.maximum(get_heights(first_bbox), 1)
+        mean_height = (last_height + first_height) / 2
+
+        distance = np.linalg.norm(predicted_feet - first_feet, axis=1) / mean_height
+        max_distance = self.max_distance + self.max_distance_per_frame * gap
+        possible = distance <= max_distance
+
+        cost = (
+            self.motion_weight * distance / np.maximum(max_distance, 1e-9) +
+            self.size_weight * np.abs(np.log(first_height / last_height)) +
+            self.gap_weight * gap / self.max_gap_frames
+        )
+
+        if video_frames is not None and possible.any():
+            # Only the crops of the fragments in a possible pair are looked at
+            ending_fragments, ending_rows = np.unique(ending_indexes[possible], return_inverse=True)
+            starting_fragments, starting_rows = np.unique(starting_indexes[possible], return_inverse=True)
+
+            end_histograms = self._get_histograms(video_frames, player_tracks,
+                                                  [fragments["track_ids"][index] for index in ending_fragments],
+                                                  [fragments["end_frames"][index] for index in ending_fragments])
+            start_histograms = self._get_histograms(video_frames, player_tracks,
+                                                    [fragments["track_ids"][index] for index in starting_fragments],
+                                                    [fragments["start_frames"][index] for index in starting_fragments])
+
+            # Bhattacharyya distance of every pair: the coefficient is sum(sqrt(p * q))
+            bhattacharyya_coefficient = np.sum(np.sqrt(end_histograms[ending_rows]) * np.sqrt(start_histograms[starting_rows]), axis=1)
+            cost[possible] += self.appearance_weight * np.sqrt(np.clip(1 - bhattacharyya_coefficient, 0, 1))
+
+        return np.where(possible, cost, np.inf)
+
+    def solve_assignment(self, ending_indexes, starting_indexes, costs, num_fragments):
+        '''
+        Cheapest set of links among the possible pairs, every fragment ending and starting at most once.
+        Returns the (ending indexes, starting indexes, costs) of the chosen pairs.
+
+        The pairs are the edges of a bipartite graph (ending fragments | starting fragments).
+        Each connected block gets its own small linear_sum_assignment, the pairs of a block never
+        compete with the ones of another block.
+        '''
+        if len(costs) == 0:
+            return ending_indexes, starting_indexes, costs
+
+        # Nodes 0..n-1: fragments as ending, n..2n-1: fragments as starting
+        graph = coo_matrix((np.ones(len(costs)), (ending_indexes, starting_indexes + num_fragments)),
+                           shape=(2 * num_fragments, 2 * num_fragments))
+        _, labels = connected_components(graph, directed=False)
+
+        pair_blocks = labels[ending_indexes]
+        order = np.argsort(pair_blocks, kind="stable")
+        block_starts = np.flatnonzero(np.r_[True, pair_blocks[order][1:] != pair_blocks[order][:-1]])
+        block_ends = np.r_[block_starts[1:], len(order)]
+
+        chosen = []
+        for block_start, block_end in zip(block_starts, block_ends):
+            pairs = order[block_start:block_end]
+            block_endings, ending_rows = np.unique(ending_indexes[pairs], return_inverse=True)
+            block_startings, starting_columns = np.unique(starting_indexes[pairs], return_inverse=True)
+
+            # linear_sum_assignment needs finite values: the pairs that aren't possible get a cost that is never accepted
+            block_costs = np.full((len(block_endings), len(block_startings)), self.max_cost * 10 + 1)
+            block_costs[ending_rows, starting_columns] = costs[pairs]
+            pair_indexes = np.full(block_costs.shape, -1)
+            pair_indexes[ending_rows, starting_columns] = pairs
+
+            rows, columns = linear_sum_assignment(block_costs)
+            block_chosen = pair_indexes[rows, columns]
+            chosen.append(block_chosen[block_chosen != -1])
+
+        chosen = np.concatenate(chosen)
+        return ending_indexes[chosen], starting_indexes[chosen], costs[chosen]
+
+    def rewrite_ids(self, player_tracks, id_mapping, memory_budget=None):
+        if not id_mapping:
+            return player_tracks
+
+        return collect((
+            {id_mapping.get(track_id, track_id): track for track_id, track in frame_tracks.items()}
+            for frame_tracks in player_tracks
+        ), memory_budget)
+
+    def _get_velocity(self, player_tracks, track_id, frame_nums):
+        if len(frame_nums) < 2:
+            return np.zeros(2)
+
+        first_feet, last_feet = get_foot_positions([
+            player_tracks[frame_nums[0]][track_id]["bbox"],
+            player_tracks[frame_nums[-1]][track_id]["bbox"]
+        ])
+
+        return (last_feet - first_feet) / (frame_nums[-1] - frame_nums[0])
+
+    def _get_histograms(self, video_frames, player_tracks, track_ids, frame_nums_per_fragment):
+        '''
+        Normalized hue/saturation histogram of the shirt (upper half of the bbox) of every fragment,
+        averaged over its endpoint frames. Only the few endpoint crops are looked at.
+        '''
+        histograms = np.zeros((len(track_ids), self.histogram_bins[0] * self.histogram_bins[1]), dtype=np.float32)
+
+        for index, (track_id, frame_nums) in enumerate(zip(track_ids, frame_nums_per_fragment)):
+            for frame_num in frame_nums:
+                frame = video_frames[frame_num]
+                x1, y1, x2, y2 = player_tracks[frame_num][track_id]["bbox"]
+
+                x1 = min(max(int(x1), 0), frame.shape[1])
+                x2 = min(max(int(x2), 0), frame.shape[1])
+                y1 = min(max(int(y1), 0), frame.shape[0])
+                y_middle = min(max(int((y1 + y2) / 2), 0), frame.shape[0])
+
+                crop = frame[y1:y_middle, x1:x2]
+                if crop.size == 0:
+                    continue
+
+                hsv_crop = cv2.cvtColor(crop, cv2.COLOR_BGR2HSV)
+                histogram = cv2.calcHist([hsv_crop], [0, 1], None, list(self.histogram_bins), [0, 180, 0, 256])
+                histograms[index] += histogram.reshape(-1)
+
+        # Fragments without any usable crop get a flat histogram (neutral appearance)
+        totals = histograms.sum(axis=1, keepdims=True)
+        histograms = np.where(totals > 0, histograms / np.maximum(totals, 1e-9), 1 / histograms.shape[1])
+
+        return histograms
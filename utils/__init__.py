@@ -1,3 +1,33 @@
-from .video_utils import read_video, save_video
+from .video_utils import (
+    read_video,
+    iter_video,
+    read_video_lazy,
+    count_video_frames,
+    get_video_frame_size,
+    create_video_writer,
+    save_video
+)
 from .stub_utils import save_stub, read_stub
-from .bbox_utils import get_bbox_width, get_center_of_bbox, measure_distance
\ No newline at end of file
+from .bbox_utils import (
+    get_bbox_width,
+    get_center_of_bbox,
+    measure_distance,
+    as_boxes,
+    as_points,
+    get_centers,
+    get_foot_positions,
+    get_widths,
+    get_heights,
+    get_areas,
+    get_intersection_matrix,
+    get_iou_matrix,
+    get_containment_matrix,
+    get_paired_containment,
+    get_distance_matrix,
+    get_point_box_distance_matrix,
+    get_paired_point_box_distance,
+    get_box_distance_matrix
+)
+from .profiler import profiler, profile_stage, enable_profiling
+from .frame_store import SharedFrameStore, FrameStoreHandle
+from .chunked_sequence import ChunkedSequence, MemoryBudget, collect
@@ -1,12 +1,240 @@
+import numpy as np
+
+
+'''
+Box geometry on whole arrays: boxes are (N, 4) arrays [x1, y1, x2, y2], points are (N, 2) arrays [x, y].
+
+    get_centers, get_foot_positions, get_widths, get_heights, get_areas -> one value (or point) per box
+    get_iou_matrix(a, b) -> (len(a), len(b)) intersection over union
+    get_containment_matrix(inner, outer) -> (len(inner), len(outer)) fraction of each inner box inside each outer box
+    get_distance_matrix(points_a, points_b) -> (len(a), len(b)) point to point distances
+    get_point_box_distance_matrix(points, boxes) -> (len(points), len(boxes)) distance to the box (0 inside,
+                                                    or to its border with to_boundary=True)
+    get_box_distance_matrix(a, b) -> (len(a), len(b)) gap between the boxes, 0 when they overlap
+    get_paired_containment, get_paired_point_box_distance -> the same for aligned rows (box i with box i),
+                                                             to do many small groups in one call
+
+Every function takes:
+    dtype -> np.float64 by default, np.float32 halves the memory and is faster on big matrices
+    out -> an array of the result shape and dtype to write into, so the same buffer can be reused
+           frame after frame instead of allocating a new matrix every time
+
+The scalar helpers at the end (get_center_of_bbox, get_bbox_width, measure_distance) are the same
+computations on a single box or pair of points.
+'''
+
+
+def as_boxes(bboxes, dtype=np.float64):
+    '''
+    List of [x1, y1, x2, y2] (or an array) -> (N, 4) array, no copy when it already is one of this dtype.
+    '''
+    return np.asarray(bboxes, dtype=dtype).reshape(-1, 4)
+
+
+def as_points(points, dtype=np.float64):
+    return np.asarray(points, dtype=dtype).reshape(-1, 2)
+
+
+def _get_out(out, shape, dtype):
+    if out is None:
+        return np.empty(shape, dtype=dtype)
+    if out.shape != shape:
+        raise ValueError(f"out has the shape {out.shape}, {shape} expected")
+    return out
+
+
+def get_centers(bboxes, dtype=np.float64, out=None):
+    boxes = as_boxes(bboxes, dtype)
+    out = _get_out(out, (len(boxes), 2), dtype)
+
+    np.add(boxes[:, 0], boxes[:, 2], out=out[:, 0])
+    np.add(boxes[:, 1], boxes[:, 3], out=out[:, 1])
+    out *= 0.5
+    return out
+
+
+def get_foot_positions(bboxes, dtype=np.float64, out=None):
+    '''
+    Bottom center of the boxes: where a player touches the floor.
+    '''
+    boxes = as_boxes(bboxes, dtype)
+    out = _get_out(out, (len(boxes), 2), dtype)
+
+    np.add(boxes[:, 0], boxes[:, 2], out=out[:, 0])
+    out[:, 0] *= 0.5
+    out[:, 1] = boxes[:, 3]
+    return out
+
+
+def get_widths(bboxes, dtype=np.float64, out=None):
+    boxes = as_boxes(bboxes, dtype)
+    return np.subtract(boxes[:, 2], boxes[:, 0], out=_get_out(out, (len(boxes),), dtype))
+
+
+def get_heights(bboxes, dtype=np.float64, out=None):
+    boxes = as_boxes(bboxes, dtype)
+    return np.subtract(boxes[:, 3], boxes[:, 1], out=_get_out(out, (len(boxes),), dtype))
+
+
+def get_areas(bboxes, dtype=np.float64, out=None):
+    boxes = as_boxes(bboxes, dtype)
+    out = get_widths(boxes, dtype, out)
+    out *= boxes[:, 3] - boxes[:, 1]
+    return out
+
+
+def _get_intersection(boxes_a, boxes_b, out):
+    '''
+    Area of the intersection of boxes_a[..., :] and boxes_b[..., :], broadcast together into out.
+    '''
+    # Width of the intersection in out, its height in a temporary
+    np.minimum(boxes_a[..., 2], boxes_b[..., 2], out=out)
+    out -= np.maximum(boxes_a[..., 0], boxes_b[..., 0])
+    np.clip(out, 0, None, out=out)
+
+    heights = np.minimum(boxes_a[..., 3], boxes_b[..., 3])
+    heights -= np.maximum(boxes_a[..., 1], boxes_b[..., 1])
+    np.clip(heights, 0, None, out=heights)
+
+    out *= heights
+    return out
+
+
+def _get_containment(inner_boxes, outer_boxes, inner_areas, out):
+    out = _get_intersection(inner_boxes, outer_boxes, out)
+
+    has_area = np.broadcast_to(inner_areas > 0, out.shape)
+    np.divide(out, inner_areas, out=out, where=has_area)
+    out[~has_area] = 0
+    return out
+
+
+def _get_point_box_distance(points, boxes, to_boundary, out):
+    # Gap on each axis, 0 when the point is inside the range of the box on that axis
+    dx = np.maximum(boxes[..., 0] - points[..., 0], points[..., 0] - boxes[..., 2])
+    dy = np.maximum(boxes[..., 1] - points[..., 1], points[..., 1] - boxes[..., 3])
+    np.clip(dx, 0, None, out=dx)
+    np.clip(dy, 0, None, out=dy)
+    np.hypot(dx, dy, out=out)
+
+    if to_boundary:
+        # Inside: closest of the 4 borders
+        depth = np.minimum(
+            np.minimum(points[..., 0] - boxes[..., 0], boxes[..., 2] - points[..., 0]),
+            np.minimum(points[..., 1] - boxes[..., 1], boxes[..., 3] - points[..., 1])
+        )
+        inside = depth > 0
+        out[inside] = depth[inside]
+
+    return out
+
+
+def get_intersection_matrix(bboxes_a, bboxes_b, dtype=np.float64, out=None):
+    '''
+    (len(a), len(b)) area of the intersection of every pair of boxes.
+    '''
+    boxes_a = as_boxes(bboxes_a, dtype)
+    boxes_b = as_boxes(bboxes_b, dtype)
+    out = _get_out(out, (len(boxes_a), len(boxes_b)), dtype)
+    return _get_intersection(boxes_a[:, None, :], boxes_b[None, :, :], out)
+
+
+def get_iou_matrix(bboxes_a, bboxes_b, dtype=np.float64, out=None):
+    boxes_a = as_boxes(bboxes_a, dtype)
+    boxes_b = as_boxes(bboxes_b, dtype)
+    out = get_intersection_matrix(boxes_a, boxes_b, dtype, out)
+
+    union = get_areas(boxes_a, dtype)[:, None] + get_areas(boxes_b, dtype)[None, :]
+    union -= out
+    np.maximum(union, 1e-9, out=union)
+
+    out /= union
+    return out
+
+
+def get_containment_matrix(inner_bboxes, outer_bboxes, dtype=np.float64, out=None):
+    '''
+    area(inner ∩ outer) / area(inner) of every pair, e.g. how much of the ball is inside each player.
+    0 for the inner boxes without area.
+    '''
+    inner_boxes = as_boxes(inner_bboxes, dtype)
+    outer_boxes = as_boxes(outer_bboxes, dtype)
+    out = _get_out(out, (len(inner_boxes), len(outer_boxes)), dtype)
+    return _get_containment(inner_boxes[:, None, :], outer_boxes[None, :, :], get_areas(inner_boxes, dtype)[:, None], out)
+
+
+def get_paired_containment(inner_bboxes, outer_bboxes, dtype=np.float64, out=None):
+    '''
+    Same as get_containment_matrix for aligned rows: inner_bboxes[i] in outer_bboxes[i], (N,) result.
+    For many small groups at once (e.g. the ball and the players of every frame of a video).
+    '''
+    inner_boxes = as_boxes(inner_bboxes, dtype)
+    outer_boxes = as_boxes(outer_bboxes, dtype)
+    out = _get_out(out, (len(inner_boxes),), dtype)
+    return _get_containment(inner_boxes, outer_boxes, get_areas(inner_boxes, dtype), out)
+
+
+def get_distance_matrix(points_a, points_b, dtype=np.float64, out=None):
+    points_a = as_points(points_a, dtype)
+    points_b = as_points(points_b, dtype)
+    out = _get_out(out, (len(points_a), len(points_b)), dtype)
+
+    np.subtract(points_a[:, None, 0], points_b[None, :, 0], out=out)
+    dy = points_a[:, None, 1] - points_b[None, :, 1]
+    return np.hypot(out, dy, out=out)
+
+
+def get_point_box_distance_matrix(points, bboxes, to_boundary=False, dtype=np.float64, out=None):
+    '''
+    Distance from every point to the closest point of every box.
+
+    to_boundary -> False: 0 for the points inside the box
+                   True: distance to the border of the box for those points too (how deep inside it is)
+
+        ●────┐                  ┌─────────┐
+        d    │                  │   ●─d─> │  (to_boundary)
+             └─────────┐        │         │
+             │  box    │        └─────────┘
+             └─────────┘
+    '''
+    points = as_points(points, dtype)
+    boxes = as_boxes(bboxes, dtype)
+    out = _get_out(out, (len(points), len(boxes)), dtype)
+    return _get_point_box_distance(points[:, None, :], boxes[None, :, :], to_boundary, out)
+
+
+def get_paired_point_box_distance(points, bboxes, to_boundary=False, dtype=np.float64, out=None):
+    '''
+    Same as get_point_box_distance_matrix for aligned rows: points[i] to bboxes[i], (N,) result.
+    '''
+    points = as_points(points, dtype)
+    boxes = as_boxes(bboxes, dtype)
+    out = _get_out(out, (len(points),), dtype)
+    return _get_point_box_distance(points, boxes, to_boundary, out)
+
+
+def get_box_distance_matrix(bboxes_a, bboxes_b, dtype=np.float64, out=None):
+    '''
+    Shortest distance between the borders of every pair of boxes, 0 when they overlap or touch.
+    '''
+    boxes_a = as_boxes(bboxes_a, dtype)
+    boxes_b = as_boxes(bboxes_b, dtype)
+    out = _get_out(out, (len(boxes_a), len(boxes_b)), dtype)
+
+    dx = np.maximum(boxes_b[None, :, 0] - boxes_a[:, None, 2], boxes_a[:, None, 0] - boxes_b[None, :, 2])
+    dy = np.maximum(boxes_b[None, :, 1] - boxes_a[:, None, 3], boxes_a[:, None, 1] - boxes_b[None, :, 3])
+    np.clip(dx, 0, None, out=dx)
+    np.clip(dy, 0, None, out=dy)
+    return np.hypot(dx, dy, out=out)
+
+
 def get_center_of_bbox(bbox):
-    x1,y1,x2,y2 = bbox
-    
-    return int((x1+x2)/2), int((y1+y2)/2)
+    x, y = get_centers(bbox)[0]
+
+    return int(x), int(y)
 
 def get_bbox_width(bbox):
-    x1,y1,x2,y2 = bbox
-    return int(x2-x1)
+    return int(get_widths(bbox)[0])
 
 def measure_distance(p1,p2):
-    return ((p1[0]-p2[0])**2 + (p1[1]-p2[1])**2)**0.5
-
+    return float(get_distance_matrix(p1[:2], p2[:2])[0, 0])
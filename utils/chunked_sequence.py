@@ -0,0 +1,328 @@
+import os
+import pickle
+import shutil
+import sys
+import tempfile
+import threading
+import weakref
+from collections import OrderedDict
+from collections.abc import Sequence
+import numpy as np
+
+
+'''
+Per-frame values (tracks, assignments, frames...) of a whole video without holding all of them in memory.
+
+A ChunkedSequence is a read-only list cut in chunks of chunk_size items:
+
+    index:    0 ... 255 | 256 ... 511 | 512 ... 767 | 768 ... 899
+    chunk:        0     |      1      |      2      |      3
+    where:     memory   |    disk     |   memory    |  not computed yet
+
+Indexing, slicing or iterating loads the chunks it needs:
+    in memory -> used as is
+    spilled -> read back from its file in the spill directory
+    never stored -> computed with compute_chunk(start, end) (e.g. decoded from the video, see read_video_lazy)
+
+The chunks in memory of every sequence sharing a MemoryBudget are kept in least recently used order.
+When they take more than max_bytes the oldest ones leave memory: written to disk the first time
+(chunks that can be computed again are just dropped), and read back when an index needs them.
+
+The budget only keeps weak references to the sequences: a sequence nobody uses anymore is freed
+right away, its chunks leave the accounting and its spill files are deleted (never written for nothing).
+
+The items are never modified in place (the outputs of a stage are read-only for the next stages),
+so a chunk is written to disk only once.
+
+Pickling a ChunkedSequence (e.g. in the pipeline cache) streams the items chunk by chunk
+and unpickles them as a plain list.
+
+The per-frame results are built with collect(): a generator of per-frame values goes into the chunks
+while it runs, so the whole-video list never exists, not even for a moment.
+'''
+
+
+def collect(items, budget=None):
+    '''
+    The items of an iterable (e.g. a generator of per-frame tracks):
+    a list without budget, a ChunkedSequence filled chunk by chunk under the MemoryBudget otherwise.
+    '''
+    if budget is None:
+        return list(items)
+    return ChunkedSequence.from_iterable(items, budget=budget)
+
+
+def get_num_bytes(value):
+    '''
+    Approximate memory of a value: numpy arrays, and the lists / dicts / tuples of the tracks.
+    '''
+    if isinstance(value, np.ndarray):
+        return value.nbytes
+    if isinstance(value, dict):
+        return sys.getsizeof(value) + sum(get_num_bytes(key) + get_num_bytes(item) for key, item in value.items())
+    if isinstance(value, (list, tuple)):
+        return sys.getsizeof(value) + sum(get_num_bytes(item) for item in value)
+    return sys.getsizeof(value)
+
+
+class MemoryBudget:
+    def __init__(self, max_bytes, spill_dir=None, chunk_size=256, frame_chunk_size=32):
+        '''
+        max_bytes -> memory of the chunks in memory, all the sequences of the budget together
+        spill_dir -> where the cold chunks are written, a temporary directory (deleted by close()) by default
+        chunk_size -> items per chunk of the tracks, assignments... (a few KB per frame)
+        frame_chunk_size -> frames per chunk of the video frames (~6MB per 1080p frame)
+        '''
+        self.max_bytes = max_bytes
+        self.chunk_size = chunk_size
+        self.frame_chunk_size = frame_chunk_size
+
+        self.spill_dir = spill_dir
+        self._own_spill_dir = spill_dir is None
+
+        # One lock for the accounting of every sequence of the budget
+        self.lock = threading.RLock()
+        self.resident = OrderedDict() # (sequence id, chunk index) -> (weak reference to the sequence, num_bytes), oldest first
+        self.resident_bytes = 0
+        self.spilled_bytes = 0
+
+        self._next_sequence_id = 0
+
+    def get_sequence_id(self):
+        with self.lock:
+            self._next_sequence_id += 1
+            return self._next_sequence_id
+
+    def get_spill_path(self, sequence_id, chunk_index):
+        with self.lock:
+            if self.spill_dir is None:
+                self.spill_dir = tempfile.mkdtemp(prefix="basket_spill_")
+            os.makedirs(self.spill_dir, exist_ok=True)
+        return os.path.join(self.spill_dir, f"{sequence_id}_{chunk_index}.pkl")
+
+    def touch(self, sequence, chunk_index):
+        '''
+        The chunk was just used: most recently used. Called with self.lock held.
+        '''
+        key = (sequence.sequence_id, chunk_index)
+        if key in self.resident:
+            self.resident.move_to_end(key)
+
+    def add(self, sequence, chunk_index, num_bytes):
+        '''
+        A chunk came into memory, the oldest ones leave until the budget is respected
+        (never the one just added). Called with self.lock held.
+        '''
+        self.resident[(sequence.sequence_id, chunk_index)] = (weakref.ref(sequence), num_bytes)
+        self.resident_bytes += num_bytes
+
+        while self.resident_bytes > self.max_bytes and len(self.resident) > 1:
+            (_, victim_index), (victim_reference, victim_bytes) = self.resident.popitem(last=False)
+            self.resident_bytes -= victim_bytes
+            victim_sequence = victim_reference()
+            if victim_sequence is not None:
+                victim_sequence._evict(victim_index)
+
+    def remove(self, sequence, chunk_index):
+        self.remove_chunks(sequence.sequence_id, [chunk_index])
+
+    def remove_chunks(self, sequence_id, chunk_indexes):
+        with self.lock:
+            for chunk_index in chunk_indexes:
+                resident = self.resident.pop((sequence_id, chunk_index), None)
+                if resident is not None:
+                    self.resident_bytes -= resident[1]
+
+    def close(self):
+        '''
+        Deletes the spill directory when it is a temporary one.
+        '''
+        with self.lock:
+            if self._own_spill_dir and self.spill_dir is not None:
+                shutil.rmtree(self.spill_dir, ignore_errors=True)
+                self.spill_dir = None
+
+
+def _release_sequence(budget, sequence_id, spill_paths, spill_files):
+    '''
+    When a sequence is closed or freed: its chunks leave the budget and its spill files are deleted.
+    Only gets what the sequence owns, not the sequence itself (it would never be freed otherwise).
+    '''
+    if budget is not None:
+        budget.remove_chunks(sequence_id, range(len(spill_paths)))
+
+    for path in spill_files:
+        if os.path.exists(path):
+            os.remove(path)
+
+
+class ChunkedSequence(Sequence):
+    def __init__(self, num_items, chunk_size=256, budget=None, compute_chunk=None):
+        '''
+        num_items -> length of the sequence
+        budget -> MemoryBudget shared with other sequences, None to keep every chunk in memory
+        compute_chunk -> function (start, end) -> list of the items [start, end), for the chunks
+                         that are computed on demand instead of being stored (None: every chunk is stored)
+        '''
+        self.num_items = num_items
+        self.chunk_size = chunk_size
+        self.budget = budget
+        self.compute_chunk = compute_chunk
+        self.sequence_id = budget.get_sequence_id() if budget is not None else id(self)
+
+        num_chunks = -(-num_items // chunk_size)
+        self.chunks = [None] * num_chunks # the chunks in memory, None for the others
+        self.spill_paths = [None] * num_chunks # file of the chunks written to disk
+
+        # Only one thread loads a given chunk, the others wait for it
+        self.load_lock = threading.Lock()
+
+        # The chunks leave the budget and the spill files are deleted with the sequence
+        self._spill_files = []
+        self._finalizer = weakref.finalize(self, _release_sequence, budget, self.sequence_id, self.spill_paths, self._spill_files)
+
+    @classmethod
+    def from_iterable(cls, items, chunk_size=None, budget=None):
+        '''
+        Chunks the items while they come: a generator is never held in memory as a whole.
+        '''
+        if chunk_size is None:
+            chunk_size = budget.chunk_size if budget is not None else 256
+
+        sequence = cls(0, chunk_size, budget)
+        chunk = []
+        for item in items:
+            chunk.append(item)
+            if len(chunk) == chunk_size:
+                sequence._append_chunk(chunk)
+                chunk = []
+        if chunk:
+            sequence._append_chunk(chunk)
+
+        return sequence
+
+    def __len__(self):
+        return self.num_items
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            start, stop, step = index.indices(self.num_items)
+            if step != 1:
+                return [self[item_index] for item_index in range(start, stop, step)]
+            return self.get_range(start, stop)
+
+        if index < 0:
+            index += self.num_items
+        if not 0 <= index < self.num_items:
+            raise IndexError("ChunkedSequence index out of range")
+
+        return self.get_chunk(index // self.chunk_size)[index % self.chunk_size]
+
+    def __iter__(self):
+        for chunk_index in range(len(self.chunks)):
+            yield from self.get_chunk(chunk_index)
+
+    def __reduce__(self):
+        # Unpickled as a list, pickled one chunk at a time
+        return (list, (), None, iter(self))
+
+    def get_range(self, start, stop):
+        '''
+        List of the items [start, stop).
+        '''
+        items = []
+        if stop <= start:
+            return items
+
+        for chunk_index in range(start // self.chunk_size, (stop - 1) // self.chunk_size + 1):
+            chunk_start = chunk_index * self.chunk_size
+            chunk = self.get_chunk(chunk_index)
+            items.extend(chunk[max(start - chunk_start, 0):stop - chunk_start])
+        return items
+
+    def get_chunk(self, chunk_index):
+        '''
+        The items of a chunk (a list, not to be modified), loaded or computed if needed.
+        '''
+        chunk = self._get_resident_chunk(chunk_index)
+        if chunk is not None:
+            return chunk
+
+        with self.load_lock:
+            # Loaded by another thread in the meantime
+            chunk = self._get_resident_chunk(chunk_index)
+            if chunk is not None:
+                return chunk
+
+            start = chunk_index * self.chunk_size
+            end = min(start + self.chunk_size, self.num_items)
+            spill_path = self.spill_paths[chunk_index]
+
+            if spill_path is not None:
+                with open(spill_path, "rb") as f:
+                    chunk = pickle.load(f)
+            elif self.compute_chunk is not None:
+                chunk = list(self.compute_chunk(start, end))
+                if len(chunk) != end - start:
+                    raise RuntimeError(f"compute_chunk({start}, {end}) returned {len(chunk)} items")
+            else:
+                raise RuntimeError(f"Chunk {chunk_index} is neither in memory nor on disk")
+
+            self._install_chunk(chunk_index, chunk)
+            return chunk
+
+    def to_list(self):
+        return list(self)
+
+    def close(self):
+        '''
+        Frees the chunks and deletes the spill files.
+        '''
+        self._finalizer()
+        for chunk_index in range(len(self.chunks)):
+            self.chunks[chunk_index] = None
+
+    def _get_resident_chunk(self, chunk_index):
+        if self.budget is None:
+            return self.chunks[chunk_index]
+
+        with self.budget.lock:
+            chunk = self.chunks[chunk_index]
+            if chunk is not None:
+                self.budget.touch(self, chunk_index)
+            return chunk
+
+    def _install_chunk(self, chunk_index, chunk):
+        if self.budget is None:
+            self.chunks[chunk_index] = chunk
+            return
+
+        num_bytes = get_num_bytes(chunk)
+        with self.budget.lock:
+            self.chunks[chunk_index] = chunk
+            self.budget.add(self, chunk_index, num_bytes)
+
+    def _append_chunk(self, chunk):
+        chunk_index = len(self.chunks)
+        self.chunks.append(None)
+        self.spill_paths.append(None)
+        self.num_items += len(chunk)
+        self._install_chunk(chunk_index, chunk)
+
+    def _evict(self, chunk_index):
+        '''
+        The chunk leaves memory. Called by the budget, with its lock held.
+        '''
+        chunk = self.chunks[chunk_index]
+        if chunk is None:
+            return
+
+        if self.spill_paths[chunk_index] is None and self.compute_chunk is None:
+            spill_path = self.budget.get_spill_path(self.sequence_id, chunk_index)
+            with open(spill_path, "wb") as f:
+                pickle.dump(chunk, f, protocol=pickle.HIGHEST_PROTOCOL)
+            self.spill_paths[chunk_index] = spill_path
+            self._spill_files.append(spill_path)
+            self.budget.spilled_bytes += os.path.getsize(spill_path)
+
+        self.chunks[chunk_index] = None
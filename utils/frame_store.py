@@ -0,0 +1,232 @@
+import multiprocessing
+import os
+import time
+from multiprocessing import shared_memory
+import numpy as np
+
+
+'''
+Frames shared between processes without pickling them: a fixed-shape uint8 ring buffer in
+shared memory (or in a memory-mapped file), with the frame number and a reference count per slot.
+
+    header:   frame_nums [num_slots] int64   (-1 = free)
+              refcounts  [num_slots] int64
+    frames:   [num_slots, height, width, 3] uint8
+
+        slot:        0     1     2     3
+        frame_num:  120   121   118    -1
+        refcount:    2     1     0     0      <- slots 2 and 3 can be reused
+
+The process that creates the store put()s the frames, with a refcount = number of consumers.
+Workers attach() with the handle (a few names and numbers, cheap to pickle), get() the frame as a
+numpy view on the shared buffer (no copy) and release() it when done: a slot is only reused once
+its refcount is back to 0, put() waits for one otherwise.
+
+A 1080p frame is ~6MB: pickling it to a worker and the result back costs more than drawing on it.
+With the store only the frame number travels between the processes.
+
+Its only user is the FrameRenderer in process mode. The detection and the team assignment
+crops stay in the main process: the detectors batch the frames for the GPU, and the crop
+preprocessing (cv2.resize) releases the GIL, so they gain nothing from worker processes.
+'''
+
+
+class FrameStoreHandle:
+    '''
+    What a worker needs to attach to a store: picklable, to pass to a process pool initializer.
+    The condition can only be passed when the worker process is created (initializer / Process args).
+    '''
+    def __init__(self, backend, name, num_slots, frame_shape, condition):
+        self.backend = backend
+        self.name = name # shared memory name, or file path for "memmap"
+        self.num_slots = num_slots
+        self.frame_shape = tuple(frame_shape)
+        self.condition = condition
+
+
+class SharedFrameStore:
+    HEADER_ALIGNMENT = 64
+
+    def __init__(self, handle, buffer, owner, shared_memory_block=None):
+        self.handle = handle
+        self.num_slots = handle.num_slots
+        self.frame_shape = handle.frame_shape
+        self.condition = handle.condition
+        self.owner = owner # only the owner unlinks the memory
+
+        self._shared_memory = shared_memory_block
+        self._buffer = buffer
+
+        header_size = self.get_header_size(self.num_slots)
+        self.frame_nums = np.ndarray((self.num_slots,), dtype=np.int64, buffer=buffer, offset=0)
+        self.refcounts = np.ndarray((self.num_slots,), dtype=np.int64, buffer=buffer, offset=8 * self.num_slots)
+        self.frames = np.ndarray((self.num_slots,) + self.frame_shape, dtype=np.uint8, buffer=buffer, offset=header_size)
+
+        self.next_slot = 0 # where the owner looks for a free slot first (ring order)
+
+    @classmethod
+    def get_header_size(cls, num_slots):
+        size = 2 * 8 * num_slots
+        return (size + cls.HEADER_ALIGNMENT - 1) // cls.HEADER_ALIGNMENT * cls.HEADER_ALIGNMENT
+
+    @classmethod
+    def get_size(cls, num_slots, frame_shape):
+        return cls.get_header_size(num_slots) + num_slots * int(np.prod(frame_shape))
+
+    @classmethod
+    def create(cls, num_slots, frame_shape, backend="shared_memory", path=None, mp_context=None):
+        '''
+        num_slots -> frames that can be in the store at the same time (frames in flight)
+        frame_shape -> (height, width, 3)
+        backend -> "shared_memory" (RAM, /dev/shm) or "memmap" (file at path, for frames that don't fit in RAM)
+        mp_context -> multiprocessing context of the workers, for the condition
+        '''
+        mp_context = mp_context or multiprocessing.get_context()
+        condition = mp_context.Condition(mp_context.Lock())
+        size = cls.get_size(num_slots, frame_shape)
+
+        if backend == "shared_memory":
+            shared_memory_block = shared_memory.SharedMemory(create=True, size=size)
+            handle = FrameStoreHandle(backend, shared_memory_block.name, num_slots, frame_shape, condition)
+            store = cls(handle, shared_memory_block.buf, owner=True, shared_memory_block=shared_memory_block)
+        elif backend == "memmap":
+            if path is None:
+                raise ValueError("The memmap backend needs a path")
+            if os.path.dirname(path):
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+            buffer = np.memmap(path, dtype=np.uint8, mode="w+", shape=(size,))
+            handle = FrameStoreHandle(backend, path, num_slots, frame_shape, condition)
+            store = cls(handle, buffer, owner=True)
+        else:
+            raise ValueError(f"Unknown frame store backend: {backend}")
+
+        store.frame_nums[:] = -1
+        store.refcounts[:] = 0
+        return store
+
+    @classmethod
+    def attach(cls, handle):
+        '''
+        In a worker: the same store, on the same memory.
+        '''
+        if handle.backend == "shared_memory":
+            # The workers are children of the owner: they share its resource tracker,
+            # the block is only unlinked by the owner's close()
+            shared_memory_block = shared_memory.SharedMemory(name=handle.name)
+            return cls(handle, shared_memory_block.buf, owner=False, shared_memory_block=shared_memory_block)
+
+        buffer = np.memmap(handle.name, dtype=np.uint8, mode="r+", shape=(cls.get_size(handle.num_slots, handle.frame_shape),))
+        return cls(handle, buffer, owner=False)
+
+    def put(self, frame_num, frame, refcount=1, timeout=None):
+        '''
+        Copies the frame in a free slot (waits for one) with refcount references.
+        Returns the slot.
+        '''
+        if frame.shape != self.frame_shape:
+            raise ValueError(f"Frame of shape {frame.shape}, the store holds {self.frame_shape}")
+
+        deadline = None if timeout is None else time.monotonic() + timeout
+
+        with self.condition:
+            while True:
+                slot = self._find_free_slot()
+                if slot is not None:
+                    break
+
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    raise TimeoutError("No free slot in the frame store")
+                self.condition.wait(remaining)
+
+            # Reserved before the copy: the slot can't be taken while it is written
+            self.frame_nums[slot] = -1
+            self.refcounts[slot] = refcount
+
+        self.frames[slot] = frame
+
+        with self.condition:
+            self.frame_nums[slot] = frame_num
+
+        self.next_slot = (slot + 1) % self.num_slots
+        return slot
+
+    def get(self, frame_num):
+        '''
+        View on the frame in the shared buffer (no copy), None if it is not in the store.
+        Writing on it writes on the shared frame (e.g. drawing in place).
+        '''
+        slot = self.find_slot(frame_num)
+        return None if slot is None else self.frames[slot]
+
+    def find_slot(self, frame_num):
+        slots = np.flatnonzero(self.frame_nums == frame_num)
+        return int(slots[0]) if len(slots) else None
+
+    def acquire(self, frame_num):
+        '''
+        One more reference to a frame already in the store (one more consumer).
+        '''
+        with self.condition:
+            slot = self._get_slot(frame_num)
+            self.refcounts[slot] += 1
+
+    def release(self, frame_num):
+        '''
+        A consumer is done with the frame, its slot is free once every consumer released it.
+        '''
+        with self.condition:
+            slot = self._get_slot(frame_num)
+            if self.refcounts[slot] <= 0:
+                raise ValueError(f"Frame {frame_num} released more times than acquired")
+
+            self.refcounts[slot] -= 1
+            if self.refcounts[slot] == 0:
+                self.frame_nums[slot] = -1
+                self.condition.notify_all()
+
+    def num_free_slots(self):
+        with self.condition:
+            return int(np.sum(self.refcounts == 0))
+
+    def close(self):
+        '''
+        Detaches this process, and frees the memory (or deletes the file) when called by the owner.
+        '''
+        # The numpy views must be gone before the shared memory can be closed
+        self.frame_nums = self.refcounts = self.frames = None
+
+        if self._shared_memory is not None:
+            self._buffer = None
+            try:
+                self._shared_memory.close()
+            except BufferError:
+                # A frame from get() is still referenced somewhere: the memory stays mapped until it is gone
+                pass
+            if self.owner:
+                self._shared_memory.unlink()
+            self._shared_memory = None
+        elif self._buffer is not None:
+            # The file is unmapped when the last view on it is gone
+            self._buffer = None
+            if self.owner and os.path.exists(self.handle.name):
+                os.remove(self.handle.name)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def _find_free_slot(self):
+        for offset in range(self.num_slots):
+            slot = (self.next_slot + offset) % self.num_slots
+            if self.refcounts[slot] == 0:
+                return slot
+        return None
+
+    def _get_slot(self, frame_num):
+        slot = self.find_slot(frame_num)
+        if slot is None:
+            raise KeyError(f"Frame {frame_num} is not in the frame store")
+        return slot
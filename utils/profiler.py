@@ -0,0 +1,260 @@
+import json
+import os
+import threading
+import time
+import numpy as np
+
+try:
+    import resource # Unix only, used for the peak RSS
+except ImportError:
+    resource = None
+
+
+'''
+Per-stage profiler.
+
+    with profile_stage("detect_ball_possession", items=len(ball_tracks)):
+        ...
+
+records wall time, CPU time (of the calling thread) and number of items (frames, crops...) for every call.
+Spans can be nested (e.g. a pipeline stage and every model forward pass inside it).
+
+    with profile_stage("stage.track_players", memory=True):
+        ...
+
+also records the RSS of the process when the span ends, its difference with the start
+(how much memory the stage left allocated, e.g. the frames it kept) and the peak RSS during the span
+(what the stage needed at its worst, e.g. a whole-video list built then dropped).
+
+The peak is measured by a sampling thread: while at least one memory span is open it reads the RSS
+every rss_sample_interval seconds (10ms, a small file read) and raises the peak of every open span.
+It stops when the last memory span closes. A spike shorter than the interval can be missed.
+
+The RSS is process wide, so with stages running in parallel the values include the other threads.
+Reading it costs a small file read, so only the coarse spans (pipeline stages, whole video reads...)
+ask for it, not the per-frame ones.
+
+Turned on with the BASKET_PROFILE=1 environment variable or enable_profiling().
+When it is off, profile_stage returns always the same do-nothing object: the cost is one function call.
+
+Exports:
+    - Chrome trace (open in chrome://tracing or https://ui.perfetto.dev)
+    - JSON summary per stage with total times, items, p50/p95/p99 latency per item and RSS at the end / delta / peak
+    (plus the peak RSS of the whole process)
+'''
+
+
+class _Span:
+    def __init__(self, profiler, name, items, memory):
+        self.profiler = profiler
+        self.name = name
+        self.items = items # can be set inside the with block when it is known only at the end
+        self.memory = memory
+
+    def __enter__(self):
+        self.start_rss_mb = get_rss_mb() if self.memory else None
+        self.peak_rss_mb = self.start_rss_mb # raised by the RSS sampler while the span is open
+        if self.start_rss_mb is not None:
+            self.profiler.rss_sampler.add(self)
+        self.start_time = time.perf_counter()
+        self.start_cpu_time = time.thread_time()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        end_time = time.perf_counter()
+        end_cpu_time = time.thread_time()
+        end_rss_mb = get_rss_mb() if self.memory else None
+        if self.start_rss_mb is not None:
+            self.profiler.rss_sampler.remove(self)
+        peak_rss_mb = max(self.peak_rss_mb, end_rss_mb) if end_rss_mb is not None and self.peak_rss_mb is not None else None
+
+        self.profiler.records.append({
+            "name": self.name,
+            "start": self.start_time,
+            "wall": end_time - self.start_time,
+            "cpu": end_cpu_time - self.start_cpu_time,
+            "items": self.items,
+            "thread_id": threading.get_ident(),
+            "rss_mb": end_rss_mb,
+            "rss_delta_mb": end_rss_mb - self.start_rss_mb if end_rss_mb is not None and self.start_rss_mb is not None else None,
+            "peak_rss_mb": peak_rss_mb
+        })
+        return False
+
+
+class _RSSSampler:
+    '''
+    Background thread raising the peak_rss_mb of the open memory spans, only running while there are some.
+    '''
+    def __init__(self, interval):
+        self.interval = interval
+        self.lock = threading.Lock()
+        self.spans = set()
+        self.thread = None
+
+    def add(self, span):
+        with self.lock:
+            self.spans.add(span)
+            if self.thread is None:
+                self.thread = threading.Thread(target=self._run, name="rss_sampler", daemon=True)
+                self.thread.start()
+
+    def remove(self, span):
+        with self.lock:
+            self.spans.discard(span)
+
+    def _run(self):
+        while True:
+            rss_mb = get_rss_mb()
+            with self.lock:
+                if not self.spans:
+                    self.thread = None
+                    return
+                if rss_mb is not None:
+                    for span in self.spans:
+                        span.peak_rss_mb = max(span.peak_rss_mb, rss_mb)
+            time.sleep(self.interval)
+
+
+class _NullSpan:
+    '''
+    Returned when profiling is off. Setting items on it is allowed and ignored.
+    '''
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        return False
+
+    def __setattr__(self, name, value):
+        pass
+
+
+_null_span = _NullSpan()
+
+
+_page_size = os.sysconf("SC_PAGE_SIZE") if hasattr(os, "sysconf") else 4096
+
+
+def get_rss_mb():
+    '''
+    Current RSS of the process (Linux only, None elsewhere).
+    '''
+    try:
+        with open("/proc/self/statm") as f:
+            resident_pages = int(f.read().split()[1])
+    except (OSError, IndexError, ValueError):
+        return None
+    return resident_pages * _page_size / (1024 * 1024)
+
+
+def get_peak_rss_mb():
+    '''
+    Highest RSS of the process since it started.
+    '''
+    if resource is None:
+        return None
+    # ru_maxrss is in KB on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+class Profiler:
+    def __init__(self, enabled=False, rss_sample_interval=0.01):
+        self.enabled = enabled
+        self.records = []
+        self.origin_time = time.perf_counter()
+        self.rss_sampler = _RSSSampler(rss_sample_interval)
+
+    def profile_stage(self, name, items=1, memory=False):
+        if not self.enabled:
+            return _null_span
+        return _Span(self, name, items, memory)
+
+    def reset(self):
+        self.records = []
+        self.origin_time = time.perf_counter()
+
+    def get_summary(self):
+        '''
+        {stage name: {calls, wall_s, cpu_s, items, p50_ms, p95_ms, p99_ms, max_rss_mb, max_rss_delta_mb, peak_rss_mb}}
+        The percentiles are over the latency per item of every call (wall / items),
+        i.e. the per-frame latency for the stages that process frames.
+        The RSS values are None for the spans recorded without memory=True.
+        '''
+        records_per_name = {}
+        for record in self.records:
+            records_per_name.setdefault(record["name"], []).append(record)
+
+        summary = {}
+        for name, records in records_per_name.items():
+            wall = np.array([record["wall"] for record in records])
+            items = np.array([max(record["items"], 1) for record in records])
+            latency_per_item_ms = wall / items * 1000
+            rss = [record["rss_mb"] for record in records if record["rss_mb"] is not None]
+            rss_delta = [record["rss_delta_mb"] for record in records if record["rss_delta_mb"] is not None]
+            peak_rss = [record["peak_rss_mb"] for record in records if record["peak_rss_mb"] is not None]
+
+            summary[name] = {
+                "calls": len(records),
+                "wall_s": float(wall.sum()),
+                "cpu_s": float(sum(record["cpu"] for record in records)),
+                "items": int(sum(record["items"] for record in records)),
+                "p50_ms": float(np.percentile(latency_per_item_ms, 50)),
+                "p95_ms": float(np.percentile(latency_per_item_ms, 95)),
+                "p99_ms": float(np.percentile(latency_per_item_ms, 99)),
+                "max_rss_mb": max(rss) if rss else None,
+                "max_rss_delta_mb": max(rss_delta) if rss_delta else None,
+                "peak_rss_mb": max(peak_rss) if peak_rss else None # highest RSS during any call
+            }
+
+        return summary
+
+    def export_summary(self, output_path):
+        self._make_dirs(output_path)
+        with open(output_path, "w") as f:
+            json.dump({"stages": self.get_summary(), "peak_rss_mb": get_peak_rss_mb()}, f, indent=2)
+
+    def export_chrome_trace(self, output_path):
+        '''
+        Chrome trace event format: one complete ("X") event per call, times in microseconds.
+        '''
+        pid = os.getpid()
+        events = []
+
+        for record in self.records:
+            events.append({
+                "name": record["name"],
+                "cat": "stage",
+                "ph": "X",
+                "ts": (record["start"] - self.origin_time) * 1e6,
+                "dur": record["wall"] * 1e6,
+                "pid": pid,
+                "tid": record["thread_id"],
+                "args": {
+                    "items": record["items"],
+                    "cpu_ms": record["cpu"] * 1000,
+                    "rss_mb": record["rss_mb"],
+                    "rss_delta_mb": record["rss_delta_mb"],
+                    "peak_rss_mb": record["peak_rss_mb"]
+                }
+            })
+
+        self._make_dirs(output_path)
+        with open(output_path, "w") as f:
+            json.dump({"traceEvents": events, "displayTimeUnit": "ms"}, f)
+
+    def _make_dirs(self, output_path):
+        output_dir = os.path.dirname(output_path)
+        if output_dir and not os.path.exists(output_dir):
+            os.makedirs(output_dir)
+
+
+profiler = Profiler(enabled=os.environ.get("BASKET_PROFILE", "0") not in ("", "0"))
+
+
+def profile_stage(name, items=1, memory=False):
+    return profiler.profile_stage(name, items, memory)
+
+
+def enable_profiling(enabled=True):
+    profiler.enabled = enabled
@@ -1,27 +1,131 @@
 import cv2
 import os
+import threading
+from .profiler import profile_stage
+from .chunked_sequence import ChunkedSequence
 
 def read_video(video_path):
-    cap = cv2.VideoCapture(video_path)
-    frames = []
-    
-    while True:
-        ret, frame = cap.read()
+    with profile_stage("read_video", memory=True) as span:
+        cap = cv2.VideoCapture(video_path)
+        frames = []
         
-        if not ret:
-            break
+        while True:
+            ret, frame = cap.read()
+            
+            if not ret:
+                break
+            
+            frames.append(frame)
         
-        frames.append(frame)
+        span.items = len(frames)
         
     return frames
 
-def save_video(output_video_frames, output_video_path):
-    if not os.path.exists(os.path.dirname(output_video_path)):
-        os.mkdir(os.path.dirname(output_video_path))
+def iter_video(video_path):
+    '''
+    Same as read_video but yields the frames one at a time instead of loading the whole video.
+    '''
+    cap = cv2.VideoCapture(video_path)
+    
+    try:
+        while True:
+            ret, frame = cap.read()
+            
+            if not ret:
+                break
+            
+            yield frame
+    finally:
+        cap.release()
+
+def count_video_frames(video_path):
+    '''
+    Number of frames, counted by grabbing them (no decoding): CAP_PROP_FRAME_COUNT is only an estimate for many files.
+    '''
+    cap = cv2.VideoCapture(video_path)
+    num_frames = 0
+    
+    try:
+        while cap.grab():
+            num_frames += 1
+    finally:
+        cap.release()
+    
+    return num_frames
+
+class VideoChunkReader:
+    '''
+    Decodes the frames [start, end) of a video, for the chunks of read_video_lazy.
+    
+    One VideoCapture for the whole video: the chunks are mostly read in order,
+    it only seeks when the chunk asked is not the next one.
+    '''
+    def __init__(self, video_path):
+        self.video_path = video_path
+        self.cap = None
+        self.next_frame_num = 0
+        self.lock = threading.Lock()
+    
+    def read(self, start, end):
+        with self.lock, profile_stage("read_video_chunk", items=end - start):
+            if self.cap is None:
+                self.cap = cv2.VideoCapture(self.video_path)
+                self.next_frame_num = 0
+            
+            if start != self.next_frame_num:
+                self.cap.set(cv2.CAP_PROP_POS_FRAMES, start)
+            
+            frames = []
+            for _ in range(start, end):
+                ret, frame = self.cap.read()
+                if not ret:
+                    break
+                frames.append(frame)
+            
+            self.next_frame_num = start + len(frames)
+            return frames
+    
+    def close(self):
+        with self.lock:
+            if self.cap is not None:
+                self.cap.release()
+                self.cap = None
+
+def read_video_lazy(video_path, budget=None, chunk_size=None):
+    '''
+    Same frames as read_video, but decoded chunk by chunk when they are indexed:
+    the chunks in memory are limited by the MemoryBudget, the others are decoded again when needed
+    (never written to disk, decoding is cheaper than reading raw frames back).
+    '''
+    if chunk_size is None:
+        chunk_size = budget.frame_chunk_size if budget is not None else 32
+    
+    video_chunk_reader = VideoChunkReader(video_path)
+    return ChunkedSequence(count_video_frames(video_path), chunk_size, budget, compute_chunk=video_chunk_reader.read)
+
+def get_video_frame_size(video_path):
+    '''
+    (width, height) of the frames, without decoding them.
+    '''
+    cap = cv2.VideoCapture(video_path)
+    
+    try:
+        return int(cap.get(cv2.CAP_PROP_FRAME_WIDTH)), int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+    finally:
+        cap.release()
+
+def create_video_writer(output_video_path, frame_size, fps=24):
+    output_dir = os.path.dirname(output_video_path)
+    if output_dir and not os.path.exists(output_dir):
+        os.makedirs(output_dir)
     
     fourcc = cv2.VideoWriter_fourcc(*'XVID')
     # It takes as input a video path, the video type, the frames per second and the output video size (w,h)
-    out = cv2.VideoWriter(output_video_path, fourcc, 24, (output_video_frames[0].shape[1], output_video_frames[0].shape[0]))
-    for frame in output_video_frames:
-        out.write(frame)
-    out.release()  
\ No newline at end of file
+    return cv2.VideoWriter(output_video_path, fourcc, fps, frame_size)
+
+def save_video(output_video_frames, output_video_path):
+    with profile_stage("save_video", items=len(output_video_frames), memory=True):
+        out = create_video_writer(output_video_path, (output_video_frames[0].shape[1], output_video_frames[0].shape[0]))
+        for frame in output_video_frames:
+            out.write(frame)
+        out.release()  
@@ -0,0 +1,33 @@
+import argparse
+from pipeline import PipelineRunner, build_basketball_stages
+from viewer import AnnotatedVideo, serve
+
+
+
+def main():
+    
+    parser = argparse.ArgumentParser(description="Annotated frames and clips rendered on demand from the cached analysis")
+    parser.add_argument("video_path", nargs="?", default="input_videos/video_1.mp4")
+    parser.add_argument("--cache-dir", default="stubs/pipeline", help="pipeline cache of main.py")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--cache-size", type=int, default=48, help="rendered frames kept in memory")
+    parser.add_argument("--draw-team-ball-control", action="store_true")
+    args = parser.parse_args()
+    
+    # Same stages as main.py: the tracks, team assignment and possession come from its cache
+    # (they are computed, and cached, the first time if main.py was never run on this video)
+    stages, resources = build_basketball_stages(
+        player_track_stub_path="stubs/player_track_stubs.pkl",
+        ball_track_stub_path="stubs/ball_track_stubs.pkl",
+        player_assignment_stub_path="stubs/player_assignment_stub.pkl"
+    )
+    runner = PipelineRunner(stages, cache_dir=args.cache_dir, resources=resources)
+    runner.set_params("render", draw_team_ball_control=args.draw_team_ball_control)
+    
+    annotated_video = AnnotatedVideo.from_pipeline(args.video_path, runner, args.cache_size)
+    serve(annotated_video, port=args.port)
+    
+
+
+if __name__ == "__main__":
+    main()
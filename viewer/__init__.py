@@ -0,0 +1,2 @@
+from .annotated_video import AnnotatedVideo
+from .http_server import create_server, serve
@@ -0,0 +1,172 @@
+from collections import OrderedDict
+import os
+import tempfile
+import threading
+import cv2
+import sys
+sys.path.append("../")
+from utils import create_video_writer, profile_stage
+
+
+class AnnotatedVideo:
+    '''
+    Annotated frames of a video, rendered only when asked for.
+    
+    Instead of storing a full annotated copy of every game, the source video is kept with the (small)
+    cached tracks, team assignment and possession: a frame is read from the source, the overlays are
+    drawn by the FrameRenderer layers, and the result is kept in an LRU cache of recently rendered frames.
+    
+        get_frame(300)        -> seek to 300, read, draw      (cache miss)
+        get_frame(301)        -> read, draw                   (next frame: no seek needed)
+        get_frame(300)        -> from the cache
+    
+    The video capture isn't thread safe, the reads and the drawing are done under a lock.
+    '''
+    def __init__(self, video_path, frame_renderer, cache_size=48):
+        self.video_path = video_path
+        self.frame_renderer = frame_renderer
+        self.cache_size = cache_size # frames, ~2.7MB each at 1280x720
+        
+        self.cap = cv2.VideoCapture(video_path)
+        if not self.cap.isOpened():
+            raise ValueError(f"Can't open the video {video_path}")
+        
+        self.fps = self.cap.get(cv2.CAP_PROP_FPS) or 24
+        self.num_frames = int(self.cap.get(cv2.CAP_PROP_FRAME_COUNT))
+        self.width = int(self.cap.get(cv2.CAP_PROP_FRAME_WIDTH))
+        self.height = int(self.cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+        
+        self.next_frame_num = 0 # frame the capture will read next
+        self.cache = OrderedDict()
+        self.lock = threading.Lock()
+    
+    @classmethod
+    def from_pipeline(cls, video_path, runner, cache_size=48):
+        '''
+        Takes the FrameRenderer from a PipelineRunner: with the tracks, team assignment and possession
+        already in its cache, only the layers are built (the video isn't even decoded).
+        '''
+        frame_renderer = runner.run(["frame_renderer"], video_path=video_path)["frame_renderer"]
+        return cls(video_path, frame_renderer, cache_size)
+    
+    def get_info(self):
+        return {
+            "video_path": self.video_path,
+            "fps": self.fps,
+            "num_frames": self.num_frames,
+            "duration": self.num_frames / self.fps,
+            "width": self.width,
+            "height": self.height
+        }
+    
+    def time_to_frame_num(self, seconds):
+        return min(max(int(round(seconds * self.fps)), 0), max(self.num_frames - 1, 0))
+    
+    def get_frame(self, frame_num):
+        '''
+        Annotated frame (do not modify it, it is shared with the cache). None past the end of the video.
+        '''
+        with self.lock:
+            frame = self.cache.get(frame_num)
+            if frame is not None:
+                self.cache.move_to_end(frame_num)
+                return frame
+            
+            with profile_stage("viewer.render_frame"):
+                frame = self._read_frame(frame_num)
+                if frame is None:
+                    return None
+                
+                frame = self.frame_renderer.render_frame(frame, frame_num)
+            
+            self.cache[frame_num] = frame
+            if len(self.cache) > self.cache_size:
+                self.cache.popitem(last=False)
+            
+            return frame
+    
+    def iter_frames(self, start_time, end_time, step=1):
+        '''
+        Yields (frame_num, annotated frame) between start_time and end_time (seconds, end excluded).
+        One frame at a time: a 30s clip at 1280x720 would be ~2GB as a list, and the server
+        can write several clips at once.
+        '''
+        start_frame = self.time_to_frame_num(start_time)
+        end_frame = min(int(round(end_time * self.fps)), self.num_frames)
+        
+        for frame_num in range(start_frame, end_frame, max(step, 1)):
+            frame = self.get_frame(frame_num)
+            if frame is None:
+                break
+            yield frame_num, frame
+    
+    def get_frame_jpeg(self, frame_num, quality=90):
+        frame = self.get_frame(frame_num)
+        if frame is None:
+            return None
+        
+        _, buffer = cv2.imencode(".jpg", frame, [cv2.IMWRITE_JPEG_QUALITY, quality])
+        return buffer.tobytes()
+    
+    def write_clip(self, output_path, start_time, end_time, fps=None, scale=1.0):
+        '''
+        Short annotated clip between start_time and end_time (seconds).
+        fps -> frames per second of the clip (lower than the video = fewer frames rendered), video fps by default
+        Returns the number of frames written.
+        
+        The frames are written as they are rendered: only the LRU cache and the frame being written are alive.
+        '''
+        fps = fps if fps is not None else self.fps
+        step = max(int(round(self.fps / fps)), 1)
+        
+        writer = None
+        num_frames = 0
+        
+        try:
+            for _, frame in self.iter_frames(start_time, end_time, step):
+                if scale != 1:
+                    frame = cv2.resize(frame, (round(frame.shape[1] * scale), round(frame.shape[0] * scale)), interpolation=cv2.INTER_AREA)
+                
+                if writer is None:
+                    writer = create_video_writer(output_path, (frame.shape[1], frame.shape[0]), self.fps / step)
+                
+                writer.write(frame)
+                num_frames += 1
+        finally:
+            if writer is not None:
+                writer.release()
+        
+        return num_frames
+    
+    def get_clip_bytes(self, start_time, end_time, fps=None, scale=1.0):
+        '''
+        Same as write_clip but returns the AVI file content (for the HTTP endpoint).
+        '''
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            clip_path = os.path.join(tmp_dir, "clip.avi")
+            if self.write_clip(clip_path, start_time, end_time, fps, scale) == 0:
+                return None
+            
+            with open(clip_path, "rb") as f:
+                return f.read()
+    
+    def close(self):
+        with self.lock:
+            self.cap.release()
+            self.cache.clear()
+    
+    def _read_frame(self, frame_num):
+        if frame_num < 0 or frame_num >= self.num_frames:
+            return None
+        
+        # Seeking decodes from the previous keyframe: skip it when reading the next frame anyway (playback, clips)
+        if frame_num != self.next_frame_num:
+            self.cap.set(cv2.CAP_PROP_POS_FRAMES, frame_num)
+        
+        ret, frame = self.cap.read()
+        if not ret:
+            self.next_frame_num = -1 # unknown position, seek next time
+            return None
+        
+        self.next_frame_num = frame_num + 1
+        return frame
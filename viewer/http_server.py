@@ -0,0 +1,114 @@
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlparse, parse_qs
+import json
+import math
+
+
+'''
+Small local HTTP endpoint on top of an AnnotatedVideo:
+
+    GET /info                                   -> JSON: fps, num_frames, duration, width, height
+    GET /frame?t=12.5  (or ?frame=300)          -> annotated frame as JPEG
+    GET /clip?start=10&end=15&fps=12&scale=0.5  -> annotated AVI clip (fps and scale optional)
+
+e.g. open http://127.0.0.1:8000/frame?t=3 in a browser, or
+     curl "http://127.0.0.1:8000/clip?start=2&end=7" -o clip.avi
+
+Meant for local inspection (binds to 127.0.0.1 by default), not to be exposed on a network.
+'''
+
+
+class AnnotatedVideoRequestHandler(BaseHTTPRequestHandler):
+    # Set by create_server
+    annotated_video = None
+    max_clip_seconds = 30
+    max_clip_scale = 1.0 # clips are never upscaled
+    
+    def do_GET(self):
+        url = urlparse(self.path)
+        query = {key: values[0] for key, values in parse_qs(url.query).items()}
+        
+        try:
+            if url.path == "/info":
+                self._send(200, "application/json", json.dumps(self.annotated_video.get_info()).encode("utf-8"))
+            elif url.path == "/frame":
+                self._send_frame(query)
+            elif url.path == "/clip":
+                self._send_clip(query)
+            else:
+                self._send_error(404, f"Unknown path {url.path}")
+        except ValueError as e:
+            # Bad numbers in the query
+            self._send_error(400, str(e))
+    
+    def _send_frame(self, query):
+        if "frame" in query:
+            frame_num = int(query["frame"])
+        elif "t" in query:
+            frame_num = self.annotated_video.time_to_frame_num(float(query["t"]))
+        else:
+            raise ValueError("frame or t is required")
+        
+        jpeg = self.annotated_video.get_frame_jpeg(frame_num, int(query.get("quality", 90)))
+        if jpeg is None:
+            self._send_error(404, f"No frame {frame_num}")
+            return
+        
+        self._send(200, "image/jpeg", jpeg)
+    
+    def _send_clip(self, query):
+        start_time = float(query["start"]) if "start" in query else 0.0
+        end_time = float(query["end"]) if "end" in query else start_time + 5
+        
+        if not (math.isfinite(start_time) and math.isfinite(end_time)):
+            raise ValueError("start and end must be finite numbers")
+        if end_time <= start_time:
+            raise ValueError("end must be after start")
+        if end_time - start_time > self.max_clip_seconds:
+            raise ValueError(f"Clips are limited to {self.max_clip_seconds} seconds")
+        
+        fps = float(query["fps"]) if "fps" in query else None
+        scale = float(query.get("scale", 1.0))
+        
+        # Checked here: fps=0 would divide by zero and scale<=0 would fail inside OpenCV, not as a 400
+        if fps is not None and not (math.isfinite(fps) and fps > 0):
+            raise ValueError("fps must be positive")
+        if not (0 < scale <= self.max_clip_scale):
+            raise ValueError(f"scale must be in (0, {self.max_clip_scale}]")
+        
+        clip = self.annotated_video.get_clip_bytes(start_time, end_time, fps, scale)
+        if clip is None:
+            self._send_error(404, "No frames in this range")
+            return
+        
+        self._send(200, "video/x-msvideo", clip)
+    
+    def _send_error(self, status, message):
+        self._send(status, "application/json", json.dumps({"error": message}).encode("utf-8"))
+    
+    def _send(self, status, content_type, body):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+def create_server(annotated_video, host="127.0.0.1", port=8000, max_clip_seconds=30):
+    handler = type("Handler", (AnnotatedVideoRequestHandler,), {
+        "annotated_video": annotated_video,
+        "max_clip_seconds": max_clip_seconds
+    })
+    return ThreadingHTTPServer((host, port), handler)
+
+
+def serve(annotated_video, host="127.0.0.1", port=8000, max_clip_seconds=30):
+    server = create_server(annotated_video, host, port, max_clip_seconds)
+    print(f"Serving {annotated_video.video_path} on http://{host}:{port} (/info, /frame?t=, /clip?start=&end=)")
+    
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()